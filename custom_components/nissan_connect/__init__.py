@@ -1,31 +1,96 @@
+import asyncio
 import logging
 from datetime import timedelta
+from time import monotonic
+import voluptuous as vol
+from homeassistant.exceptions import ConfigEntryNotReady, ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 from .kamereon import NCISession
-from .coordinator import KamereonFetchCoordinator, KamereonPollCoordinator, StatisticsCoordinator
+from .coordinator import KamereonFetchCoordinator, KamereonPollCoordinator, StatisticsCoordinator, cache_ttls
 from .const import *
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds to batch up call count writes
+CALLS_SAVE_DELAY = 60
+
+
+SET_PROFILE_SCHEMA = vol.Schema({
+    vol.Required("profile"): vol.In(list(PROFILES)),
+    vol.Optional("vin"): cv.string,
+    vol.Optional("account"): cv.string,
+})
+
 
 async def async_setup(hass, config) -> bool:
+    async def async_set_profile(call):
+        """Switch polling profile for a vehicle, an account or everything."""
+        vin = call.data.get("vin", "").upper() or None
+        found = False
+        for account_id, data in hass.data.get(DOMAIN, {}).items():
+            if call.data.get("account", account_id) != account_id or DATA_COORDINATOR_POLL not in data:
+                continue
+            if vin is not None and vin not in data[DATA_VEHICLES]:
+                continue
+            data[DATA_COORDINATOR_POLL].set_profile(call.data["profile"], vin)
+            found = True
+        if not found:
+            raise ServiceValidationError("No matching vehicle or account")
+
+    hass.services.async_register(DOMAIN, SERVICE_SET_PROFILE, async_set_profile, schema=SET_PROFILE_SCHEMA)
     return True
 
 
+def _auth_store(hass, entry):
+    """Store holding the OAuth token and user ID between restarts."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.auth", private=True)
+
+
+def _calls_store(hass, entry):
+    """Store holding today's API call counts between restarts."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.calls")
+
+
+def _state_store(hass, entry):
+    """Store holding the last known state of each vehicle between restarts."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.state")
+
+
+def _profile_store(hass, entry):
+    """Store holding the polling profiles switched to by service call."""
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.profiles")
+
+
 async def async_update_listener(hass, entry):
     """Handle options flow credentials update."""
     config = entry.data
     account_id = config['email']
 
-    # Loop each vehicle and update its session with the new credentials
-    for vehicle in hass.data[DOMAIN][account_id][DATA_VEHICLES]:
-        await hass.async_add_executor_job(hass.data[DOMAIN][account_id][DATA_VEHICLES][vehicle].session.login,
-                                            config.get("email"),
-                                            config.get("password")
-                                            )
+    # The budget sensor is only set up while there is a budget
+    if bool(config.get("daily_budget")) != hass.data[DOMAIN][account_id][DATA_BUDGET_SENSOR]:
+        hass.config_entries.async_schedule_reload(entry.entry_id)
+        return
+
+    # All vehicles on the account share one session, so log it in once with the new credentials
+    await hass.data[DOMAIN][account_id][DATA_SESSION].async_login(
+        config.get("email"),
+        config.get("password")
+    )
 
     # Update intervals for coordinators
+    for key in (DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL, DATA_COORDINATOR_STATISTICS):
+        hass.data[DOMAIN][account_id][key].update_config(dict(config))
     hass.data[DOMAIN][account_id][DATA_COORDINATOR_STATISTICS].update_interval = timedelta(minutes=config.get("interval_statistics", DEFAULT_INTERVAL_STATISTICS))
-    hass.data[DOMAIN][account_id][DATA_COORDINATOR_FETCH].update_interval = timedelta(minutes=config.get("interval_fetch", DEFAULT_INTERVAL_FETCH))
+    hass.data[DOMAIN][account_id][DATA_SESSION].cache.ttls = cache_ttls(config)
+    hass.data[DOMAIN][account_id][DATA_SESSION].endpoint_concurrency = config.get("endpoint_concurrency", DEFAULT_ENDPOINT_CONCURRENCY)
+    # Cycles already running finish under the old limit
+    hass.data[DOMAIN][account_id][DATA_VEHICLE_SEMAPHORE] = asyncio.Semaphore(config.get("vehicle_concurrency", DEFAULT_VEHICLE_CONCURRENCY))
+    hass.data[DOMAIN][account_id][DATA_SESSION].set_timeouts(
+        config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+        config.get("read_timeout", DEFAULT_READ_TIMEOUT)
+    )
     
     # Refresh fetch coordinator
     await hass.data[DOMAIN][account_id][DATA_COORDINATOR_FETCH].async_refresh()
@@ -42,54 +107,166 @@ async def async_setup_entry(hass, entry):
 
     kamereon_session = NCISession(
         region=config["region"],
-        unique_id=entry.unique_id
+        unique_id=entry.unique_id,
+        endpoint_concurrency=config.get("endpoint_concurrency", DEFAULT_ENDPOINT_CONCURRENCY),
+        connect_timeout=config.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=config.get("read_timeout", DEFAULT_READ_TIMEOUT),
+        cache_ttls=cache_ttls(config)
     )
 
+    state_store = _state_store(hass, entry)
+    profile_store = _profile_store(hass, entry)
+
     data = hass.data[DOMAIN][account_id] = {
-        DATA_VEHICLES: {}
+        DATA_SESSION: kamereon_session,
+        DATA_STATE_STORE: state_store,
+        DATA_PROFILE_STORE: profile_store,
+        DATA_VEHICLES: {},
+        DATA_BUDGET_SENSOR: bool(config.get("daily_budget")),
+        # Limits how many vehicles on this account are updated at once
+        DATA_VEHICLE_SEMAPHORE: asyncio.Semaphore(config.get("vehicle_concurrency", DEFAULT_VEHICLE_CONCURRENCY))
     }
 
-    _LOGGER.info("Logging in to service")
-    await hass.async_add_executor_job(kamereon_session.login,
-                                      config.get("email"),
-                                      config.get("password")
-                                      )
+    auth_store = _auth_store(hass, entry)
+    # May be called from an executor thread by the sync client
+    kamereon_session.on_auth_update = lambda: hass.add_job(
+        auth_store.async_delay_save, lambda: kamereon_session.auth_state
+    )
 
-    _LOGGER.debug("Finding vehicles")
-    for vehicle in await hass.async_add_executor_job(kamereon_session.fetch_vehicles):
-        await hass.async_add_executor_job(vehicle.fetch_all)
-        if vehicle.vin not in data[DATA_VEHICLES]:
-            data[DATA_VEHICLES][vehicle.vin] = vehicle
+    calls_store = _calls_store(hass, entry)
+    # Roll the counts over at the same midnight as the daily budget
+    kamereon_session.calls.today = lambda: dt_util.now().date()
+    kamereon_session.calls.load(await calls_store.async_load())
+    kamereon_session.calls.on_update = lambda: hass.add_job(
+        calls_store.async_delay_save, kamereon_session.calls.dump, CALLS_SAVE_DELAY
+    )
 
-    coordinator = data[DATA_COORDINATOR_FETCH] = KamereonFetchCoordinator(hass, config)
-    poll_coordinator = data[DATA_COORDINATOR_POLL] = KamereonPollCoordinator(hass, config)
-    stats_coordinator = data[DATA_COORDINATOR_STATISTICS] = StatisticsCoordinator(
-        hass, config)
+    # Time spent in each phase of setup, for debugging slow startups
+    timings = {}
+    phase_start = monotonic()
 
-    _LOGGER.debug("Initialising entities")
-    await hass.config_entries.async_forward_entry_setups(entry, ENTITY_TYPES)
+    def end_phase(name):
+        nonlocal phase_start
+        timings[name] = monotonic() - phase_start
+        phase_start = monotonic()
 
-    # Init fetch and state coordinators
-    await coordinator.async_config_entry_first_refresh()
-    await stats_coordinator.async_config_entry_first_refresh()
+    try:
+        if kamereon_session.restore_auth(await auth_store.async_load()):
+            # Credentials are still needed if the saved token has been revoked
+            _LOGGER.info("Reusing saved login")
+            kamereon_session.set_credentials(
+                config.get("email"),
+                config.get("password")
+            )
+        else:
+            _LOGGER.info("Logging in to service")
+            await kamereon_session.async_login(
+                config.get("email"),
+                config.get("password")
+            )
+        end_phase("login")
+
+        snapshot = await state_store.async_load()
+        if snapshot:
+            _LOGGER.debug("Restoring last known vehicle state")
+            user_id = await kamereon_session.async_get_user_id()
+            for vehicle in kamereon_session.restore_vehicles(snapshot, user_id):
+                data[DATA_VEHICLES][vehicle.vin] = vehicle
+        else:
+            _LOGGER.debug("Finding vehicles")
+            for vehicle in await kamereon_session.async_fetch_vehicles():
+                if vehicle.vin not in data[DATA_VEHICLES]:
+                    data[DATA_VEHICLES][vehicle.vin] = vehicle
+        end_phase("discovery")
+
+        coordinator = data[DATA_COORDINATOR_FETCH] = KamereonFetchCoordinator(hass, config)
+        poll_coordinator = data[DATA_COORDINATOR_POLL] = KamereonPollCoordinator(hass, config)
+        poll_coordinator.load_profiles(await profile_store.async_load())
+        stats_coordinator = data[DATA_COORDINATOR_STATISTICS] = StatisticsCoordinator(
+            hass, config)
+
+        if not snapshot:
+            # The only full fetch during setup; entities are created from its result
+            await coordinator.async_config_entry_first_refresh()
+            if coordinator.data is False:
+                raise ConfigEntryNotReady("Unable to fetch vehicle state")
+            end_phase("fetch")
 
-    # Init poll coordinator and ensure it runs
+            await stats_coordinator.async_config_entry_first_refresh()
+            end_phase("statistics")
+    except BaseException:
+        # Don't leak the connection pool if setup is retried
+        await kamereon_session.async_close()
+        raise
+
+    # Ensure the poll coordinator keeps running
     entry.async_on_unload(
             poll_coordinator.async_add_listener(
                 lambda *args: None, None
             )
     )
-    await poll_coordinator.async_config_entry_first_refresh()
+    # The cars have just reported in, so there is no need to wake them yet
+    poll_coordinator.async_seed()
+
+    _LOGGER.debug("Initialising entities")
+    await hass.config_entries.async_forward_entry_setups(entry, ENTITY_TYPES)
+    end_phase("entities")
+
+    _LOGGER.debug(
+        "Setup took %.2fs (%s)",
+        sum(timings.values()),
+        ", ".join(f"{name} {duration:.2f}s" for name, duration in timings.items())
+    )
+
+    if snapshot:
+        # Entities are already up with the restored state, so bring it up to date in the background
+        entry.async_create_background_task(
+            hass, _async_refresh_restored(hass, entry), f"{DOMAIN} refresh restored state"
+        )
 
     entry.async_on_unload(entry.add_update_listener(async_update_listener))
 
     return True
 
 
+async def _async_refresh_restored(hass, entry):
+    """Replace state restored at startup with fresh data from the API."""
+    data = hass.data[DOMAIN][entry.data['email']]
+
+    # If cars have been added to or removed from the account, the snapshot is no good
+    try:
+        records = await data[DATA_SESSION].async_fetch_vehicle_records()
+    except Exception:
+        _LOGGER.warning("Error communicating with API")
+    else:
+        if {record['vin'].upper() for record in records} != set(data[DATA_VEHICLES]):
+            _LOGGER.info("Vehicles on the account have changed, reloading")
+            await data[DATA_STATE_STORE].async_remove()
+            hass.config_entries.async_schedule_reload(entry.entry_id)
+            return
+
+    await data[DATA_COORDINATOR_FETCH].async_refresh()
+    await data[DATA_COORDINATOR_STATISTICS].async_refresh()
+
+
 async def async_unload_entry(hass, entry):
     """Unload a config entry."""
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, ENTITY_TYPES)
+
+    if unload_ok:
+        data = hass.data[DOMAIN].pop(entry.data['email'])
+        _LOGGER.debug("Connection statistics: %s", data[DATA_SESSION].connection_stats)
+        await data[DATA_SESSION].async_close()
+
+    return unload_ok
+
 
-    return await hass.config_entries.async_unload_platforms(entry, ENTITY_TYPES)
+async def async_remove_entry(hass, entry):
+    """Remove saved tokens and state when the config entry is deleted."""
+    await _auth_store(hass, entry).async_remove()
+    await _state_store(hass, entry).async_remove()
+    await _calls_store(hass, entry).async_remove()
+    await _profile_store(hass, entry).async_remove()
 
 
 async def async_migrate_entry(hass, config_entry) -> bool:
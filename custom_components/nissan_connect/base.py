@@ -6,6 +6,8 @@ class KamereonEntity(Entity):
     """Base class for all Kamereon car entities."""
 
     _attr_has_entity_name = True
+    # State is pushed by the coordinators
+    _attr_should_poll = False
 
     def __init__(self, cooordinator, vehicle):
         """Initialize the entity."""
@@ -25,6 +27,11 @@ class KamereonEntity(Entity):
     def _handle_coordinator_update(self) -> None:
         self.async_write_ha_state()
 
+    @property
+    def assumed_state(self):
+        """State restored at startup is assumed until the first fetch confirms it."""
+        return self.vehicle.restored is True
+
     @property
     def icon(self):
         """Return the icon."""
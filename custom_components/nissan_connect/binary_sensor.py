@@ -22,7 +22,7 @@ async def async_setup_entry(hass, config, async_add_entities):
         if Feature.LOCK_STATUS_CHECK in data[vehicle].features:
             entities += [LockStatusEntity(coordinator, data[vehicle])]
 
-    async_add_entities(entities, update_before_add=True)
+    async_add_entities(entities)
 
 
 class ChargingStatusEntity(KamereonEntity, BinarySensorEntity):
@@ -1,11 +1,10 @@
 """Support for Kamereon cars."""
 import logging
-import asyncio
 
 from homeassistant.components.button import ButtonEntity
 
 from .base import KamereonEntity
-from .kamereon import ChargingStatus, PluggedStatus, Feature
+from .kamereon import ChargingStatus, PluggedStatus, Feature, Priority
 from .const import DOMAIN, DATA_VEHICLES, DATA_COORDINATOR_POLL, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_STATISTICS
 
 _LOGGER = logging.getLogger(__name__)
@@ -31,7 +30,7 @@ async def async_setup_entry(hass, config, async_add_entities):
         if Feature.CHARGING_START in data[vehicle].features:
             entities.append(ChargeControlButtons(coordinator, data[vehicle], "charge_start", "mdi:play", "start"))
 
-    async_add_entities(entities, update_before_add=True)
+    async_add_entities(entities)
 
 
 class ForceUpdateButton(KamereonEntity, ButtonEntity):
@@ -48,10 +47,9 @@ class ForceUpdateButton(KamereonEntity, ButtonEntity):
         return 'mdi:update'
 
     async def async_press(self):
-        loop = asyncio.get_running_loop()
-        
-        await loop.run_in_executor(None, self.vehicle.refresh)
-        await self.coordinator.async_refresh()
+        await self.vehicle.async_refresh(priority=Priority.COMMAND)
+        # Read every endpoint now, whether or not its fetch interval is due
+        await self.coordinator.async_fetch_vehicles([self.vehicle.vin])
 
 class HornLightsButtons(KamereonEntity, ButtonEntity):
     def __init__(self, coordinator, vehicle, translation_key, icon, action):
@@ -64,8 +62,8 @@ class HornLightsButtons(KamereonEntity, ButtonEntity):
     def icon(self):
         return self._icon
 
-    def press(self):
-        self.vehicle.control_horn_lights('start', self._action)
+    async def async_press(self):
+        await self.vehicle.async_control_horn_lights('start', self._action)
 
 class ChargeControlButtons(KamereonEntity, ButtonEntity):
     def __init__(self, coordinator, vehicle, translation_key, icon, action):
@@ -78,6 +76,6 @@ class ChargeControlButtons(KamereonEntity, ButtonEntity):
     def icon(self):
         return self._icon
 
-    def press(self):
-        self.vehicle.control_charging(self._action)
+    async def async_press(self):
+        await self.vehicle.async_control_charging(self._action)
 
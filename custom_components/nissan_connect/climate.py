@@ -12,7 +12,7 @@ from homeassistant.const import ATTR_TEMPERATURE, UnitOfTemperature
 SUPPORT_HVAC = [HVACMode.HEAT_COOL, HVACMode.OFF]
 
 from .base import KamereonEntity
-from .kamereon import Feature, HVACAction
+from .kamereon import Feature, HVACAction, Priority
 from .const import DOMAIN, DATA_VEHICLES, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL
 
 _LOGGER = logging.getLogger(__name__)
@@ -26,7 +26,7 @@ async def async_setup_entry(hass, config, async_add_entities):
 
     for vehicle in data:
         if Feature.CLIMATE_ON_OFF in data[vehicle].features:
-            async_add_entities([KamereonClimate(coordinator, data[vehicle], hass)], update_before_add=True)
+            async_add_entities([KamereonClimate(coordinator, data[vehicle], hass)])
 
 
 class KamereonClimate(KamereonEntity, ClimateEntity):
@@ -74,7 +74,7 @@ class KamereonClimate(KamereonEntity, ClimateEntity):
                 return HASSHVACAction.HEATING
         return HASSHVACAction.OFF
 
-    def set_temperature(self, **kwargs):
+    async def async_set_temperature(self, **kwargs):
         """Set new target temperatures."""
         if Feature.TEMPERATURE not in self.vehicle.features:
             raise NotImplementedError()
@@ -85,7 +85,7 @@ class KamereonClimate(KamereonEntity, ClimateEntity):
         
         if self.vehicle.hvac_status:
             self._target = temperature
-            self.vehicle.set_hvac_status(HVACAction.START, temperature)
+            await self.vehicle.async_set_hvac_status(HVACAction.START, temperature)
         else:
             self._target = temperature
 
@@ -95,10 +95,10 @@ class KamereonClimate(KamereonEntity, ClimateEntity):
             raise NotImplementedError()
 
         if hvac_mode == HVACMode.OFF:
-            await self._hass.async_add_executor_job(self.vehicle.set_hvac_status, HVACAction.STOP)
+            await self.vehicle.async_set_hvac_status(HVACAction.STOP)
             self._hass.async_create_task(self._async_fetch_loop(False))
         elif hvac_mode == HVACMode.HEAT_COOL:
-            await self._hass.async_add_executor_job(self.vehicle.set_hvac_status, HVACAction.START, int(self._target))
+            await self.vehicle.async_set_hvac_status(HVACAction.START, int(self._target))
             self._hass.async_create_task(self._async_fetch_loop(True))
 
     async def async_turn_off(self) -> None:
@@ -115,11 +115,9 @@ class KamereonClimate(KamereonEntity, ClimateEntity):
         _LOGGER.debug("Beginning HVAC fetch loop")
         self._loop_mutex = True
 
-        loop = asyncio.get_running_loop()
-        
         for _ in range(10):
-            await loop.run_in_executor(None, self.vehicle.refresh)
-            await self.coordinator.async_refresh()
+            await self.vehicle.async_refresh(priority=Priority.COMMAND, endpoints=('hvac_status',))
+            await self.coordinator.async_fetch_vehicles([self.vehicle.vin], ['hvac_status'])
 
             # We have our update, break out
             if target_state == self.vehicle.hvac_status:
@@ -1,7 +1,7 @@
 import voluptuous as vol
 from homeassistant.config_entries import (ConfigFlow, OptionsFlow)
-from .const import DOMAIN, CONFIG_VERSION, DEFAULT_INTERVAL_POLL, DEFAULT_INTERVAL_CHARGING, DEFAULT_INTERVAL_STATISTICS, DEFAULT_INTERVAL_FETCH, DEFAULT_REGION, REGIONS
-from .kamereon import NCISession
+from .const import DOMAIN, CONFIG_VERSION, DEFAULT_INTERVAL_POLL, DEFAULT_INTERVAL_CHARGING, DEFAULT_INTERVAL_MIN, DEFAULT_INTERVAL_MAX, DEFAULT_INTERVAL_STATISTICS, DEFAULT_INTERVAL_FETCH, DEFAULT_INTERVAL_WAKE, DEFAULT_PROFILE, PROFILES, PROFILE_TIMES, DEFAULT_DAILY_BUDGET, DEFAULT_CYCLE_DEADLINE, DEFAULT_ENDPOINT_CONCURRENCY, DEFAULT_VEHICLE_CONCURRENCY, MAX_VEHICLE_CONCURRENCY, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_REGION, REGIONS
+from .kamereon import NCISession, FETCH_ENDPOINTS, WAKE_ENDPOINTS
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers import selector
 
@@ -57,6 +57,8 @@ class NissanConfigFlow(ConfigFlow, domain=DOMAIN):
                                                        )
             except:
                 errors["base"] = "auth_error"
+            finally:
+                kamereon_session.close()
 
             if len(errors) == 0:
                 return self.async_create_entry(
@@ -84,10 +86,10 @@ class NissanOptionsFlow(OptionsFlow):
         if options is not None:
             data = dict(self._config_entry.data)
             # Validate credentials
-            kamereon_session = NCISession(
-                region=data["region"]
-            )
             if "password" in options:
+                kamereon_session = NCISession(
+                    region=data["region"]
+                )
                 try:
                     await self.hass.async_add_executor_job(kamereon_session.login,
                                                            self._config_entry.data.get("email"),
@@ -95,25 +97,22 @@ class NissanOptionsFlow(OptionsFlow):
                                                            )
                 except:
                     errors["base"] = "auth_error"
+                finally:
+                    kamereon_session.close()
+
+            if options["interval_min"] > options["interval_max"]:
+                errors["interval_max"] = "interval_range"
 
-            # If we have no errors, update the data array
+            # If we have no errors, move on to the per-endpoint intervals
             if len(errors) == 0:
                 # If password not provided, dont take the new details
                 if not "password" in options:
                     options.pop('email', None)
                     options.pop('password', None)
 
-                # Update data
                 data.update(options)
-                self.hass.config_entries.async_update_entry(
-                    self._config_entry, data=data
-                )
-
-                # Update options
-                return self.async_create_entry(
-                    title="",
-                    data={}
-                )
+                self._data = data
+                return await self.async_step_endpoints()
 
         return self.async_show_form(
             step_id="init", data_schema=vol.Schema({
@@ -126,13 +125,92 @@ class NissanOptionsFlow(OptionsFlow):
                     "interval_charging", default=self._config_entry.data.get("interval_charging", DEFAULT_INTERVAL_CHARGING)
                 ): int,
                 vol.Required(
-                    "interval_fetch", default=self._config_entry.data.get("interval_fetch", DEFAULT_INTERVAL_FETCH)
+                    "interval_min", default=self._config_entry.data.get("interval_min", DEFAULT_INTERVAL_MIN)
                 ): int,
                 vol.Required(
-                    "interval_statistics", default=self._config_entry.data.get("interval_statistics", DEFAULT_INTERVAL_STATISTICS)
+                    "interval_max", default=self._config_entry.data.get("interval_max", DEFAULT_INTERVAL_MAX)
                 ): int,
+                vol.Required(
+                    "interval_fetch", default=self._config_entry.data.get("interval_fetch", DEFAULT_INTERVAL_FETCH)
+                ): int,
+                vol.Required(
+                    "daily_budget", default=self._config_entry.data.get("daily_budget", DEFAULT_DAILY_BUDGET)
+                ): vol.All(int, vol.Range(min=0)),
+                vol.Required(
+                    "cycle_deadline", default=self._config_entry.data.get("cycle_deadline", DEFAULT_CYCLE_DEADLINE)
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Required(
+                    "endpoint_concurrency", default=self._config_entry.data.get("endpoint_concurrency", DEFAULT_ENDPOINT_CONCURRENCY)
+                ): vol.All(int, vol.Range(min=1, max=len(FETCH_ENDPOINTS))),
+                vol.Required(
+                    "vehicle_concurrency", default=self._config_entry.data.get("vehicle_concurrency", DEFAULT_VEHICLE_CONCURRENCY)
+                ): vol.All(int, vol.Range(min=1, max=MAX_VEHICLE_CONCURRENCY)),
+                vol.Required(
+                    "connect_timeout", default=self._config_entry.data.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT)
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Required(
+                    "read_timeout", default=self._config_entry.data.get("read_timeout", DEFAULT_READ_TIMEOUT)
+                ): vol.All(int, vol.Range(min=1)),
+                vol.Required(
+                    "profile", default=self._config_entry.data.get("profile", DEFAULT_PROFILE)): selector.SelectSelector(
+                        selector.SelectSelectorConfig(
+                            options=list(PROFILES),
+                            mode=selector.SelectSelectorMode.DROPDOWN,
+                            translation_key="profile"
+                        ),
+                ),
                 # Excluded from config flow under #61
                 # vol.Required(
                 #     "imperial_distance", default=self._config_entry.data.get("imperial_distance", False)): bool
             }), errors=errors
         )
+
+    async def async_step_endpoints(self, options=None):
+        """Intervals for each endpoint. Left empty, an endpoint follows the
+        update or polling interval from the first step."""
+        data = self._data
+        if options is not None:
+            data["interval_statistics"] = options["interval_statistics"]
+            # A cleared field goes back to the default, so set every key
+            for endpoint in FETCH_ENDPOINTS:
+                data[f"interval_fetch_{endpoint}"] = options.get(f"interval_fetch_{endpoint}")
+            for endpoint in WAKE_ENDPOINTS:
+                data[f"interval_wake_{endpoint}"] = options.get(f"interval_wake_{endpoint}")
+            return await self.async_step_profiles()
+
+        schema = {}
+        for endpoint in FETCH_ENDPOINTS:
+            schema[vol.Optional(
+                f"interval_fetch_{endpoint}", description={"suggested_value": data.get(f"interval_fetch_{endpoint}")}
+            )] = vol.All(int, vol.Range(min=1))
+        schema[vol.Required(
+            "interval_statistics", default=data.get("interval_statistics", DEFAULT_INTERVAL_STATISTICS)
+        )] = vol.All(int, vol.Range(min=1))
+        for endpoint in WAKE_ENDPOINTS:
+            schema[vol.Optional(
+                f"interval_wake_{endpoint}", description={"suggested_value": data.get(f"interval_wake_{endpoint}", DEFAULT_INTERVAL_WAKE[endpoint])}
+            )] = vol.All(int, vol.Range(min=0))
+
+        return self.async_show_form(step_id="endpoints", data_schema=vol.Schema(schema))
+
+    async def async_step_profiles(self, options=None):
+        """Times of day the polling profiles are laid out by."""
+        data = self._data
+        if options is not None:
+            data.update(options)
+
+            # Update data
+            self.hass.config_entries.async_update_entry(
+                self._config_entry, data=data
+            )
+
+            # Update options
+            return self.async_create_entry(
+                title="",
+                data={}
+            )
+
+        return self.async_show_form(step_id="profiles", data_schema=vol.Schema({
+            vol.Required(key, default=data.get(key, default)): selector.TimeSelector()
+            for key, default in PROFILE_TIMES.items()
+        }))
@@ -1,17 +1,85 @@
 DOMAIN = "nissan_connect"
 CONFIG_VERSION = 1
+STORAGE_VERSION = 1
 ENTITY_TYPES = ["binary_sensor", "sensor", "button", "climate", "device_tracker"]
 
+DATA_SESSION = "session"
 DATA_VEHICLES = "vehicles"
 DATA_COORDINATOR_FETCH = "coordinator_fetch"
 DATA_COORDINATOR_POLL = "coordinator_poll"
 DATA_COORDINATOR_STATISTICS = "coordinator_statistics"
+DATA_VEHICLE_SEMAPHORE = "vehicle_semaphore"
+DATA_STATE_STORE = "state_store"
+DATA_PROFILE_STORE = "profile_store"
+DATA_BUDGET_SENSOR = "budget_sensor"
 
 DEFAULT_INTERVAL_POLL = 60
 DEFAULT_INTERVAL_CHARGING = 15
+# Bounds for the adaptive polling interval
+DEFAULT_INTERVAL_MIN = 5
+DEFAULT_INTERVAL_MAX = 480
 DEFAULT_INTERVAL_STATISTICS = 60
 
 DEFAULT_INTERVAL_FETCH = 10
 
+# Minutes between asking the car to report in on each endpoint, unless set by
+# "interval_wake_<endpoint>". None follows the vehicle's polling interval and
+# 0 never wakes the car for that endpoint. Fetch intervals are set by
+# "interval_fetch_<endpoint>" and default to interval_fetch.
+DEFAULT_INTERVAL_WAKE = {
+    "location": None,
+    "battery_status": None,
+    "hvac_status": 0,
+    "lock_status": 0,
+}
+
+DEFAULT_ENDPOINT_CONCURRENCY = 5
+DEFAULT_VEHICLE_CONCURRENCY = 3
+MAX_VEHICLE_CONCURRENCY = 10
+
+# Time-of-day polling profiles. Each window runs from start to end local time
+# (past midnight if end is earlier), on the given weekdays (Monday is 0) or
+# every day. Within it the polling interval is at most "interval" minutes,
+# or the car isn't woken at all if that is 0, unless "unless_charging" is set
+# and it is charging. Start and end name one of the PROFILE_TIMES, which can
+# be changed in the options.
+PROFILES = {
+    "default": [],
+    "quiet_nights": [
+        {"start": "quiet_start", "end": "quiet_end", "interval": 0},
+    ],
+    "charging_overnight": [
+        {"start": "quiet_start", "end": "quiet_end", "interval": 0, "unless_charging": True},
+    ],
+    "commute": [
+        {"start": "commute_morning_start", "end": "commute_morning_end", "days": [0, 1, 2, 3, 4], "interval": 15},
+        {"start": "commute_evening_start", "end": "commute_evening_end", "days": [0, 1, 2, 3, 4], "interval": 15},
+        {"start": "quiet_start", "end": "quiet_end", "interval": 0},
+    ],
+}
+PROFILE_TIMES = {
+    "quiet_start": "23:00",
+    "quiet_end": "07:00",
+    "commute_morning_start": "07:00",
+    "commute_morning_end": "09:30",
+    "commute_evening_start": "16:30",
+    "commute_evening_end": "19:00",
+}
+DEFAULT_PROFILE = "default"
+
+# Calls an account may make to the API per day, 0 for no limit. Polling is
+# spread over the day to stay within it, after allowing for the other calls,
+# which aren't slowed down.
+DEFAULT_DAILY_BUDGET = 0
+
+SERVICE_SET_PROFILE = "set_polling_profile"
+
+# Seconds a coordinator cycle may run before remaining vehicles are cancelled
+DEFAULT_CYCLE_DEADLINE = 120
+
+# Seconds to wait for a connection to the API, and for each read from it
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+
 DEFAULT_REGION = "EU"
 REGIONS = ["EU"]
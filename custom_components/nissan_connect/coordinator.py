@@ -1,151 +1,582 @@
+import asyncio
+import heapq
 import logging
+import math
+import random
 
-from datetime import timedelta
-from time import time
+from datetime import datetime, timedelta
+from time import time, monotonic
+from homeassistant.core import callback
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
-from .const import DOMAIN, DATA_VEHICLES, DEFAULT_INTERVAL_POLL, DEFAULT_INTERVAL_CHARGING, DEFAULT_INTERVAL_STATISTICS, DEFAULT_INTERVAL_FETCH, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL
-from .kamereon import Feature, PluggedStatus, ChargingStatus, Period
+from homeassistant.util import dt as dt_util
+from .const import DOMAIN, DATA_VEHICLES, DATA_VEHICLE_SEMAPHORE, DATA_STATE_STORE, DATA_PROFILE_STORE, DEFAULT_CYCLE_DEADLINE, DEFAULT_INTERVAL_POLL, DEFAULT_INTERVAL_CHARGING, DEFAULT_INTERVAL_MIN, DEFAULT_INTERVAL_MAX, DEFAULT_INTERVAL_STATISTICS, DEFAULT_INTERVAL_FETCH, DEFAULT_INTERVAL_WAKE, DEFAULT_PROFILE, PROFILES, DEFAULT_DAILY_BUDGET, DATA_SESSION, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL
+from .kamereon import Feature, ChargingStatus, Period, CircuitOpenError, CACHE_TTLS, FETCH_ENDPOINTS, WAKE_ENDPOINTS
+from .profiles import busy_from, profile_windows, quiet_until, window_at
 
 _LOGGER = logging.getLogger(__name__)
 
+# Seconds to batch up vehicle state writes
+STATE_SAVE_DELAY = 30
 
-class KamereonFetchCoordinator(DataUpdateCoordinator):
-    def __init__(self, hass, config):
-        """Coordinator to fetch the latest states."""
+# Up to this fraction of a vehicle's poll interval is added at random, so
+# vehicles and accounts set up together drift apart
+POLL_JITTER = 0.1
+
+# The coordinator timer can fire up to a second early
+POLL_TOLERANCE = 1
+
+# Shortest stretch of the day to measure the call rate over, so a few calls
+# just after midnight don't look like a flood
+BUDGET_MIN_ELAPSED = 3600
+
+# Calls made by polls are counted under this, see _budget_factor()
+POLL_SOURCE = 'poll'
+
+# Seconds after a predicted event to poll, giving the car time to report it
+CHARGE_COMPLETE_MARGIN = 60
+HVAC_START_MARGIN = 120
+
+# Endpoints to poll for each kind of predicted event
+EVENT_ENDPOINTS = {
+    'charge_complete': ('battery_status',),
+    'hvac_start': ('hvac_status',),
+}
+
+
+def fetch_intervals(config):
+    """Minutes between reading each endpoint from the server."""
+    default = config.get("interval_fetch", DEFAULT_INTERVAL_FETCH)
+    return {endpoint: config.get(f"interval_fetch_{endpoint}") or default for endpoint in FETCH_ENDPOINTS}
+
+
+def cache_ttls(config):
+    """Seconds each cached endpoint is fresh for. An endpoint given its own
+    fetch interval is read from the server at that interval, so it isn't
+    cached. Otherwise most of the scheduled fetches are answered from the
+    cache."""
+    return {endpoint: ttl for endpoint, ttl in CACHE_TTLS.items() if not config.get(f"interval_fetch_{endpoint}")}
+
+
+def wake_intervals(config):
+    """Minutes between waking the car for each endpoint. See DEFAULT_INTERVAL_WAKE."""
+    intervals = {}
+    for endpoint in WAKE_ENDPOINTS:
+        interval = config.get(f"interval_wake_{endpoint}")
+        intervals[endpoint] = DEFAULT_INTERVAL_WAKE[endpoint] if interval is None else interval
+    return intervals
+
+
+class KamereonCoordinator(DataUpdateCoordinator):
+    def __init__(self, hass, config, name, update_interval, always_update=True):
+        """Base for coordinators that do the same work for every vehicle on an account."""
         super().__init__(
             hass,
             _LOGGER,
-            name="Update Coordinator",
-            update_interval=timedelta(minutes=config.get("interval_fetch", DEFAULT_INTERVAL_FETCH)),
+            name=name,
+            update_interval=update_interval,
+            always_update=always_update,
         )
         self._hass = hass
         self._account_id = config['email']
         self._vehicles = hass.data[DOMAIN][self._account_id][DATA_VEHICLES]
+        self._config = config
+        # Number of cycles cut short by the deadline
+        self.overruns = 0
 
-    async def _async_update_data(self):
-        """Fetch data from API."""
+    def update_config(self, config):
+        """Apply changed options."""
+        self._config = config
+
+    @property
+    def cycle_deadline(self):
+        """Seconds a cycle may take, never more than the update interval so
+        a slow cycle can't run into the next one."""
+        deadline = self._config.get("cycle_deadline", DEFAULT_CYCLE_DEADLINE)
+        if self.update_interval is not None:
+            deadline = min(deadline, self.update_interval.total_seconds())
+        return deadline
+
+    async def _async_update_vehicles(self, func, vehicles=None):
+        """Await func(vehicle) for each vehicle in parallel, limited by the
+        account-wide semaphore. Returns a dict of VIN to result or exception.
+        Vehicles still running at the cycle deadline are cancelled, and get a
+        TimeoutError as their result."""
+        semaphore = self._hass.data[DOMAIN][self._account_id][DATA_VEHICLE_SEMAPHORE]
+        vins = list(self._vehicles if vehicles is None else vehicles)
+        if not vins:
+            return {}
+        cycle_start = monotonic()
+
+        async def run(vin):
+            async with semaphore:
+                start = monotonic()
+                try:
+                    return await func(self._vehicles[vin])
+                finally:
+                    _LOGGER.debug("%s: #%s took %.2fs", self.name, vin[-3:], monotonic() - start)
+
+        deadline = self.cycle_deadline
+        tasks = {vin: asyncio.ensure_future(run(vin)) for vin in vins}
         try:
-            for vehicle in self._vehicles:
-                await self._hass.async_add_executor_job(self._vehicles[vehicle].fetch_all)
-        except BaseException:
-            _LOGGER.warning("Error communicating with API")
+            _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.wait(pending)
+            self.overruns += 1
+            _LOGGER.warning(
+                "%s: cycle overran its %ds deadline, cancelled %s",
+                self.name,
+                deadline,
+                ", ".join("#" + vin[-3:] for vin, task in tasks.items() if task in pending)
+            )
+        _LOGGER.debug("%s: updated %d vehicles in %.2fs", self.name, len(vins), monotonic() - cycle_start)
+
+        results = {}
+        for vin, task in tasks.items():
+            if task in pending:
+                results[vin] = asyncio.TimeoutError()
+            else:
+                results[vin] = task.exception() or task.result()
+        return results
+
+    def _failed_vehicles(self, results):
+        """VINs from _async_update_vehicles() that failed. While the API is
+        known to be down this is expected, so it isn't logged as a warning."""
+        failed = [vin for vin, result in results.items() if isinstance(result, BaseException)]
+        if failed:
+            if all(isinstance(results[vin], CircuitOpenError) for vin in failed):
+                _LOGGER.debug("%s: API unavailable, keeping last known state", self.name)
+            else:
+                _LOGGER.warning("Error communicating with API for %s", ", ".join("#" + vin[-3:] for vin in failed))
+        return failed
+
+
+class KamereonFetchCoordinator(KamereonCoordinator):
+    def __init__(self, hass, config):
+        """Coordinator to fetch the latest states."""
+        super().__init__(
+            hass,
+            config,
+            name="Update Coordinator",
+            # Runs as often as the most frequently fetched endpoint
+            update_interval=timedelta(minutes=min(fetch_intervals(config).values())),
+            # Entities are only written when a vehicle's state version moves on
+            always_update=False,
+        )
+        # When each endpoint was last fetched for every vehicle
+        self._last_fetched = {}
+
+    def update_config(self, config):
+        super().update_config(config)
+        self.update_interval = timedelta(minutes=min(fetch_intervals(config).values()))
+
+    async def _async_update_data(self):
+        """Fetch the endpoints that are due from the API. Returns the state
+        version of each vehicle, or False if any of them failed."""
+        now = time()
+        due = [
+            endpoint for endpoint, interval in fetch_intervals(self._config).items()
+            if now - self._last_fetched.get(endpoint, 0) >= interval * 60 - POLL_TOLERANCE
+        ]
+        if not due:
+            return self.data
+        versions = await self._async_fetch(endpoints=due, settled=True)
+        if versions is not False:
+            self._last_fetched.update({endpoint: now for endpoint in due})
+        return versions
+
+    async def async_fetch_vehicles(self, vins, endpoints=None):
+        """Fetch the latest state of some vehicles only, such as those that
+        have just been polled. Entities are updated if any state changed."""
+        versions = await self._async_fetch(vins, endpoints, settled=False)
+        if versions is not False and versions != self.data:
+            self.async_set_updated_data(versions)
+
+    async def _async_fetch(self, vins=None, endpoints=None, settled=True):
+        results = await self._async_update_vehicles(lambda vehicle: vehicle.async_fetch_all(endpoints=endpoints), vins)
+
+        if self._failed_vehicles(results):
             return False
+
+        versions = {vin: vehicle.version for vin, vehicle in self._vehicles.items()}
+        if versions != self.data:
+            # Save the state so the next startup can show it straight away
+            self._hass.data[DOMAIN][self._account_id][DATA_STATE_STORE].async_delay_save(
+                lambda: [vehicle.dump_state() for vehicle in self._vehicles.values()],
+                STATE_SAVE_DELAY
+            )
         
         # Set interval for polling (the other coordinator)
-        self._hass.data[DOMAIN][self._account_id][DATA_COORDINATOR_POLL].set_next_interval()
+        self._hass.data[DOMAIN][self._account_id][DATA_COORDINATOR_POLL].set_next_interval(settled)
 
-        return True
+        return versions
 
 
-class KamereonPollCoordinator(DataUpdateCoordinator):
+class KamereonPollCoordinator(KamereonCoordinator):
     def __init__(self, hass, config):
-        """Coordinator to poll the car for updates."""
+        """Coordinator to poll the car for updates. Each vehicle has its own
+        deadline, and the coordinator sleeps until the earliest of them."""
         super().__init__(
             hass,
-            _LOGGER,
+            config,
             name="Poll Coordinator",
-            # This interval is overwritten by _set_next_interval in the first run
+            # This interval is overwritten with the time to the next deadline
             update_interval=timedelta(minutes=15),
         )
-        self._hass = hass
-        self._account_id = config['email']
-        self._vehicles = hass.data[DOMAIN][self._account_id][DATA_VEHICLES]
-        self._config = config
-        
-        self._pluggednotcharging = {key: 0 for key in self._vehicles}
+
         self._intervals = {key: 0 for key in self._vehicles}
-        self._last_updated = {key: 0 for key in self._vehicles}
-        self._force_update = {key: False for key in self._vehicles}
+        # Poll interval learned from how often each vehicle's state changes,
+        # before the charging and HVAC overrides
+        self._adaptive = {}
+        self._observed = {}
+        self._last_polled = {}
+        # Polled since their interval was last adapted
+        self._polled = set()
+        # Predicted (time, kind) of each vehicle's next event, while its
+        # deadline is set for it
+        self._events = {}
+        # Next poll at each vehicle's own interval, and when each endpoint was
+        # last woken. The deadline is the earliest of this, any endpoint with
+        # its own wake interval, and any predicted event.
+        self._regular = {}
+        self._woken = {key: {} for key in self._vehicles}
+        # Polling profiles switched to at runtime, for the account and for
+        # individual vehicles
+        self._account_profile = None
+        self._profiles = {}
+        # Set while the daily call budget is used up
+        self._budget_exhausted = False
+        # When each vehicle is next due, and a heap of (deadline, VIN) to find
+        # the earliest. Heap entries that no longer match _deadlines are stale.
+        self._deadlines = {}
+        self._queue = []
+
+    @property
+    def cycle_deadline(self):
+        """The update interval here is only the time to the next deadline, so
+        cap cycles at the shortest poll interval instead."""
+        deadline = self._config.get("cycle_deadline", DEFAULT_CYCLE_DEADLINE)
+        if all(self._intervals.values()):
+            deadline = min(deadline, min(self._intervals.values()) * 60)
+        return deadline
+
+    def _schedule_vehicle(self, vin, deadline):
+        self._deadlines[vin] = deadline
+        heapq.heappush(self._queue, (deadline, vin))
+
+    def profile(self, vin):
+        """Name of the polling profile a vehicle follows."""
+        profile = self._profiles.get(vin) or self._account_profile or self._config.get("profile")
+        return profile if profile in PROFILES else DEFAULT_PROFILE
+
+    def _windows(self, vin):
+        return profile_windows(self.profile(vin), self._config)
+
+    def set_profile(self, profile, vin=None):
+        """Switch the whole account, or one vehicle, to another profile and
+        reschedule to suit. The choice is saved to survive a restart."""
+        if vin is None:
+            self._account_profile = profile
+            self._profiles.clear()
+        else:
+            self._profiles[vin] = profile
+        _LOGGER.debug("Switched %s to %s polling profile", "#" + vin[-3:] if vin else "account", profile)
+        self._hass.data[DOMAIN][self._account_id][DATA_PROFILE_STORE].async_delay_save(self.dump_profiles)
+        for key in self._vehicles if vin is None else [vin]:
+            if key in self._regular:
+                self._schedule_regular(key, self._regular[key])
+        self._schedule_events(time())
+        self._reschedule()
+
+    def dump_profiles(self):
+        return {
+            'account': self._account_profile,
+            'vehicles': dict(self._profiles),
+        }
+
+    def load_profiles(self, state):
+        """Restore profiles saved by dump_profiles(), without rescheduling."""
+        if not state:
+            return
+        self._account_profile = state.get('account')
+        self._profiles = {vin: profile for vin, profile in state.get('vehicles', {}).items() if vin in self._vehicles}
+
+    def _budget_factor(self, now):
+        """How much longer polling intervals must be to stay within the daily
+        call budget. Only polls can be slowed down, so they get what is left
+        of it once the rest of the traffic is allowed for, at the rate each
+        has been made at so far today. Sets _budget_exhausted once there is
+        nothing left for polls."""
+        budget = self._config.get("daily_budget", DEFAULT_DAILY_BUDGET)
+        exhausted = self._budget_exhausted
+        self._budget_exhausted = False
+        if not budget:
+            return 1
+        calls = self._hass.data[DOMAIN][self._account_id][DATA_SESSION].calls
+        used = calls.total
+        polled = calls.source(POLL_SOURCE)
+        midnight = dt_util.start_of_local_day().timestamp()
+        elapsed = max(now - max(calls.started, midnight), BUDGET_MIN_ELAPSED)
+        remaining = midnight + 86400 - now
+        # Left for polls once the other traffic keeps on at its rate until midnight
+        available = budget - used - (used - polled) / elapsed * remaining
+        if used >= budget or available <= 0:
+            if not exhausted:
+                _LOGGER.warning("Daily budget of %d API calls used up, not polling until tomorrow", budget)
+            self._budget_exhausted = True
+            return 1
+        return max(1, polled / elapsed * remaining / available)
+
+    def _charging(self, vin):
+        return self._vehicles[vin].charging == ChargingStatus.CHARGING
 
-    def set_next_interval(self):
-        """Calculate the next update interval."""
+    def _schedule_regular(self, vin, regular):
+        """Schedule the next poll at the vehicle's interval, or sooner if an
+        endpoint with its own wake interval is due first. The profile may
+        bring it forward to a busy window, or put it off past a quiet one."""
+        windows = self._windows(vin)
+        busy = busy_from(windows, time(), regular, self._intervals[vin])
+        if busy is not None:
+            regular = busy
+        self._regular[vin] = regular
+        deadlines = [regular]
+        for endpoint, interval in wake_intervals(self._config).items():
+            if interval:
+                deadlines.append(self._woken[vin].get(endpoint, self._last_polled[vin]) + interval * 60)
+        deadline = min(deadlines)
+        if self._budget_exhausted:
+            deadline = max(deadline, dt_util.start_of_local_day().timestamp() + 86400)
+        allowed = quiet_until(windows, deadline, self._charging(vin))
+        if allowed != deadline:
+            # Don't have every car wake the moment quiet hours end
+            deadline = allowed + random.uniform(0, self._intervals[vin] * 60 * POLL_JITTER)
+        self._schedule_vehicle(vin, deadline)
+
+    def _next_deadline(self, vin, since):
+        interval = self._intervals[vin] * 60
+        return since + interval + random.uniform(0, interval * POLL_JITTER)
+
+    def _reschedule(self):
+        """Wake up in time for the vehicle due next."""
+        while self._queue and self._deadlines.get(self._queue[0][1]) != self._queue[0][0]:
+            heapq.heappop(self._queue)
+        if not self._queue:
+            return
+        seconds = max(0, round(self._queue[0][0] - time()))
+        if seconds != self.update_interval.total_seconds():
+            _LOGGER.debug("Next poll due in %d seconds (#%s)", seconds, self._queue[0][1][-3:])
+            self.update_interval = timedelta(seconds=seconds)
+            self._async_unsub_refresh()
+            if self._listeners:
+                self._schedule_refresh()
+
+    @staticmethod
+    def _observe(vehicle):
+        """The parts of a vehicle's state that change while it is in use."""
+        return (vehicle.battery_level, vehicle.range_hvac_on, vehicle.location, vehicle.lock_status)
+
+    def set_next_interval(self, settled=True):
+        """Adapt each vehicle's poll interval to how often its state changes.
+        It doubles after each poll that finds nothing new, up to the maximum,
+        and drops back to at most the configured interval, then halves
+        towards the minimum, while changes keep coming in.
+
+        A fetch straight after a poll may come before the car has reported
+        in, so unless settled it can show a change but not the lack of one."""
         interval = self._config.get("interval", DEFAULT_INTERVAL_POLL)
         interval_charging = self._config.get("interval_charging", DEFAULT_INTERVAL_CHARGING)
+        interval_min = self._config.get("interval_min", DEFAULT_INTERVAL_MIN)
+        interval_max = self._config.get("interval_max", DEFAULT_INTERVAL_MAX)
+        now = time()
+        budget_factor = self._budget_factor(now)
         
-        # Get the shortest interval from all vehicles
-        for vehicle in self._vehicles:
-            # Initially set interval to default
-            new_interval = interval
+        for vin, vehicle in self._vehicles.items():
+            observed = self._observe(vehicle)
+            adaptive = self._adaptive.get(vin, min(max(interval, interval_min), interval_max))
+            changed = vin in self._observed and observed != self._observed[vin]
+            if changed:
+                adaptive = max(interval_min, min(adaptive / 2, interval))
+            elif vin in self._observed and vin in self._polled and settled:
+                adaptive = min(interval_max, adaptive * 2)
+            if changed or settled:
+                self._polled.discard(vin)
+            self._observed[vin] = observed
+            self._adaptive[vin] = adaptive
 
-            # EV, decide which time to use based on whether we are plugged in or not
-            if Feature.BATTERY_STATUS in self._vehicles[vehicle].features and self._vehicles[vehicle].plugged_in == PluggedStatus.PLUGGED:
-                # If we are plugged in but not charging, increment a counter
-                if self._vehicles[vehicle].charging != ChargingStatus.CHARGING:
-                    self._pluggednotcharging[vehicle] += 1
-                else: # If we are plugged in and charging, reset counter
-                    self._pluggednotcharging[vehicle] = 0
+            new_interval = adaptive
+            # Keep up with a charging EV however static it has been, unless
+            # there is a poll lined up for when it should finish
+            event = self._events.get(vin)
+            charge_polled = event is not None and event[1] == 'charge_complete' and event[0] > now
+            if not charge_polled and Feature.BATTERY_STATUS in vehicle.features and vehicle.charging == ChargingStatus.CHARGING:
+                new_interval = min(new_interval, interval_charging)
 
-                # If we haven't hit the counter limit, use the shorter interval
-                if self._pluggednotcharging[vehicle] < 5:
-                    new_interval = interval_charging
+            # Poll at least as often as the profile asks for at this time of day
+            window = window_at(self._windows(vin), now)
+            if window is not None and window["interval"]:
+                new_interval = min(new_interval, window["interval"])
 
             # Update every minute if HVAC on
-            if self._vehicles[vehicle].hvac_status:
+            if vehicle.hvac_status:
                 new_interval = 1
 
-            # If the interval has changed, force next update
-            if new_interval != self._intervals[vehicle]:
-                _LOGGER.debug(f"Changing #{vehicle[-3:]} update interval to {new_interval} minutes")
-                self._force_update[vehicle] = True
-            
-            self._intervals[vehicle] = new_interval
-        
-        # Set the coordinator to update at the shortest interval
-        shortest_interval = min(self._intervals.values())
+            # Spread what is left of the daily budget over the rest of the day
+            if budget_factor > 1:
+                new_interval = math.ceil(new_interval * budget_factor)
 
-        if shortest_interval != (self.update_interval.seconds / 60):
-            _LOGGER.debug(f"Changing coordinator update interval to {shortest_interval} minutes")
-            self.update_interval = timedelta(minutes=shortest_interval)
-            self._async_unsub_refresh()
-            if self._listeners:
-                self._schedule_refresh()
+            if new_interval != self._intervals[vin]:
+                _LOGGER.debug("Changing #%s update interval to %d minutes", vin[-3:], new_interval)
+                self._intervals[vin] = new_interval
+                # Move the next poll to suit, but not into the past
+                if vin in self._last_polled:
+                    self._schedule_regular(vin, max(now, self._next_deadline(vin, self._last_polled[vin])))
+            elif self._budget_exhausted and vin in self._regular:
+                # Put the next poll off until the budget starts again
+                self._schedule_regular(vin, self._regular[vin])
+
+        self._schedule_events(now)
+        self._reschedule()
+
+    @staticmethod
+    def _charge_complete(vehicle):
+        """When a charging EV should be full, from the time the car last
+        reported as still needed at its charging speed."""
+        if Feature.BATTERY_STATUS not in vehicle.features or vehicle.charging != ChargingStatus.CHARGING:
+            return None
+        times = vehicle.charge_time_required_to_full
+        minutes = times.get(vehicle.charging_speed)
+        if minutes is None:
+            minutes = min((value for value in times.values() if value is not None), default=None)
+        if minutes is None:
+            return None
+        reported = vehicle.battery_status_last_updated
+        since = reported.timestamp() if isinstance(reported, datetime) else time()
+        return since + minutes * 60 + CHARGE_COMPLETE_MARGIN
+
+    @staticmethod
+    def _hvac_start(vehicle):
+        start = vehicle.next_hvac_start_date
+        if not isinstance(start, datetime):
+            return None
+        return start.timestamp() + HVAC_START_MARGIN
+
+    def _schedule_events(self, now):
+        """Bring a vehicle's next poll forward to its next predicted event."""
+        if self._budget_exhausted:
+            return
+        for vin, vehicle in self._vehicles.items():
+            if vin not in self._deadlines:
+                continue
+            for kind, at in (('charge_complete', self._charge_complete(vehicle)), ('hvac_start', self._hvac_start(vehicle))):
+                if at is not None and now < at < self._deadlines[vin] and quiet_until(self._windows(vin), at, self._charging(vin)) == at:
+                    _LOGGER.debug("Polling #%s for %s in %d seconds", vin[-3:], kind, at - now)
+                    self._events[vin] = (at, kind)
+                    self._schedule_vehicle(vin, at)
+
+    @callback
+    def async_seed(self):
+        """Treat every vehicle as polled just now, without calling the API.
+        Used at setup, when the state has only just been fetched."""
+        if not all(self._intervals.values()):
+            self.set_next_interval()
+        now = time()
+        for vehicle in self._vehicles:
+            self._last_polled[vehicle] = now
+            self._schedule_regular(vehicle, self._next_deadline(vehicle, now))
+        self._schedule_events(now)
+        self._reschedule()
+        self.async_set_updated_data(True)
 
     async def _async_update_data(self):
-        """Fetch data from API."""
-        try:
-            for vehicle in self._vehicles:
-                time_since_updated = round((time() - self._last_updated[vehicle]) / 60)
-                if self._force_update[vehicle] or time_since_updated >= self._intervals[vehicle]:
-                    _LOGGER.debug("Polling #%s as %d mins have elapsed (interval %d)", vehicle[-3:], time_since_updated, self._intervals[vehicle])
-                    self._last_updated[vehicle] = int(time())
-                    self._force_update[vehicle] = False
-                    await self._hass.async_add_executor_job(self._vehicles[vehicle].refresh)
-                else:
-                    _LOGGER.debug("NOT polling #%s as %d mins have elapsed (interval %d)", vehicle[-3:], time_since_updated, self._intervals[vehicle])                   
-        except BaseException:
-            _LOGGER.warning("Error communicating with API")
-            return False
-        
-        self._hass.async_create_task(self._hass.data[DOMAIN][self._account_id][DATA_COORDINATOR_FETCH].async_refresh())
-        return True
+        """Poll the vehicles that are due, then fetch the state of those that
+        reported in."""
+        now = time()
+        intervals = wake_intervals(self._config)
+        # Endpoints to wake each due vehicle for
+        wake = {}
+        while self._queue and self._queue[0][0] <= now + POLL_TOLERANCE:
+            deadline, vin = heapq.heappop(self._queue)
+            if self._deadlines.get(vin) != deadline:
+                continue
+            event = self._events.pop(vin, None)
+            if event is not None and event[0] == deadline:
+                # Polled for a predicted event, so only that endpoint is needed
+                endpoints = list(EVENT_ENDPOINTS[event[1]])
+            else:
+                endpoints = [
+                    endpoint for endpoint, interval in intervals.items()
+                    if interval and self._woken[vin].get(endpoint, self._last_polled[vin]) + interval * 60 <= now + POLL_TOLERANCE
+                ]
+                if self._regular[vin] <= now + POLL_TOLERANCE:
+                    endpoints += [endpoint for endpoint, interval in intervals.items() if interval is None]
+                    self._last_polled[vin] = now
+                    self._polled.add(vin)
+                    self._regular[vin] = self._next_deadline(vin, now)
+            for endpoint in endpoints:
+                self._woken[vin][endpoint] = now
+            self._schedule_regular(vin, self._regular[vin])
+            if endpoints:
+                _LOGGER.debug("Polling #%s for %s (interval %d)", vin[-3:], ", ".join(endpoints), self._intervals[vin])
+                wake[vin] = endpoints
 
+        # The fetch task started here counts its calls as the poll's too
+        with self._hass.data[DOMAIN][self._account_id][DATA_SESSION].calls.counting(POLL_SOURCE):
+            results = await self._async_update_vehicles(
+                lambda vehicle: vehicle.async_refresh(endpoints=wake[vehicle.vin]), wake
+            )
+            failed = self._failed_vehicles(results)
 
-class StatisticsCoordinator(DataUpdateCoordinator):
+            # Nothing new to fetch unless a car was asked to report in
+            refreshed = [vin for vin in wake if vin not in failed]
+            if refreshed:
+                endpoints = sorted({endpoint for vin in refreshed for endpoint in wake[vin]})
+                self._hass.async_create_task(
+                    self._hass.data[DOMAIN][self._account_id][DATA_COORDINATOR_FETCH].async_fetch_vehicles(refreshed, endpoints)
+                )
+        self._reschedule()
+        return not failed
+
+
+class StatisticsCoordinator(KamereonCoordinator):
     def __init__(self, hass, config):
         """Initialise coordinator."""
         super().__init__(
             hass,
-            _LOGGER,
+            config,
             name="Statistics Coordinator",
             update_interval=timedelta(minutes=config.get("interval_statistics", DEFAULT_INTERVAL_STATISTICS)),
         )
-        self._hass = hass
-        self._account_id = config['email']
-        self._vehicles = hass.data[DOMAIN][self._account_id][DATA_VEHICLES]
+
+    async def _async_fetch_statistics(self, vehicle):
+        daily, monthly = await asyncio.gather(
+            vehicle.async_fetch_trip_histories(Period.DAILY),
+            vehicle.async_fetch_trip_histories(Period.MONTHLY)
+        )
+        return {
+            'daily': daily,
+            'monthly': monthly
+        }
 
     async def _async_update_data(self):
         """Fetch data from API."""
+        vehicles = [vin for vin in self._vehicles if Feature.DRIVING_JOURNEY_HISTORY in self._vehicles[vin].features]
+        results = await self._async_update_vehicles(self._async_fetch_statistics, vehicles)
+
+        self._failed_vehicles(results)
+
         output = {}
-        try:
-            for vehicle in self._vehicles:
-                if not Feature.DRIVING_JOURNEY_HISTORY in self._vehicles[vehicle].features:
-                    continue
-
-                output[vehicle] = {
-                    'daily': await self._hass.async_add_executor_job(self._vehicles[vehicle].fetch_trip_histories, Period.DAILY),
-                    'monthly': await self._hass.async_add_executor_job(self._vehicles[vehicle].fetch_trip_histories, Period.MONTHLY)
-                }
-        except BaseException:
-            _LOGGER.warning("Error communicating with statistics API")
+        for vin, result in results.items():
+            if isinstance(result, BaseException):
+                # Keep showing the last statistics we had
+                if self.data and vin in self.data:
+                    output[vin] = self.data[vin]
+                continue
+            output[vin] = result
         
         return output
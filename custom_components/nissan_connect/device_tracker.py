@@ -21,7 +21,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
         if Feature.MY_CAR_FINDER in data[vehicle].features:
             entities.append(KamereonDeviceTracker(coordinator, data[vehicle]))
 
-    async_add_entities(entities, update_before_add=True)
+    async_add_entities(entities)
 
 
 class KamereonDeviceTracker(KamereonEntity, TrackerEntity):
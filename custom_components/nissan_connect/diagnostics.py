@@ -0,0 +1,32 @@
+"""Diagnostics support for NissanConnect."""
+from .const import DOMAIN, DATA_SESSION, DATA_VEHICLES, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL, DATA_COORDINATOR_STATISTICS
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return diagnostics for a config entry."""
+    data = hass.data[DOMAIN][entry.data['email']]
+    session = data[DATA_SESSION]
+
+    return {
+        'connections': session.connection_stats,
+        'authentication': session.auth_stats,
+        'retries': session.retry_stats,
+        'coalesced_requests': session.coalesce_stats,
+        'cache': session.cache.stats,
+        'circuits': session.circuit_stats,
+        'rate_limiter': session.rate_limiter.stats if session.rate_limiter else None,
+        'calls': session.calls.stats,
+        'coordinators': {
+            key: {
+                'cycle_deadline': data[key].cycle_deadline,
+                'overruns': data[key].overruns,
+            }
+            for key in (DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL, DATA_COORDINATOR_STATISTICS)
+        },
+        'capabilities': {
+            "#" + vin[-3:]: vehicle.capabilities for vin, vehicle in data[DATA_VEHICLES].items()
+        },
+        'profiles': {
+            "#" + vin[-3:]: data[DATA_COORDINATOR_POLL].profile(vin) for vin in data[DATA_VEHICLES]
+        },
+    }
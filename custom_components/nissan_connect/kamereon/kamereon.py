@@ -1,16 +1,29 @@
 # Based on work by @mitchellrj and @Tobiaswk
 # Portions re-licensed from Apache License, Version 2.0 with permission
 
+import asyncio
 import collections
+import contextlib
+import contextvars
 import datetime
+import email.utils
+import functools
+import heapq
+import itertools
 import json
 import os
 import logging
+import random
+import threading
+import types
 from typing import List
-import requests
+from urllib.parse import urlsplit
+import aiohttp
 import time
 from oauthlib.common import generate_nonce
-from oauthlib.oauth2 import TokenExpiredError
+from oauthlib.oauth2 import TokenExpiredError, WebApplicationClient
+import requests
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth2Session
 from .kamereon_const import *
 
@@ -81,22 +94,573 @@ class Notification:
         return resp
 
 
+# Errors raised when a connection couldn't be made. aiohttp has its own type
+# for a connect timeout from 3.10.
+_CONNECT_ERRORS = tuple(error for error in (
+    aiohttp.ClientConnectorError,
+    getattr(aiohttp, 'ConnectionTimeoutError', None),
+    requests.exceptions.ConnectTimeout,
+) if error is not None)
+
+
+class RetryPolicy:
+    """Decides whether and when a failed request is tried again.
+
+    GETs are idempotent, so they are retried after connection errors and
+    retryable status codes. POSTs start actions on the car, so they are only
+    retried when the server refused them outright (throttled or unavailable)
+    or the connection could not be made, as the action can't have run.
+    Delays use decorrelated jitter, and a Retry-After header takes precedence."""
+
+    def __init__(self, max_attempts=3, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, method, resp=None, error=None):
+        if error is not None:
+            if method == 'GET':
+                return True
+            return self.not_sent(error)
+        if method == 'GET':
+            return resp.status_code in RETRY_STATUS_CODES
+        return resp.status_code in (429, 503)
+
+    @staticmethod
+    def not_sent(error):
+        """Whether a request failed before a connection was made, so it can't
+        have reached the server."""
+        if isinstance(error, _CONNECT_ERRORS):
+            return True
+        # Before aiohttp 3.10 a connect timeout is told apart from a read
+        # timeout only by its message
+        return isinstance(error, aiohttp.ServerTimeoutError) and str(error).startswith('Connection timeout')
+
+    def delay(self, previous_delay, resp=None):
+        """Seconds to wait before the next attempt, or None to give up because
+        the server asked for a longer wait than we are willing to make."""
+        retry_after = self.retry_after(resp) if resp is not None else None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return min(self.max_delay, random.uniform(self.base_delay, max(previous_delay, self.base_delay) * 3))
+
+    @staticmethod
+    def retry_after(resp):
+        """Seconds from a Retry-After header, given either as seconds or a date."""
+        value = resp.headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max((when - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a host that has been failing."""
+
+
+class CircuitBreaker:
+    """Stops calls to a host after repeated failures.
+
+    Closed: calls go through and consecutive failures are counted.
+    Open: calls fail straight away with CircuitOpenError until reset_timeout
+    has passed. Half-open: a single probe call is let through, which closes
+    the circuit if it succeeds and opens it again if it fails."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may be made now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                _LOGGER.debug("Probing %s", self.name)
+                self.state = self.HALF_OPEN
+                return
+            raise CircuitOpenError(f"{self.name} is unavailable")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                _LOGGER.info("%s has recovered", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    _LOGGER.warning("%s is failing, pausing requests for %ss", self.name, self.reset_timeout)
+                    self.opened += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def record_status(self, status_code):
+        """Server errors count against the host; any other answer shows it is up."""
+        if status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_abandoned(self):
+        """A call ended without an answer either way, such as when it was
+        cancelled. A probe that was abandoned leaves the circuit open, so the
+        next call probes again."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    @property
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'opened': self.opened,
+        }
+
+
+class RateLimiter:
+    """Token bucket shared by all requests on a session.
+
+    Up to `burst` requests go straight through, after which they are released
+    at `rate` per second. Waiting requests are released in Priority order, so
+    a command sent during a large poll cycle jumps the queue."""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_LIMIT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        # Heap of (priority, sequence, future), sequence keeping FIFO order within a priority
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self._waits = collections.Counter()
+        self._wait_time = collections.Counter()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, priority=Priority.FETCH):
+        """Wait until a request of this priority may be sent."""
+        self._refill()
+        if not self._waiters and self._tokens >= 1:
+            self._tokens -= 1
+            return
+
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Released just as we were cancelled, so hand the token back
+                self._tokens += 1
+            else:
+                self._waiters = [waiter for waiter in self._waiters if waiter[2] is not future]
+                heapq.heapify(self._waiters)
+            if not self._waiters and self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._schedule()
+            raise
+        self._waits[priority.name] += 1
+        self._wait_time[priority.name] += time.monotonic() - start
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            delay = max(0, (1 - self._tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._release)
+
+    def _release(self):
+        self._timer = None
+        self._refill()
+        while self._waiters and self._tokens >= 1:
+            _, _, future = heapq.heappop(self._waiters)
+            # Skip requests that were cancelled while waiting
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        self._schedule()
+
+    @property
+    def stats(self):
+        return {
+            'queued': len(self._waiters),
+            'waits': dict(self._waits),
+            'wait_time': {name: round(seconds, 2) for name, seconds in self._wait_time.items()},
+        }
+
+
+class ResponseCache:
+    """LRU cache of GET responses with a TTL per endpoint.
+
+    A response younger than its TTL is fresh. After that it is stale for as
+    long again, during which it is still served but should be refetched.
+    Anything older is a miss. Entries for a vehicle are dropped when a
+    command is sent to it, as it is about to report new values."""
+
+    FRESH = 'fresh'
+    STALE = 'stale'
+
+    def __init__(self, ttls=None, max_entries=CACHE_MAX_ENTRIES):
+        self.ttls = dict(CACHE_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        # Key to (time stored, response), least recently used first
+        self._entries = collections.OrderedDict()
+        self._stats = collections.Counter()
+
+    def ttl(self, url):
+        return self.ttls.get(urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1], 0)
+
+    def get(self, key, url):
+        """Return (freshness, response), or (None, None) on a miss."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored, resp = entry
+            age = time.monotonic() - stored
+            ttl = self.ttl(url)
+            if age < ttl * 2:
+                self._entries.move_to_end(key)
+                freshness = self.FRESH if age < ttl else self.STALE
+                self._stats['hits' if freshness == self.FRESH else 'stale'] += 1
+                return freshness, resp
+            del self._entries[key]
+        self._stats['misses'] += 1
+        return None, None
+
+    def put(self, key, resp):
+        self._entries[key] = (time.monotonic(), resp)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def invalidate(self, url):
+        """Drop responses for the same vehicle as url."""
+        scope = _vehicle_scope(url)
+        for key in [key for key in self._entries if _vehicle_scope(key[0]) == scope]:
+            del self._entries[key]
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            **{name: self._stats[name] for name in ('hits', 'stale', 'misses', 'evictions')},
+        }
+
+
+def _vehicle_scope(url):
+    """Host and path up to the vehicle ID, e.g. https://host/car-adapter/v1/cars/VIN"""
+    parts = urlsplit(url)
+    segments = parts.path.strip('/').split('/')
+    if 'cars' in segments[:-1]:
+        segments = segments[:segments.index('cars') + 2]
+    return parts.netloc, tuple(segments)
+
+
+def _endpoint_name(method, url):
+    """Method and path of a URL with user and vehicle IDs removed, so retries
+    can be counted per endpoint rather than per car."""
+    segments = urlsplit(url).path.strip('/').split('/')
+    name = [segment for i, segment in enumerate(segments)
+            if i == 0 or segments[i - 1] not in ('users', 'cars')]
+    return '{} {}'.format(method, '/'.join(name))
+
+
+class CallCounter:
+    """HTTP calls made today, per endpoint and per vehicle, and per source for
+    calls made within counting(). Counts start again at midnight, in the time
+    zone of the `today` function, which defaults to the system's. on_update is
+    called after each call, possibly from an executor thread, so the counts
+    can be persisted."""
+
+    # Source of the calls made in the current context, see counting()
+    _source = contextvars.ContextVar('call_source', default=None)
+
+    def __init__(self, today=datetime.date.today):
+        self._lock = threading.Lock()
+        self.on_update = None
+        self.today = today
+        self._reset(self.today().isoformat())
+
+    def _reset(self, day):
+        self.day = day
+        self.started = time.time()
+        self._endpoints = collections.Counter()
+        self._vehicles = collections.defaultdict(collections.Counter)
+        self._sources = collections.Counter()
+
+    def _roll_over(self):
+        today = self.today().isoformat()
+        if today != self.day:
+            self._reset(today)
+
+    def record(self, method, url):
+        endpoint = _endpoint_name(method, url)
+        netloc, scope = _vehicle_scope(url)
+        with self._lock:
+            self._roll_over()
+            self._endpoints[endpoint] += 1
+            if 'cars' in scope:
+                self._vehicles[scope[-1].upper()][endpoint] += 1
+            source = self._source.get()
+            if source is not None:
+                self._sources[source] += 1
+        if self.on_update is not None:
+            self.on_update()
+
+    @property
+    def total(self):
+        with self._lock:
+            self._roll_over()
+            return sum(self._endpoints.values())
+
+    @contextlib.contextmanager
+    def counting(self, source):
+        """Count calls made within the block under a source, including those
+        made by tasks started in it."""
+        token = self._source.set(source)
+        try:
+            yield
+        finally:
+            self._source.reset(token)
+
+    def source(self, source):
+        """Calls made today under a source."""
+        with self._lock:
+            self._roll_over()
+            return self._sources[source]
+
+    def vehicle(self, vin):
+        """Calls made today for one vehicle, per endpoint."""
+        with self._lock:
+            self._roll_over()
+            return dict(self._vehicles.get(vin, {}))
+
+    @property
+    def stats(self):
+        with self._lock:
+            self._roll_over()
+            return {
+                'day': self.day,
+                'total': sum(self._endpoints.values()),
+                'endpoints': dict(self._endpoints),
+            }
+
+    def dump(self):
+        with self._lock:
+            return {
+                'day': self.day,
+                'started': self.started,
+                'endpoints': dict(self._endpoints),
+                'vehicles': {vin: dict(counts) for vin, counts in self._vehicles.items()},
+                'sources': dict(self._sources),
+            }
+
+    def load(self, state):
+        """Restore counts saved by dump(), if they are from today."""
+        if not state or state.get('day') != self.today().isoformat():
+            return
+        with self._lock:
+            self._reset(state['day'])
+            self.started = state.get('started', self.started)
+            self._endpoints.update(state.get('endpoints', {}))
+            for vin, counts in state.get('vehicles', {}).items():
+                self._vehicles[vin].update(counts)
+            self._sources.update(state.get('sources', {}))
+
+
+class KamereonResponse:
+    """Response read from aiohttp, shaped like the bits of requests.Response
+    the parsing code uses so the sync and async clients can share it."""
+
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
 class KamereonSession:
 
     tenant = None
     copy_realm = None
     unique_id = None
 
-    def __init__(self, region, unique_id=None):
+    def __init__(self, region, unique_id=None, websession=None, endpoint_concurrency=None, pool_size=HTTP_POOL_SIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT,
+                 rate_limit=RATE_LIMIT, rate_burst=RATE_LIMIT_BURST, cache_ttls=None):
         self.settings = SETTINGS_MAP[self.tenant][region]
-        session = requests.session()
+        # One long-lived session for both the login flow and API calls, so
+        # connections to the Kamereon hosts are kept alive across re-logins
+        self._adapter = HTTPAdapter(
+            pool_connections=len([k for k in self.settings if k.endswith('_base_url')]),
+            pool_maxsize=pool_size)
+        session = OAuth2Session(
+            client_id=self.settings['client_id'],
+            redirect_uri=self.settings['redirect_uri'],
+            scope=self.settings['scope'])
+        session.mount('https://', self._adapter)
         self.session = session
+        self._websession = websession
+        self._owns_websession = websession is None
+        self._pool_size = pool_size
+        self._async_connections = {
+            'created': 0,
+            'reused': 0,
+        }
+        # Max endpoints fetched in parallel per vehicle, None for no limit
+        self.endpoint_concurrency = endpoint_concurrency
+        self.set_timeouts(connect_timeout, read_timeout)
         self._oauth = None
+        self._token_url = None
+        self._reauth_lock = threading.Lock()
+        self._reauth_task = None
+        self._auth_stats = {
+            'logins': 0,
+            'refreshes': 0,
+            # Re-authentications avoided because one was already in flight or done
+            'coalesced': 0,
+        }
+        self.retry_policy = RetryPolicy()
+        # Applies to the async client only; None to send requests unthrottled
+        self.rate_limiter = RateLimiter(rate_limit, rate_burst) if rate_limit else None
+        # Circuit breakers keyed by base URL, see circuit()
+        self._circuits = {}
+        self.cache = ResponseCache(cache_ttls)
+        # Background refetches of stale cache entries
+        self._revalidations = set()
+        # GETs in flight, keyed by URL, parameters and headers
+        self._inflight = {}
+        self._coalesce_stats = {
+            'hits': 0,
+            'misses': 0,
+        }
+        # Retries made per endpoint, see _endpoint_name()
+        self._retries = collections.Counter()
+        # Every call sent, for daily budgets
+        self.calls = CallCounter()
         self._user_id = None
+        # Called whenever the token or user ID change, so they can be persisted
+        self.on_auth_update = None
         self.unique_id = unique_id
         # ugly hack
         os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
+    def set_timeouts(self, connect_timeout, read_timeout):
+        """Seconds to wait for a connection and for each read. Applied to
+        every call so a hung connection can't stall an update."""
+        self.timeout = (connect_timeout, read_timeout)
+        self._async_timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+    @property
+    def websession(self):
+        """aiohttp session used by the async client."""
+        if self._websession is None:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create)
+            trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+            self._websession = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._pool_size,
+                    keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT),
+                trace_configs=[trace_config])
+        return self._websession
+
+    async def _on_connection_create(self, session, context, params):
+        self._async_connections['created'] += 1
+
+    async def _on_connection_reuse(self, session, context, params):
+        self._async_connections['reused'] += 1
+
+    @property
+    def connection_stats(self):
+        """Connections opened and reused by the sync and async clients."""
+        pools = self._adapter.poolmanager.pools
+        sync_created = 0
+        sync_requests = 0
+        for key in pools.keys():
+            sync_created += pools[key].num_connections
+            sync_requests += pools[key].num_requests
+        return {
+            'sync': {
+                'created': sync_created,
+                'reused': max(sync_requests - sync_created, 0),
+            },
+            'async': dict(self._async_connections),
+        }
+
+    def close(self):
+        self.session.close()
+
+    async def async_close(self):
+        """Close the connection pools. The session can't be used afterwards."""
+        for task in self._revalidations:
+            task.cancel()
+        if self._owns_websession and self._websession is not None:
+            await self._websession.close()
+        self.close()
+
+    def set_credentials(self, username, password):
+        """Cache credentials for later logins without logging in now."""
+        self._username = username
+        self._password = password
+
+    @property
+    def auth_state(self):
+        """Token and user ID, for persisting between restarts."""
+        return {
+            'token': dict(self._oauth.token) if self._oauth else None,
+            'token_url': self._token_url,
+            'user_id': self._user_id,
+        }
+
+    def restore_auth(self, state):
+        """Reuse a previously saved auth_state instead of logging in. An expired or
+        revoked token is renewed as usual on first use. Returns False if there is
+        no token to restore."""
+        if not state or not state.get('token'):
+            return False
+        self.session.token = state['token']
+        self._oauth = self.session
+        self._token_url = state.get('token_url')
+        if state.get('user_id'):
+            self._user_id = state['user_id']
+            _registry[USERS][self._user_id] = self
+        return True
+
+    def _auth_updated(self):
+        if self.on_auth_update is not None:
+            self.on_auth_update()
+
     def login(self, username=None, password=None):
         if username is not None and password is not None:
             # Cache credentials
@@ -107,8 +671,8 @@ class KamereonSession:
             username = self._username
             password = self._password
         
-        # Reset session
-        self.session = requests.session()
+        # Reset cookies from any previous login, keeping the pooled connections
+        self.session.cookies.clear()
 
         # grab an auth ID to use as part of the username/password login request,
         # then move to the regular OAuth2 process
@@ -123,7 +687,9 @@ class KamereonSession:
                 'X-Username': 'anonymous',
                 'X-Password': 'anonymous',
                 'Accept': 'application/json',
-            })
+            },
+            timeout=self.timeout,
+            withhold_token=True)
         next_body = resp.json()
 
         # insert the username, and password
@@ -143,7 +709,9 @@ class KamereonSession:
                 'Accept': 'application/json',
                 'Content-Type': 'application/json',
             },
-            data=json.dumps(next_body))
+            data=json.dumps(next_body),
+            timeout=self.timeout,
+            withhold_token=True)
 
         oauth_data = resp.json()
 
@@ -165,23 +733,449 @@ class KamereonSession:
                 'scope': self.settings['scope'],
                 'nonce': nonce,
             },
-            allow_redirects=False)
+            allow_redirects=False,
+            timeout=self.timeout,
+            withhold_token=True)
         oauth_authorize_url = resp.headers['location']
 
         oauth_token_url = '{}oauth2{}/access_token'.format(
             self.settings['auth_base_url'],
             oauth_data['realm']
             )
-        self._oauth = OAuth2Session(
-            client_id=self.settings['client_id'],
-            redirect_uri=self.settings['redirect_uri'],
-            scope=self.settings['scope'])
-        self._oauth._client.nonce = nonce
-        self._oauth.fetch_token(
+        self.session._client.nonce = nonce
+        self.session.fetch_token(
             oauth_token_url,
             authorization_response=oauth_authorize_url,
             client_secret=self.settings['client_secret'],
-            include_client_id=True)
+            include_client_id=True,
+            timeout=self.timeout)
+        self._token_url = oauth_token_url
+        self._oauth = self.session
+        self._auth_stats['logins'] += 1
+        self._auth_updated()
+
+    @property
+    def auth_stats(self):
+        return dict(self._auth_stats)
+
+    @property
+    def retry_stats(self):
+        """Retries made per endpoint."""
+        return dict(self._retries)
+
+    def circuit(self, url):
+        """Circuit breaker for the base URL a request goes to."""
+        base_url = next(
+            (self.settings[key] for key in self.settings
+             if key.endswith('_base_url') and url.startswith(self.settings[key])),
+            None)
+        if base_url is None:
+            parts = urlsplit(url)
+            base_url = f'{parts.scheme}://{parts.netloc}/'
+        if base_url not in self._circuits:
+            self._circuits[base_url] = CircuitBreaker(base_url)
+        return self._circuits[base_url]
+
+    @property
+    def circuit_stats(self):
+        return {base_url: circuit.stats for base_url, circuit in self._circuits.items()}
+
+    def _access_token(self):
+        return self._oauth.token.get('access_token') if self._oauth else None
+
+    def _token_expiring(self):
+        expires_at = self.oauth.token.get('expires_at')
+        return expires_at is not None and expires_at - TOKEN_REFRESH_MARGIN < time.time()
+
+    def refresh_access_token(self):
+        """Renew the access token using the refresh token, which is a single
+        round trip. Falls back to a full login if that isn't possible."""
+        refresh_token = self._oauth.token.get('refresh_token') if self._oauth else None
+        if self._token_url and refresh_token:
+            try:
+                self.session.refresh_token(
+                    self._token_url,
+                    refresh_token=refresh_token,
+                    client_id=self.settings['client_id'],
+                    client_secret=self.settings['client_secret'],
+                    timeout=self.timeout)
+                self._auth_stats['refreshes'] += 1
+                self._auth_updated()
+                return
+            except Exception as e:
+                _LOGGER.debug("Token refresh failed, logging in again: %s", e)
+        self.login()
+
+    def reauthenticate(self, stale_token=None):
+        """Renew the token once for every thread that found it expired. Callers
+        pass the access token they used, and skip if it has since been replaced."""
+        with self._reauth_lock:
+            if stale_token is not None and self._access_token() != stale_token:
+                self._auth_stats['coalesced'] += 1
+                return
+            self.refresh_access_token()
+
+    async def async_login(self, username=None, password=None):
+        """Async equivalent of login(), sharing the resulting token with the sync client."""
+        if username is not None and password is not None:
+            # Cache credentials
+            self._username = username
+            self._password = password
+        else:
+            # Use cached credentials
+            username = self._username
+            password = self._password
+
+        # Reset cookies from any previous login
+        self.websession.cookie_jar.clear()
+
+        auth_url = '{}json/realms/root/realms/{}/authenticate'.format(
+            self.settings['auth_base_url'],
+            self.settings['realm'],
+        )
+        resp = await self._async_send(
+            'POST',
+            auth_url,
+            headers={
+                'Accept-Api-Version': API_VERSION,
+                'X-Username': 'anonymous',
+                'X-Password': 'anonymous',
+                'Accept': 'application/json',
+            })
+        next_body = resp.json()
+
+        # insert the username, and password
+        for c in next_body['callbacks']:
+            input_type = c['type']
+            if input_type == 'NameCallback':
+                c['input'][0]['value'] = username
+            elif input_type == 'PasswordCallback':
+                c['input'][0]['value'] = password
+
+        resp = await self._async_send(
+            'POST',
+            auth_url,
+            headers={
+                'Accept-Api-Version': API_VERSION,
+                'X-Username': 'anonymous',
+                'X-Password': 'anonymous',
+                'Accept': 'application/json',
+                'Content-Type': 'application/json',
+            },
+            data=json.dumps(next_body))
+
+        oauth_data = resp.json()
+
+        if 'realm' not in oauth_data:
+            _LOGGER.error("Invalid credentials provided: %s", resp.text)
+            raise RuntimeError("Invalid credentials")
+
+        oauth_authorize_url = '{}oauth2{}/authorize'.format(
+            self.settings['auth_base_url'],
+            oauth_data['realm']
+            )
+        nonce = generate_nonce()
+        resp = await self._async_send(
+            'GET',
+            oauth_authorize_url,
+            params={
+                'client_id': self.settings['client_id'],
+                'redirect_uri': self.settings['redirect_uri'],
+                'response_type': 'code',
+                'scope': self.settings['scope'],
+                'nonce': nonce,
+            },
+            allow_redirects=False)
+        oauth_authorize_url = resp.headers['location']
+
+        oauth_token_url = '{}oauth2{}/access_token'.format(
+            self.settings['auth_base_url'],
+            oauth_data['realm']
+            )
+        client = WebApplicationClient(self.settings['client_id'])
+        client.nonce = nonce
+        client.parse_request_uri_response(oauth_authorize_url)
+        resp = await self._async_send(
+            'POST',
+            oauth_token_url,
+            headers={
+                'Accept': 'application/json',
+                'Content-Type': 'application/x-www-form-urlencoded',
+            },
+            data=client.prepare_request_body(
+                code=client.code,
+                redirect_uri=self.settings['redirect_uri'],
+                include_client_id=True,
+                client_secret=self.settings['client_secret']))
+        client.parse_request_body_response(resp.text, scope=self.settings['scope'])
+
+        # Share the token with the sync client
+        self.session.token = client.token
+        self._token_url = oauth_token_url
+        self._oauth = self.session
+        self._auth_stats['logins'] += 1
+        self._auth_updated()
+
+    async def async_refresh_access_token(self):
+        """Async equivalent of refresh_access_token()."""
+        refresh_token = self._oauth.token.get('refresh_token') if self._oauth else None
+        if self._token_url and refresh_token:
+            try:
+                client = WebApplicationClient(self.settings['client_id'])
+                resp = await self._async_send(
+                    'POST',
+                    self._token_url,
+                    headers={
+                        'Accept': 'application/json',
+                        'Content-Type': 'application/x-www-form-urlencoded',
+                    },
+                    data=client.prepare_refresh_body(
+                        refresh_token=refresh_token,
+                        scope=self.settings['scope'],
+                        client_id=self.settings['client_id'],
+                        client_secret=self.settings['client_secret']))
+                client.parse_request_body_response(resp.text, scope=self.settings['scope'])
+                token = client.token
+                # The refresh token isn't always rotated
+                token.setdefault('refresh_token', refresh_token)
+                self.session.token = token
+                self._auth_stats['refreshes'] += 1
+                self._auth_updated()
+                return
+            except Exception as e:
+                _LOGGER.debug("Token refresh failed, logging in again: %s", e)
+        await self.async_login()
+
+    async def async_reauthenticate(self, stale_token=None):
+        """Async equivalent of reauthenticate(). Concurrent callers share a
+        single in-flight refresh or login rather than each starting their own."""
+        if stale_token is not None and self._access_token() != stale_token:
+            self._auth_stats['coalesced'] += 1
+            return
+
+        if self._reauth_task is None:
+            self._reauth_task = asyncio.ensure_future(self._async_reauthenticate())
+        else:
+            self._auth_stats['coalesced'] += 1
+
+        # Shielded so one cancelled caller doesn't cancel it for everyone else
+        await asyncio.shield(self._reauth_task)
+
+    async def _async_reauthenticate(self):
+        try:
+            await self.async_refresh_access_token()
+        finally:
+            self._reauth_task = None
+
+    async def _async_send(self, method, url, headers=None, params=None, data=None, allow_redirects=True):
+        """Send a request through the circuit breaker for its host. Server errors
+        and failed connections count against the host; other responses don't."""
+        circuit = self.circuit(url)
+        circuit.before_call()
+        self.calls.record(method, url)
+        try:
+            resp = await self._async_http(method, url, headers=headers, params=params, data=data, allow_redirects=allow_redirects)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            circuit.record_failure()
+            raise
+        except BaseException:
+            circuit.record_abandoned()
+            raise
+        circuit.record_status(resp.status_code)
+        return resp
+
+    def _send(self, method, url, headers=None, params=None, data=None):
+        """Blocking version of _async_send."""
+        circuit = self.circuit(url)
+        circuit.before_call()
+        self.calls.record(method, url)
+        try:
+            if method == 'GET':
+                resp = self.oauth.get(url, headers=headers, params=params, timeout=self.timeout)
+            else:
+                resp = self.oauth.post(url, data=data, headers=headers, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            circuit.record_failure()
+            raise
+        except BaseException:
+            circuit.record_abandoned()
+            raise
+        circuit.record_status(resp.status_code)
+        return resp
+
+    async def _async_http(self, method, url, headers=None, params=None, data=None, allow_redirects=True):
+        async with self.websession.request(
+                method, url, headers=headers, params=params, data=data,
+                allow_redirects=allow_redirects, timeout=self._async_timeout) as resp:
+            return KamereonResponse(resp.status, resp.headers, await resp.text())
+
+    async def _async_access_token(self):
+        if self._token_expiring():
+            _LOGGER.debug("Token about to expire, refreshing")
+            await self.async_reauthenticate(stale_token=self._access_token())
+        return self.oauth.token['access_token']
+
+    async def async_request(self, method, url, headers=None, params=None, data=None, max_retries=None,
+                            priority=Priority.FETCH):
+        """Authenticated request, retried according to retry_policy. A 401 is
+        answered by renewing the token and trying again. Backoff sleeps on the
+        event loop, never in a thread. Every attempt waits its turn on the
+        rate limiter at the given priority.
+
+        GETs to endpoints with a TTL in the cache are answered from it, with
+        stale responses refetched in the background. A GET identical to one
+        already in flight shares its response rather than being sent again."""
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        if method != 'GET':
+            resp = await self._async_request(method, url, headers, params, data, max_retries, priority)
+            self.cache.invalidate(url)
+            return resp
+
+        key = (url, tuple(sorted((params or {}).items())), tuple(sorted((headers or {}).items())))
+        if self.cache.ttl(url):
+            freshness, resp = self.cache.get(key, url)
+            if freshness == ResponseCache.STALE and key not in self._inflight:
+                task = asyncio.ensure_future(self._async_get(key, url, headers, params, max_retries, Priority.STATISTICS))
+                self._revalidations.add(task)
+                task.add_done_callback(self._revalidation_done)
+            if resp is not None:
+                return resp
+        return await self._async_get(key, url, headers, params, max_retries, priority)
+
+    def _revalidation_done(self, task):
+        self._revalidations.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.debug("Refetching stale response failed: %s", task.exception())
+
+    async def _async_get(self, key, url, headers, params, max_retries, priority):
+        """GET, sharing the response with identical requests in flight."""
+        task = self._inflight.get(key)
+        if task is None:
+            self._coalesce_stats['misses'] += 1
+            task = asyncio.ensure_future(self._async_request('GET', url, headers, params, None, max_retries, priority))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._inflight_done, key))
+        else:
+            self._coalesce_stats['hits'] += 1
+        # One caller giving up mustn't cancel the request for the others
+        return await asyncio.shield(task)
+
+    def _inflight_done(self, key, task):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Retrieving the error also stops it being reported as unhandled if every caller was cancelled
+        if task.exception() is None and 200 <= task.result().status_code < 300 and self.cache.ttl(key[0]):
+            self.cache.put(key, task.result())
+
+    @property
+    def coalesce_stats(self):
+        """GETs that shared an in-flight request (hits) or were sent (misses)."""
+        return dict(self._coalesce_stats)
+
+    async def _async_request(self, method, url, headers, params, data, max_retries, priority):
+        attempts = max_retries or self.retry_policy.max_attempts
+        delay = 0
+        for attempt in range(attempts):
+            # A failed login isn't a failed request, so it isn't retried here
+            token = await self._async_access_token()
+            try:
+                auth_headers = dict(headers or {})
+                auth_headers['Authorization'] = 'Bearer {}'.format(token)
+                if self.rate_limiter is not None:
+                    await self.rate_limiter.acquire(priority)
+                resp = await self._async_send(method, url, headers=auth_headers, params=params, data=data)
+
+                # Check for token expiration
+                if resp.status_code == 401:
+                    raise TokenExpiredError()
+
+            except TokenExpiredError:
+                _LOGGER.debug("Token expired. Refreshing session and retrying.")
+                await self.async_reauthenticate(stale_token=token)
+                continue
+            except CircuitOpenError:
+                # Retrying would only hit the open circuit again
+                raise
+            except Exception as e:
+                delay = self._retry_delay(method, url, attempt, attempts, delay, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(method, url, attempt, attempts, delay, resp=resp)
+                if delay is None:
+                    return resp
+            await asyncio.sleep(delay)
+
+        raise RuntimeError("Max retries reached, but the request could not be completed.")
+
+    def request(self, method, url, headers=None, params=None, data=None, max_retries=None):
+        """Blocking version of async_request, with the same retry policy and
+        circuit breakers but without the rate limiter or response cache.
+        Avoid from an event loop, as backoff sleeps the thread."""
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        attempts = max_retries or self.retry_policy.max_attempts
+        delay = 0
+        for attempt in range(attempts):
+            # A failed login isn't a failed request, so it isn't retried here
+            token = self._access_token()
+            if self._token_expiring():
+                _LOGGER.debug("Token about to expire, refreshing")
+                self.reauthenticate(stale_token=token)
+                token = self._access_token()
+            try:
+                resp = self._send(method, url, headers=headers, params=params, data=data)
+
+                # Check for token expiration
+                if resp.status_code == 401:
+                    raise TokenExpiredError()
+
+            except TokenExpiredError:
+                _LOGGER.debug("Token expired. Refreshing session and retrying.")
+                self.reauthenticate(stale_token=token)
+                continue
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(method, url, attempt, attempts, delay, error=e)
+                if delay is None:
+                    raise
+            else:
+                delay = self._retry_delay(method, url, attempt, attempts, delay, resp=resp)
+                if delay is None:
+                    if method != 'GET':
+                        self.cache.invalidate(url)
+                    return resp
+            time.sleep(delay)
+
+        raise RuntimeError("Max retries reached, but the request could not be completed.")
+
+    def _retry_delay(self, method, url, attempt, attempts, delay, resp=None, error=None):
+        """Seconds to wait before the next attempt at a request that got resp
+        or failed with error, or None to return the response or raise the
+        error now. Shared by request() and async_request()."""
+        policy = self.retry_policy
+        if error is not None:
+            _LOGGER.debug(f"Request failed on attempt {attempt + 1} of {attempts}: {error}")
+            if attempt == attempts - 1 or not policy.should_retry(method, error=error):
+                return None
+        elif not policy.should_retry(method, resp=resp):
+            return None
+        else:
+            _LOGGER.debug(f"Request returned {resp.status_code} on attempt {attempt + 1} of {attempts}")
+        if attempt == attempts - 1:
+            # Out of attempts, let the caller see the last response
+            return None
+        delay = policy.delay(delay, resp)
+        if delay is None:
+            _LOGGER.debug("Server asked us to wait longer than %ss, giving up", policy.max_delay)
+            return None
+        self._retries[_endpoint_name(method, url)] += 1
+        return delay
 
     @property
     def oauth(self):
@@ -193,15 +1187,18 @@ class KamereonSession:
     def user_id(self):
         if not self._user_id:
             resp = self.oauth.get(
-                '{}v1/users/current'.format(self.settings['user_adapter_base_url'])
+                '{}v1/users/current'.format(self.settings['user_adapter_base_url']),
+                timeout=self.timeout
             )
             self._user_id = resp.json()['userId']
             _registry[USERS][self._user_id] = self
+            self._auth_updated()
         return self._user_id
 
     def fetch_vehicles(self):
         resp = self.oauth.get(
-            '{}v5/users/{}/cars'.format(self.settings['user_base_url'], self.user_id)
+            '{}v5/users/{}/cars'.format(self.settings['user_base_url'], self.user_id),
+            timeout=self.timeout
         )
         vehicles = []
         for vehicle_data in resp.json()['data']:
@@ -210,6 +1207,45 @@ class KamereonSession:
             _registry[VEHICLES][vehicle.vin] = vehicle
         return vehicles
 
+    async def async_get_user_id(self):
+        if not self._user_id:
+            resp = await self.async_request(
+                'GET',
+                '{}v1/users/current'.format(self.settings['user_adapter_base_url'])
+            )
+            self._user_id = resp.json()['userId']
+            _registry[USERS][self._user_id] = self
+            self._auth_updated()
+        return self._user_id
+
+    async def async_fetch_vehicle_records(self):
+        """Raw vehicle records for the account, without creating Vehicles."""
+        user_id = await self.async_get_user_id()
+        resp = await self.async_request(
+            'GET',
+            '{}v5/users/{}/cars'.format(self.settings['user_base_url'], user_id)
+        )
+        return resp.json()['data']
+
+    async def async_fetch_vehicles(self):
+        user_id = await self.async_get_user_id()
+        vehicles = []
+        for vehicle_data in await self.async_fetch_vehicle_records():
+            vehicle = Vehicle(vehicle_data, user_id)
+            vehicles.append(vehicle)
+            _registry[VEHICLES][vehicle.vin] = vehicle
+        return vehicles
+
+    def restore_vehicles(self, snapshots, user_id):
+        """Rebuild vehicles from Vehicle.dump_state() output without any API calls."""
+        vehicles = []
+        for snapshot in snapshots:
+            vehicle = Vehicle(snapshot['data'], user_id)
+            vehicle.load_state(snapshot['state'])
+            vehicles.append(vehicle)
+            _registry[VEHICLES][vehicle.vin] = vehicle
+        return vehicles
+
 
 class NCISession(KamereonSession):
 
@@ -217,6 +1253,86 @@ class NCISession(KamereonSession):
     copy_realm = 'P_NCB'
 
 
+class _Snapshot:
+    """Immutable telemetry from one endpoint. Fetches build a new snapshot and
+    swap it in whole, so readers never see half an update, and an unchanged
+    endpoint keeps the same object so changes are found by identity."""
+
+    __slots__ = ()
+    _defaults = {}
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            value = values[name] if name in values else self._defaults.get(name)
+            if isinstance(value, dict):
+                value = types.MappingProxyType(dict(value))
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def replace(self, **changes):
+        """Copy with some values changed, or this snapshot if none differ."""
+        if all(getattr(self, name) == value for name, value in changes.items()):
+            return self
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return self.__class__(**values)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, ', '.join(
+            f'{name}={getattr(self, name)!r}' for name in self.__slots__))
+
+
+class LocationState(_Snapshot):
+    __slots__ = ('location', 'location_last_updated')
+
+
+class LockState(_Snapshot):
+    __slots__ = ('door_status', 'lock_status', 'lock_status_last_updated')
+    _defaults = {
+        'door_status': {door: None for door in (Door.FRONT_LEFT, Door.FRONT_RIGHT, Door.REAR_LEFT, Door.REAR_RIGHT, Door.HATCH)},
+    }
+
+
+class HVACState(_Snapshot):
+    __slots__ = (
+        'external_temperature', 'internal_temperature', 'next_target_temperature', 'hvac_status',
+        'next_hvac_start_date', 'hvac_status_last_updated'
+    )
+
+
+class BatteryState(_Snapshot):
+    __slots__ = (
+        'battery_supported', 'battery_capacity', 'battery_level', 'battery_temperature', 'battery_bar_level',
+        'instantaneous_power', 'charging_speed', 'charge_time_required_to_full', 'range_hvac_off',
+        'range_hvac_on', 'charging', 'plugged_in', 'plugged_in_time', 'unplugged_time',
+        'battery_status_last_updated'
+    )
+    _defaults = {
+        'battery_supported': True,
+        'charge_time_required_to_full': {
+            ChargingSpeed.FAST: None,
+            ChargingSpeed.NORMAL: None,
+            ChargingSpeed.SLOW: None,
+            ChargingSpeed.ADAPTIVE: None
+        },
+        'charging': ChargingStatus.NOT_CHARGING,
+        'plugged_in': PluggedStatus.NOT_PLUGGED,
+    }
+
+
+class CockpitState(_Snapshot):
+    __slots__ = (
+        'eco_score', 'fuel_autonomy', 'fuel_consumption', 'fuel_economy', 'fuel_level',
+        'fuel_low_warning', 'fuel_quantity', 'mileage', 'total_mileage'
+    )
+
+
 class Vehicle:
 
     def __repr__(self):
@@ -229,19 +1345,108 @@ class Vehicle:
     def session(self):
         return _registry[USERS][self.user_id]
 
+    # Telemetry saved by dump_state(), grouped by how it is encoded
+    _STATE_PLAIN = (
+        'battery_supported', 'battery_capacity', 'battery_level', 'battery_temperature',
+        'battery_bar_level', 'instantaneous_power', 'range_hvac_off', 'range_hvac_on',
+        'combustion_fuel_unit_cost', 'electricity_unit_cost', 'external_temperature',
+        'internal_temperature', 'hvac_status', 'next_target_temperature', 'eco_score',
+        'fuel_autonomy', 'fuel_consumption', 'fuel_economy', 'fuel_level', 'fuel_low_warning',
+        'fuel_quantity', 'mileage', 'total_mileage'
+    )
+    _STATE_DATETIME = (
+        'plugged_in_time', 'unplugged_time', 'battery_status_last_updated', 'location_last_updated',
+        'next_hvac_start_date', 'hvac_status_last_updated', 'lock_status_last_updated'
+    )
+    # v3 battery status fields without which v1 still has to be called
+    _V3_BATTERY_REQUIRED = ('batteryLevel', 'chargeStatus', 'batteryAutonomy')
+    # Fields v1 provides that are taken from v3 when it has them
+    _V3_BATTERY_FIELDS = {
+        'batteryLevel': 'battery_level',
+        'batteryCapacity': 'battery_capacity',
+        'batteryTemperature': 'battery_temperature',
+        'batteryBarLevel': 'battery_bar_level',
+        'instantaneousPower': 'instantaneous_power',
+    }
+    _STATE_ENUM = {
+        'charging_speed': ChargingSpeed,
+        'charging': ChargingStatus,
+        'plugged_in': PluggedStatus,
+        'lock_status': LockStatus,
+    }
+    _SNAPSHOT_TYPES = {
+        'location': LocationState,
+        'lock_status': LockState,
+        'hvac_status': HVACState,
+        'battery_status': BatteryState,
+        'cockpit': CockpitState,
+    }
+    _JSON_API = {'Content-Type': 'application/vnd.api+json'}
+    # Action asking the car to report each of WAKE_ENDPOINTS, and the features
+    # of which the vehicle needs one, if any
+    _REFRESH_ACTIONS = {
+        'location': ('RefreshLocation', frozenset({Feature.MY_CAR_FINDER})),
+        'lock_status': ('RefreshLockStatus', frozenset({Feature.LOCK_STATUS_CHECK})),
+        'hvac_status': ('RefreshHvacStatus', frozenset({Feature.INTERIOR_TEMP_SETTINGS, Feature.TEMPERATURE})),
+        'battery_status': ('RefreshBatteryStatus', None),
+    }
+    _REFRESH_DEFAULT = ('location', 'battery_status')
+    # Base URL setting, path and headers of each endpoint read, and the
+    # features of which the vehicle needs one, if any. The battery-status
+    # endpoint isn't just for EV's. ICE Nissans publish the range under this!
+    # There is no obvious feature to qualify this, so we just suck it and see.
+    _FETCHES = {
+        'location': ('car_adapter_base_url', 'v1/cars/{vin}/location', _JSON_API, frozenset({Feature.MY_CAR_FINDER})),
+        'lock_status': ('car_adapter_base_url', 'v1/cars/{vin}/lock-status', _JSON_API, frozenset({Feature.LOCK_STATUS_CHECK})),
+        'hvac_status': ('car_adapter_base_url', 'v1/cars/{vin}/hvac-status', _JSON_API,
+                        frozenset({Feature.INTERIOR_TEMP_SETTINGS, Feature.TEMPERATURE})),
+        'battery_status_leaf': ('car_adapter_base_url', 'v1/cars/{vin}/battery-status', _JSON_API, None),
+        'battery_status_ariya': ('user_base_url', 'v3/cars/{vin}/battery-status?canGen={can_generation}', _JSON_API, None),
+        'cockpit': ('car_adapter_base_url', 'v1/cars/{vin}/cockpit', None, None),
+    }
+
+    @property
+    def snapshots(self):
+        """Current snapshot per endpoint group. Compare with an earlier call
+        using `is` to find what changed."""
+        return dict(self._snapshots)
+
+    def _swap(self, group, **changes):
+        """Replace a group's snapshot with one carrying the changes."""
+        self._snapshots[group] = self._snapshots[group].replace(**changes)
+
     def __init__(self, data, user_id):
+        self._data = data
         self.user_id = user_id
         self.vin = data['vin'].upper()
-        self.features = []
+        # True while the state is from load_state() and not yet confirmed by a fetch
+        self.restored = False
+        # Last response applied per endpoint, see _apply()
+        self._watermarks = {}
+        # What each endpoint has returned for this vehicle, see _capable()
+        self._capabilities = {}
+        # Battery status endpoints to call: 'v1', 'v3' or 'both', see _update_battery_status_ariya().
+        # The v3 endpoint is asked for a CAN generation, so it's no use without one.
+        self._battery_route = 'both' if data.get('modelName') == 'Ariya' and data.get('canGeneration') else 'v1'
+        # Last v1 values the v3 parser falls back on
+        self._leaf_fallbacks = {
+            'range_hvac_on': None,
+            'time_required_to_full_normal': None,
+        }
+        # Incremented whenever a response changes the vehicle's state
+        self.version = 0
 
         # Try to parse every feature, but dont fail if we dont recognise one
+        features = set()
         for u in data.get('services', []):
             if u['activationState'] == "ACTIVATED":
                 try:
-                    self.features.append(Feature(str(u['id'])))
+                    features.add(Feature(str(u['id'])))
                 except ValueError:
                     _LOGGER.debug(f"Unknown feature {str(u['id'])}")
                     pass
+        # Looked up on every fetch and entity update
+        self.features = frozenset(features)
         
         _LOGGER.debug("Active features: %s", self.features)
 
@@ -261,82 +1466,14 @@ class Vehicle:
         self.picture_url = data.get('pictureURL')
         self.privacy_mode = data.get('privacyMode')
         self.registration_number = data.get('registrationNumber')
-        self.battery_supported = True
-        self.battery_capacity = None
-        self.battery_level = None
-        self.battery_temperature = None
-        self.battery_bar_level = None
-        self.instantaneous_power = None
-        self.charging_speed = None
-        self.charge_time_required_to_full = {
-            ChargingSpeed.FAST: None,
-            ChargingSpeed.NORMAL: None,
-            ChargingSpeed.SLOW: None,
-            ChargingSpeed.ADAPTIVE: None
-        }
-        self.range_hvac_off = None
-        self.range_hvac_on = None
-        self.charging = ChargingStatus.NOT_CHARGING
-        self.plugged_in = PluggedStatus.NOT_PLUGGED
-        self.plugged_in_time = None
-        self.unplugged_time = None
-        self.battery_status_last_updated = None
-        self.location = None
-        self.location_last_updated = None
         self.combustion_fuel_unit_cost = None
         self.electricity_unit_cost = None
-        self.external_temperature = None
-        self.internal_temperature = None
-        self.hvac_status = None
-        self.next_hvac_start_date = None
-        self.next_target_temperature = None
-        self.hvac_status_last_updated = None
-        self.door_status = {
-            Door.FRONT_LEFT: None,
-            Door.FRONT_RIGHT: None,
-            Door.REAR_LEFT: None,
-            Door.REAR_RIGHT: None,
-            Door.HATCH: None
-        }
-        self.lock_status = None
-        self.lock_status_last_updated = None
-        self.eco_score = None
-        self.fuel_autonomy = None
-        self.fuel_consumption = None
-        self.fuel_economy = None
-        self.fuel_level = None
-        self.fuel_low_warning = None
-        self.fuel_quantity = None
-        self.mileage = None
-        self.total_mileage = None
-
-    def _request(self, method, url, headers=None, params=None, data=None, max_retries=3):
-        for attempt in range(max_retries):
-            try:
-                if method == 'GET':
-                    resp = self.session.oauth.get(url, headers=headers, params=params)
-                elif method == 'POST':
-                    resp = self.session.oauth.post(url, data=data, headers=headers)
-                else:
-                    raise ValueError(f"Unsupported HTTP method: {method}")
+        # Latest telemetry from each endpoint, read through the properties
+        # added below the class
+        self._snapshots = {group: snapshot_type() for group, snapshot_type in self._SNAPSHOT_TYPES.items()}
 
-                # Check for token expiration
-                if resp.status_code == 401:
-                    raise TokenExpiredError()
-                
-                # Successful request
-                return resp
-
-            except TokenExpiredError:
-                _LOGGER.debug("Token expired. Refreshing session and retrying.")
-                self.session.login()
-            except Exception as e:
-                _LOGGER.debug(f"Request failed on attempt {attempt + 1} of {max_retries}: {e}")
-                if attempt == max_retries - 1:  # Exhausted retries
-                    raise
-                time.sleep(2 ** attempt)  # Exponential backoff on retry
-
-        raise RuntimeError("Max retries reached, but the request could not be completed.")
+    def _request(self, method, url, headers=None, params=None, data=None, max_retries=None):
+        return self.session.request(method, url, headers=headers, params=params, data=data, max_retries=max_retries)
 
     def _get(self, url, headers=None, params=None):
         return self._request('GET', url, headers=headers, params=params)
@@ -344,92 +1481,313 @@ class Vehicle:
     def _post(self, url, data=None, headers=None):
         return self._request('POST', url, headers=headers, data=data)
 
-    def refresh(self):
-        self.refresh_location()
-        self.refresh_battery_status()
+    async def _async_request(self, method, url, headers=None, params=None, data=None, max_retries=None,
+                             priority=Priority.FETCH):
+        return await self.session.async_request(method, url, headers=headers, params=params, data=data,
+                                                max_retries=max_retries, priority=priority)
+
+    async def _async_get(self, url, headers=None, params=None, priority=Priority.FETCH):
+        return await self._async_request('GET', url, headers=headers, params=params, priority=priority)
+
+    async def _async_post(self, url, data=None, headers=None, priority=Priority.FETCH):
+        return await self._async_request('POST', url, headers=headers, data=data, priority=priority)
+
+    def refresh(self, endpoints=None):
+        for endpoint in endpoints or self._REFRESH_DEFAULT:
+            getattr(self, 'refresh_' + endpoint)()
+
+    async def async_refresh(self, concurrency=None, priority=Priority.FETCH, endpoints=None):
+        """Ask the car to report in. Endpoints are named as in WAKE_ENDPOINTS,
+        and default to location and battery status."""
+        if endpoints is None:
+            endpoints = self._REFRESH_DEFAULT
+        await self._async_gather([
+            functools.partial(getattr(self, 'async_refresh_' + endpoint), priority)
+            for endpoint in endpoints
+        ], concurrency)
+
+    def fetch_all(self, endpoints=None):
+        for endpoint in endpoints or FETCH_ENDPOINTS:
+            getattr(self, 'fetch_' + endpoint)()
+        self.restored = False
+
+    async def async_fetch_all(self, concurrency=None, endpoints=None):
+        """Read the latest state from the server. Endpoints are named as in
+        FETCH_ENDPOINTS, and default to all of them."""
+        await self._async_gather([
+            getattr(self, 'async_fetch_' + endpoint) for endpoint in endpoints or FETCH_ENDPOINTS
+        ], concurrency)
+        self.restored = False
+
+    def dump_state(self):
+        """JSON serialisable copy of the vehicle record and last known telemetry."""
+        state = {key: getattr(self, key) for key in self._STATE_PLAIN}
+        for key in self._STATE_DATETIME:
+            value = getattr(self, key)
+            state[key] = value.isoformat() if value is not None else None
+        for key in self._STATE_ENUM:
+            value = getattr(self, key)
+            state[key] = value.value if value is not None else None
+        state['location'] = list(self.location) if self.location is not None else None
+        state['charge_time_required_to_full'] = {
+            speed.name: value for speed, value in self.charge_time_required_to_full.items()
+        }
+        state['door_status'] = {
+            door.name: value.value if value is not None else None for door, value in self.door_status.items()
+        }
+        state['capabilities'] = self.capabilities
+        state['battery_route'] = self._battery_route
+        state['leaf_fallbacks'] = dict(self._leaf_fallbacks)
+        return {
+            'data': self._data,
+            'state': state,
+        }
 
-    def fetch_all(self):
-        self.fetch_cockpit()
-        self.fetch_location()
-        self.fetch_battery_status()
-        self.fetch_hvac_status()
-        self.fetch_lock_status()
+    def load_state(self, state):
+        """Restore telemetry saved by dump_state()."""
+        values = {key: state[key] for key in self._STATE_PLAIN if key in state}
+        for key in self._STATE_DATETIME:
+            if state.get(key) is not None:
+                values[key] = datetime.datetime.fromisoformat(state[key])
+        for key, enum_type in self._STATE_ENUM.items():
+            if state.get(key) is not None:
+                values[key] = enum_type(state[key])
+        if state.get('location') is not None:
+            values['location'] = tuple(state['location'])
+        values['charge_time_required_to_full'] = {
+            **self.charge_time_required_to_full,
+            **{ChargingSpeed[speed]: value for speed, value in state.get('charge_time_required_to_full', {}).items()}
+        }
+        values['door_status'] = {
+            **self.door_status,
+            **{Door[door]: LockStatus(value) if value is not None else None for door, value in state.get('door_status', {}).items()}
+        }
+        for group, snapshot in self._snapshots.items():
+            self._snapshots[group] = snapshot.replace(
+                **{key: values.pop(key) for key in snapshot.__slots__ if key in values})
+        for key, value in values.items():
+            setattr(self, key, value)
+        self._capabilities = {
+            endpoint: dict(capability) for endpoint, capability in state.get('capabilities', {}).items()
+        }
+        self._battery_route = state.get('battery_route', self._battery_route)
+        self._leaf_fallbacks.update(state.get('leaf_fallbacks', {}))
+        self.restored = True
+
+    def _watermark_headers(self, endpoint, headers=None):
+        """Request headers, asking the server to answer 304 if the response
+        applied last time is still current."""
+        etag = self._watermarks.get(endpoint, {}).get('etag')
+        if etag is None:
+            return headers
+        return {**(headers or {}), 'If-None-Match': etag}
+
+    def _capable(self, endpoint):
+        """Whether an endpoint is worth calling. Ones that keep answering with
+        errors or no data are skipped, apart from an occasional re-probe."""
+        capability = self._capabilities.get(endpoint)
+        if capability is None or capability['failures'] < CAPABILITY_FAILURE_LIMIT:
+            return True
+        if time.time() - capability['checked'] >= CAPABILITY_REPROBE_INTERVAL:
+            _LOGGER.debug("Re-probing %s for #%s", endpoint, self.vin[-3:])
+            return True
+        return False
+
+    def _record_capability(self, endpoint, status):
+        """Record whether an endpoint returned 'data', an 'error' or was 'empty'."""
+        capability = self._capabilities.setdefault(endpoint, {'failures': 0})
+        if status == 'data':
+            capability['failures'] = 0
+        else:
+            capability['failures'] += 1
+            if capability['failures'] == CAPABILITY_FAILURE_LIMIT:
+                _LOGGER.info("#%s doesn't support %s, checking again in %ds",
+                             self.vin[-3:], endpoint, CAPABILITY_REPROBE_INTERVAL)
+        capability['status'] = status
+        capability['checked'] = time.time()
 
-    def refresh_location(self):
-        if Feature.MY_CAR_FINDER not in self.features:
-            return
-        
-        resp = self._post(
-            '{}v1/cars/{}/actions/refresh-location'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {'type': 'RefreshLocation'}
-            }),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
+    @property
+    def capabilities(self):
+        return {endpoint: dict(capability) for endpoint, capability in self._capabilities.items()}
+
+    def _apply(self, endpoint, resp, update):
+        """Pass the response body to update(), unless it holds nothing new: the
+        server answered 304, the body is identical to the last one applied, or
+        its lastUpdateTime hasn't moved on. Then decoding is skipped too."""
+        watermark = self._watermarks.get(endpoint)
+        if resp.status_code == 304:
+            if watermark is None:
+                raise ValueError(f"{endpoint} not modified, but never fetched")
+            self._record_capability(endpoint, 'data')
+            return False
+        digest = hash(resp.text)
+        if watermark is not None and watermark['digest'] == digest:
+            self._record_capability(endpoint, 'data')
+            return False
+
+        # Server errors say nothing about what the car supports, but a 4xx
+        # is the server telling us this request won't work
+        if 400 <= resp.status_code < 500:
+            self._record_capability(endpoint, 'error')
+        body = resp.json()
+        attributes = body.get('data', {}).get('attributes', {}) if isinstance(body, dict) else {}
+        last_update_time = attributes.get('lastUpdateTime') if isinstance(attributes, dict) else None
+        if watermark is not None and last_update_time is not None and watermark['last_update_time'] == last_update_time:
+            watermark['digest'] = digest
+            self._record_capability(endpoint, 'data')
+            return False
+
+        if resp.status_code < 400 and (not attributes or 'errors' in body):
+            self._record_capability(endpoint, 'error' if 'errors' in body else 'empty')
+        if resp.status_code >= 400 or not attributes or 'errors' in body:
+            # Let update() handle the failure as it always has
+            update(body)
+            return False
+
+        before = self.snapshots
+        if update(body) is False:
+            self._record_capability(endpoint, 'empty')
+            return False
+        self._record_capability(endpoint, 'data')
+        self._watermarks[endpoint] = {
+            'digest': digest,
+            'last_update_time': last_update_time,
+            'etag': resp.headers.get('ETag'),
+        }
+        # New body, but possibly the same values: only a swapped snapshot counts
+        if any(self._snapshots[group] is not snapshot for group, snapshot in before.items()):
+            self.version += 1
+        return True
+
+    async def _async_gather(self, calls, concurrency=None):
+        """Run independent endpoint calls in parallel. Each call applies its own
+        result to the vehicle, so one failing endpoint doesn't stop the others
+        being updated. The first error is raised once they have all finished."""
+        if concurrency is None:
+            concurrency = self.session.endpoint_concurrency
+        semaphore = asyncio.Semaphore(concurrency or len(calls))
+
+        async def run(call):
+            async with semaphore:
+                return await call()
+
+        results = await asyncio.gather(*[run(call) for call in calls], return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def _refresh_request(self, endpoint):
+        """URL and body of the action asking the car to report an endpoint,
+        or None if it can't. Shared by refresh_*() and async_refresh_*()."""
+        action, features = self._REFRESH_ACTIONS[endpoint]
+        if features is not None and not features & self.features:
+            return None
+        url = '{}v1/cars/{}/actions/refresh-{}'.format(
+            self.session.settings['car_adapter_base_url'], self.vin, endpoint.replace('_', '-'))
+        return url, json.dumps({'data': {'type': action}})
+
+    @staticmethod
+    def _refresh_result(resp):
         body = resp.json()
         if 'errors' in body:
             raise ValueError(body['errors'])
         return body
 
+    def _refresh(self, endpoint):
+        request = self._refresh_request(endpoint)
+        if request is None:
+            return None
+        url, data = request
+        return self._refresh_result(self._post(url, data=data, headers=dict(self._JSON_API)))
+
+    async def _async_refresh(self, endpoint, priority):
+        request = self._refresh_request(endpoint)
+        if request is None:
+            return None
+        url, data = request
+        return self._refresh_result(await self._async_post(url, data=data, headers=dict(self._JSON_API), priority=priority))
+
+    def _fetch_request(self, endpoint):
+        """URL and headers to read an endpoint, or None if it isn't worth
+        calling. Shared by fetch_*() and async_fetch_*()."""
+        if not self._capable(endpoint):
+            return None
+        base, path, headers, features = self._FETCHES[endpoint]
+        if features is not None and not features & self.features:
+            return None
+        url = self.session.settings[base] + path.format(vin=self.vin, can_generation=self.can_generation)
+        return url, self._watermark_headers(endpoint, dict(headers) if headers else None)
+
+    def _fetch(self, endpoint):
+        """Read an endpoint, returning whether its response was applied."""
+        request = self._fetch_request(endpoint)
+        if request is None:
+            return False
+        url, headers = request
+        return self._apply(endpoint, self._get(url, headers=headers), getattr(self, '_update_' + endpoint))
+
+    async def _async_fetch(self, endpoint):
+        request = self._fetch_request(endpoint)
+        if request is None:
+            return False
+        url, headers = request
+        return self._apply(endpoint, await self._async_get(url, headers=headers), getattr(self, '_update_' + endpoint))
+
+    def refresh_location(self):
+        return self._refresh('location')
+
+    async def async_refresh_location(self, priority=Priority.FETCH):
+        return await self._async_refresh('location', priority)
+
     def fetch_location(self):
-        if Feature.MY_CAR_FINDER not in self.features:
-            return
-        
-        resp = self._get(
-            '{}v1/cars/{}/location'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
+        self._fetch('location')
+
+    async def async_fetch_location(self):
+        await self._async_fetch('location')
+
+    def _update_location(self, body):
+        changes = {}
         if 'errors' in body:
             raise ValueError(body['errors'])
         location_data = body['data']['attributes']
-        self.location = (location_data['gpsLatitude'], location_data['gpsLongitude'])
-        self.location_last_updated = datetime.datetime.fromisoformat(location_data['lastUpdateTime'].replace('Z','+00:00'))
+        changes['location'] = (location_data['gpsLatitude'], location_data['gpsLongitude'])
+        changes['location_last_updated'] = datetime.datetime.fromisoformat(location_data['lastUpdateTime'].replace('Z','+00:00'))
+        self._swap('location', **changes)
 
     def refresh_lock_status(self):
-        resp = self._post(
-            '{}v1/cars/{}/actions/refresh-lock-status'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {'type': 'RefreshLockStatus'}
-            }),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
-        if 'errors' in body:
-            raise ValueError(body['errors'])
-        return body
+        return self._refresh('lock_status')
+
+    async def async_refresh_lock_status(self, priority=Priority.FETCH):
+        return await self._async_refresh('lock_status', priority)
 
     def fetch_lock_status(self):
-        if Feature.LOCK_STATUS_CHECK not in self.features:
-            return
-        resp = self._get(
-            '{}v1/cars/{}/lock-status'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
+        self._fetch('lock_status')
+
+    async def async_fetch_lock_status(self):
+        await self._async_fetch('lock_status')
+
+    def _update_lock_status(self, body):
+        changes = {}
         if 'errors' in body:
             raise ValueError(body['errors'])
         lock_data = body['data']['attributes']
-        self.door_status[Door.FRONT_LEFT] = LockStatus(lock_data.get('doorStatusFrontLeft', LockStatus.CLOSED))
-        self.door_status[Door.FRONT_RIGHT] = LockStatus(lock_data.get('doorStatusFrontRight', LockStatus.CLOSED))
-        self.door_status[Door.REAR_LEFT] = LockStatus(lock_data.get('doorStatusRearLeft', LockStatus.CLOSED))
-        self.door_status[Door.REAR_RIGHT] = LockStatus(lock_data.get('doorStatusRearRight', LockStatus.CLOSED))
-        self.door_status[Door.HATCH] = LockStatus(lock_data.get('hatchStatus', LockStatus.CLOSED))
-        self.lock_status = LockStatus(lock_data.get('lockStatus', LockStatus.LOCKED))
-        self.lock_status_last_updated = datetime.datetime.fromisoformat(lock_data['lastUpdateTime'].replace('Z','+00:00'))
+        changes['door_status'] = {
+            Door.FRONT_LEFT: LockStatus(lock_data.get('doorStatusFrontLeft', LockStatus.CLOSED)),
+            Door.FRONT_RIGHT: LockStatus(lock_data.get('doorStatusFrontRight', LockStatus.CLOSED)),
+            Door.REAR_LEFT: LockStatus(lock_data.get('doorStatusRearLeft', LockStatus.CLOSED)),
+            Door.REAR_RIGHT: LockStatus(lock_data.get('doorStatusRearRight', LockStatus.CLOSED)),
+            Door.HATCH: LockStatus(lock_data.get('hatchStatus', LockStatus.CLOSED)),
+        }
+        changes['lock_status'] = LockStatus(lock_data.get('lockStatus', LockStatus.LOCKED))
+        changes['lock_status_last_updated'] = datetime.datetime.fromisoformat(lock_data['lastUpdateTime'].replace('Z','+00:00'))
+        self._swap('lock_status', **changes)
 
     def refresh_hvac_status(self):
-        resp = self._post(
-            '{}v1/cars/{}/actions/refresh-hvac-status'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {'type': 'RefreshHvacStatus'}
-            }),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
-        if 'errors' in body:
-            raise ValueError(body['errors'])
-        return body
+        return self._refresh('hvac_status')
+
+    async def async_refresh_hvac_status(self, priority=Priority.FETCH):
+        return await self._async_refresh('hvac_status', priority)
 
     def initiate_srp(self):
         (salt, verifier) = SRP.enroll(self.user_id, self.vin)
@@ -495,19 +1853,54 @@ class Vehicle:
             return
         if action == 'stop' and Feature.CHARGING_STOP not in self.features:
             return
+        resp = self._post(
+            '{}v1/cars/{}/actions/charging-start'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            data=self._control_charging_data(action, srp),
+            headers={'Content-Type': 'application/vnd.api+json'}
+        )
+        body = resp.json()
+        if 'errors' in body:
+            raise ValueError(body['errors'])
+        return body
+
+    async def async_control_charging(self, action: str, srp: str=None):
+        assert action in ('stop', 'start')
+        if action == 'start' and Feature.CHARGING_START not in self.features:
+            return
+        if action == 'stop' and Feature.CHARGING_STOP not in self.features:
+            return
+        resp = await self._async_post(
+            '{}v1/cars/{}/actions/charging-start'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            data=self._control_charging_data(action, srp),
+            headers={'Content-Type': 'application/vnd.api+json'},
+            priority=Priority.COMMAND
+        )
+        body = resp.json()
+        if 'errors' in body:
+            raise ValueError(body['errors'])
+        return body
+
+    def _control_charging_data(self, action, srp):
         attributes = {
             'action': action,
         }
         if srp is not None:
             attributes['srp'] = srp
+        return json.dumps({
+            'data': {
+                'type': 'ChargingStart',
+                'attributes': attributes
+            }
+        })
+
+    def control_horn_lights(self, action: str, target: str, duration: int=5, srp: str=None):
+        if Feature.HORN_AND_LIGHTS not in self.features:
+            return
+        assert target in ('horn_lights', 'lights', 'horn')
+        assert action in ('stop', 'start', 'double_start')
         resp = self._post(
-            '{}v1/cars/{}/actions/charging-start'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {
-                    'type': 'ChargingStart',
-                    'attributes': attributes
-                }
-            }),
+            '{}v1/cars/{}/actions/horn-lights'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            data=self._control_horn_lights_data(action, target, duration, srp),
             headers={'Content-Type': 'application/vnd.api+json'}
         )
         body = resp.json()
@@ -515,11 +1908,23 @@ class Vehicle:
             raise ValueError(body['errors'])
         return body
 
-    def control_horn_lights(self, action: str, target: str, duration: int=5, srp: str=None):
+    async def async_control_horn_lights(self, action: str, target: str, duration: int=5, srp: str=None):
         if Feature.HORN_AND_LIGHTS not in self.features:
             return
         assert target in ('horn_lights', 'lights', 'horn')
         assert action in ('stop', 'start', 'double_start')
+        resp = await self._async_post(
+            '{}v1/cars/{}/actions/horn-lights'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            data=self._control_horn_lights_data(action, target, duration, srp),
+            headers={'Content-Type': 'application/vnd.api+json'},
+            priority=Priority.COMMAND
+        )
+        body = resp.json()
+        if 'errors' in body:
+            raise ValueError(body['errors'])
+        return body
+
+    def _control_horn_lights_data(self, action, target, duration, srp):
         attributes = {
             'action': action,
             'duration': duration,
@@ -527,14 +1932,20 @@ class Vehicle:
         }
         if srp is not None:
             attributes['srp'] = srp
+        return json.dumps({
+            'data': {
+                'type': 'HornLights',
+                'attributes': attributes
+            }
+        })
+
+    def set_hvac_status(self, action: HVACAction, target_temperature: int=21, start: datetime.datetime=None, srp: str=None):
+        if Feature.CLIMATE_ON_OFF not in self.features:
+            return
+
         resp = self._post(
-            '{}v1/cars/{}/actions/horn-lights'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {
-                    'type': 'HornLights',
-                    'attributes': attributes
-                }
-            }),
+            '{}v1/cars/{}/actions/hvac-start'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            data=self._hvac_start_data(action, target_temperature, start, srp),
             headers={'Content-Type': 'application/vnd.api+json'}
         )
         body = resp.json()
@@ -542,10 +1953,22 @@ class Vehicle:
             raise ValueError(body['errors'])
         return body
 
-    def set_hvac_status(self, action: HVACAction, target_temperature: int=21, start: datetime.datetime=None, srp: str=None):
+    async def async_set_hvac_status(self, action: HVACAction, target_temperature: int=21, start: datetime.datetime=None, srp: str=None):
         if Feature.CLIMATE_ON_OFF not in self.features:
             return
 
+        resp = await self._async_post(
+            '{}v1/cars/{}/actions/hvac-start'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            data=self._hvac_start_data(action, target_temperature, start, srp),
+            headers={'Content-Type': 'application/vnd.api+json'},
+            priority=Priority.COMMAND
+        )
+        body = resp.json()
+        if 'errors' in body:
+            raise ValueError(body['errors'])
+        return body
+
+    def _hvac_start_data(self, action, target_temperature, start, srp):
         if target_temperature < 16 or target_temperature > 26:
             raise ValueError('Temperature must be between 16 & 26 degrees')
 
@@ -558,21 +1981,12 @@ class Vehicle:
             attributes['startDateTime'] = start.isoformat(timespec='seconds')
         if srp is not None:
             attributes['srp'] = srp
-
-        resp = self._post(
-            '{}v1/cars/{}/actions/hvac-start'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {
-                    'type': 'HvacStart',
-                    'attributes': attributes
-                }
-            }),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
-        if 'errors' in body:
-            raise ValueError(body['errors'])
-        return body
+        return json.dumps({
+            'data': {
+                'type': 'HvacStart',
+                'attributes': attributes
+            }
+        })
 
     def lock_unlock(self, srp: str, action: str, group: LockableDoorGroup=None):
         if Feature.APP_DOOR_LOCKING not in self.features:
@@ -606,123 +2020,175 @@ class Vehicle:
         return self.lock_unlock(srp, 'unlock', group)
 
     def fetch_hvac_status(self):
-        if Feature.INTERIOR_TEMP_SETTINGS not in self.features and Feature.TEMPERATURE not in self.features:
-            return
-        
-        resp = self._get(
-            '{}v1/cars/{}/hvac-status'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
+        self._fetch('hvac_status')
+
+    async def async_fetch_hvac_status(self):
+        await self._async_fetch('hvac_status')
+
+    def _update_hvac_status(self, body):
+        changes = {}
         if 'errors' in body:
             raise ValueError(body['errors'])
         hvac_data = body['data']['attributes']
-        self.external_temperature = hvac_data.get('externalTemperature')
-        self.internal_temperature = hvac_data.get('internalTemperature')
-        self.next_target_temperature = hvac_data.get('nextTargetTemperature')
+        changes['external_temperature'] = hvac_data.get('externalTemperature')
+        changes['internal_temperature'] = hvac_data.get('internalTemperature')
+        changes['next_target_temperature'] = hvac_data.get('nextTargetTemperature')
         if 'hvacStatus' in hvac_data:
-            self.hvac_status = hvac_data['hvacStatus'] == "on"
+            changes['hvac_status'] = hvac_data['hvacStatus'] == "on"
         if 'nextHvacStartDate' in hvac_data:
-            self.next_hvac_start_date = datetime.datetime.fromisoformat(hvac_data['nextHvacStartDate'].replace('Z','+00:00'))
+            changes['next_hvac_start_date'] = datetime.datetime.fromisoformat(hvac_data['nextHvacStartDate'].replace('Z','+00:00'))
         if 'lastUpdateTime' in hvac_data:
-            self.hvac_status_last_updated = datetime.datetime.fromisoformat(hvac_data['lastUpdateTime'].replace('Z','+00:00'))
+            changes['hvac_status_last_updated'] = datetime.datetime.fromisoformat(hvac_data['lastUpdateTime'].replace('Z','+00:00'))
+        self._swap('hvac_status', **changes)
 
     def refresh_battery_status(self):
-        resp = self._post(
-            '{}v1/cars/{}/actions/refresh-battery-status'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            data=json.dumps({
-                'data': {'type': 'RefreshBatteryStatus'}
-            }),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
-        if 'errors' in body:
-            raise ValueError(body['errors'])
-        return body
+        return self._refresh('battery_status')
+
+    async def async_refresh_battery_status(self, priority=Priority.FETCH):
+        return await self._async_refresh('battery_status', priority)
+
+    def _set_battery_route(self, route):
+        if route == self._battery_route:
+            return
+        _LOGGER.debug("#%s: fetching battery status from %s", self.vin[-3:], "v3 only" if route == 'v3' else "v1 and v3")
+        self._battery_route = route
+        if route == 'v3':
+            # v1 isn't called any more, so its values would only go stale
+            self._leaf_fallbacks = dict.fromkeys(self._leaf_fallbacks)
+
+    def _leaf_applied(self):
+        # v1 and v3 write the same battery state, v3 last. A new v1 response
+        # overwrote what v3 set, so v3 has to be applied again after it even
+        # if it hasn't changed.
+        if self._battery_route == 'both':
+            self._watermarks.pop('battery_status_ariya', None)
 
     def fetch_battery_status(self):
-        self.fetch_battery_status_leaf()
-        if self.model_name == "Ariya":
-            self.fetch_battery_status_ariya()
+        # v1 is needed again if v3 is being skipped for failing
+        if self._battery_route == 'v3' and not self._capable('battery_status_ariya'):
+            self._set_battery_route('both')
+        if self._battery_route != 'v3' and self.fetch_battery_status_leaf():
+            self._leaf_applied()
+        if self._battery_route != 'v1':
+            try:
+                self.fetch_battery_status_ariya()
+            except Exception:
+                self._set_battery_route('both')
+                raise
+
+    async def async_fetch_battery_status(self):
+        # v1 is needed again if v3 is being skipped for failing
+        if self._battery_route == 'v3' and not self._capable('battery_status_ariya'):
+            self._set_battery_route('both')
+        if self._battery_route != 'v3' and await self.async_fetch_battery_status_leaf():
+            self._leaf_applied()
+        if self._battery_route != 'v1':
+            try:
+                await self.async_fetch_battery_status_ariya()
+            except Exception:
+                self._set_battery_route('both')
+                raise
 
     def fetch_battery_status_leaf(self):
-        """The battery-status endpoint isn't just for EV's. ICE Nissans publish the range under this!
-           There is no obvious feature to qualify this, so we just suck it and see."""
-        resp = self._get(
-            '{}v1/cars/{}/battery-status'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
+        return self._fetch('battery_status_leaf')
+
+    async def async_fetch_battery_status_leaf(self):
+        return await self._async_fetch('battery_status_leaf')
+
+    def _update_battery_status_leaf(self, body):
+        changes = {}
         if 'errors' in body and Feature.BATTERY_STATUS in self.features:
             raise ValueError(body['errors'])
 
         if not 'data' in body or not 'attributes' in body['data']:
-            self.battery_supported = False
+            changes['battery_supported'] = False
 
         battery_data = body['data']['attributes']
-        self.battery_capacity = battery_data.get('batteryCapacity')  # kWh
-        self.battery_level = battery_data.get('batteryLevel')  # %
-        self.battery_temperature = battery_data.get('batteryTemperature')  # Fahrenheit?
+        changes['battery_capacity'] = battery_data.get('batteryCapacity')  # kWh
+        changes['battery_level'] = battery_data.get('batteryLevel')  # %
+        changes['battery_temperature'] = battery_data.get('batteryTemperature')  # Fahrenheit?
         # same meaning as battery level, different scale. 240 = 100%
-        self.battery_bar_level = battery_data.get('batteryBarLevel')
-        self.instantaneous_power = battery_data.get('instantaneousPower')  # kW
-        self.charging_speed = ChargingSpeed(battery_data.get('chargePower'))
-        self.charge_time_required_to_full = {
+        changes['battery_bar_level'] = battery_data.get('batteryBarLevel')
+        changes['instantaneous_power'] = battery_data.get('instantaneousPower')  # kW
+        changes['charging_speed'] = ChargingSpeed(battery_data.get('chargePower'))
+        changes['charge_time_required_to_full'] = {
             ChargingSpeed.FAST: battery_data.get('timeRequiredToFullFast'),
             ChargingSpeed.NORMAL: battery_data.get('timeRequiredToFullNormal'),
             ChargingSpeed.SLOW: battery_data.get('timeRequiredToFullSlow'),
             ChargingSpeed.ADAPTIVE: None
         }
-        self.range_hvac_off = battery_data.get('rangeHvacOff')
-        self.range_hvac_on = battery_data.get('rangeHvacOn')
+        changes['range_hvac_off'] = battery_data.get('rangeHvacOff')
+        changes['range_hvac_on'] = battery_data.get('rangeHvacOn')
+        # Fallbacks for the v3 endpoint, which may be fetched on its own later
+        self._leaf_fallbacks = {
+            'range_hvac_on': changes['range_hvac_on'],
+            'time_required_to_full_normal': battery_data.get('timeRequiredToFullNormal'),
+        }
         
         # For ICE vehicles, we should get the range at least. If not, dont bother again
-        if self.range_hvac_on is None and Feature.BATTERY_STATUS not in self.features:
-            self.battery_supported = False
-            return
+        if changes['range_hvac_on'] is None and Feature.BATTERY_STATUS not in self.features:
+            changes['battery_supported'] = False
+            self._swap('battery_status', **changes)
+            return False
 
-        self.charging = ChargingStatus(battery_data.get('chargeStatus', 0))
-        self.plugged_in = PluggedStatus(battery_data.get('plugStatus', 0))
+        changes['charging'] = ChargingStatus(battery_data.get('chargeStatus', 0))
+        changes['plugged_in'] = PluggedStatus(battery_data.get('plugStatus', 0))
         if 'vehiclePlugTimestamp' in battery_data:
-            self.plugged_in_time = datetime.datetime.fromisoformat(battery_data['vehiclePlugTimestamp'].replace('Z','+00:00'))
+            changes['plugged_in_time'] = datetime.datetime.fromisoformat(battery_data['vehiclePlugTimestamp'].replace('Z','+00:00'))
         if 'vehicleUnplugTimestamp' in battery_data:
-            self.unplugged_time = datetime.datetime.fromisoformat(battery_data['vehicleUnplugTimestamp'].replace('Z','+00:00'))
+            changes['unplugged_time'] = datetime.datetime.fromisoformat(battery_data['vehicleUnplugTimestamp'].replace('Z','+00:00'))
         if 'lastUpdateTime' in battery_data:
-            self.battery_status_last_updated = datetime.datetime.fromisoformat(battery_data['lastUpdateTime'].replace('Z','+00:00'))
+            changes['battery_status_last_updated'] = datetime.datetime.fromisoformat(battery_data['lastUpdateTime'].replace('Z','+00:00'))
+        self._swap('battery_status', **changes)
 
     def fetch_battery_status_ariya(self):
-        resp = self._get(
-            '{}v3/cars/{}/battery-status?canGen={}'.format(self.session.settings['user_base_url'], self.vin, self.can_generation),
-            headers={'Content-Type': 'application/vnd.api+json'}
-        )
-        body = resp.json()
-        if 'errors' in body and Feature.BATTERY_STATUS in self.features:
-            raise ValueError(body['errors'])
+        self._fetch('battery_status_ariya')
 
+    async def async_fetch_battery_status_ariya(self):
+        await self._async_fetch('battery_status_ariya')
+
+    def _update_battery_status_ariya(self, body):
+        changes = {}
+        # v3 is only called alongside or instead of v1, so an answer without
+        # data is a failure of this route, not a car without a battery
+        if 'errors' in body:
+            raise ValueError(body['errors'])
         if not 'data' in body or not 'attributes' in body['data']:
-            self.battery_supported = False
+            raise ValueError("No battery status in v3 response")
 
         battery_data = body['data']['attributes']
-        
-        self.range_hvac_off = None
-        self.range_hvac_on = battery_data.get('batteryAutonomy') or self.range_hvac_on
 
-        self.charging_speed = ChargingSpeed(None)
-        self.charge_time_required_to_full = {
+        for key, attribute in self._V3_BATTERY_FIELDS.items():
+            if key in battery_data:
+                changes[attribute] = battery_data[key]
+        if 'chargeStatus' in battery_data:
+            changes['charging'] = ChargingStatus(battery_data['chargeStatus'])
+
+        changes['range_hvac_off'] = None
+        changes['range_hvac_on'] = battery_data.get('batteryAutonomy') or self._leaf_fallbacks['range_hvac_on']
+
+        changes['charging_speed'] = ChargingSpeed(None)
+        changes['charge_time_required_to_full'] = {
             ChargingSpeed.FAST: None,
             ChargingSpeed.NORMAL: None,
             ChargingSpeed.SLOW: None,
-            ChargingSpeed.ADAPTIVE: battery_data.get('chargingRemainingTime') or self.charge_time_required_to_full[ChargingSpeed.NORMAL]
+            ChargingSpeed.ADAPTIVE: battery_data.get('chargingRemainingTime') or self._leaf_fallbacks['time_required_to_full_normal']
         }
 
-        self.plugged_in = PluggedStatus(battery_data.get('plugStatus', 0))
+        changes['plugged_in'] = PluggedStatus(battery_data.get('plugStatus', 0))
                 
         if 'vehiclePlugTimestamp' in battery_data:
-            self.plugged_in_time = datetime.datetime.fromisoformat(battery_data['vehiclePlugTimestamp'].replace('Z','+00:00'))
+            changes['plugged_in_time'] = datetime.datetime.fromisoformat(battery_data['vehiclePlugTimestamp'].replace('Z','+00:00'))
         if 'vehicleUnplugTimestamp' in battery_data:
-            self.unplugged_time = datetime.datetime.fromisoformat(battery_data['vehicleUnplugTimestamp'].replace('Z','+00:00'))
+            changes['unplugged_time'] = datetime.datetime.fromisoformat(battery_data['vehicleUnplugTimestamp'].replace('Z','+00:00'))
         if 'lastUpdateTime' in battery_data:
-            self.battery_status_last_updated = datetime.datetime.fromisoformat(battery_data['lastUpdateTime'].replace('Z','+00:00'))
+            changes['battery_status_last_updated'] = datetime.datetime.fromisoformat(battery_data['lastUpdateTime'].replace('Z','+00:00'))
+        self._swap('battery_status', **changes)
+
+        # Once v3 is seen to carry everything v1 does, stop calling v1. If it
+        # stops doing so, go back to calling both.
+        covered = all(key in battery_data for key in self._V3_BATTERY_REQUIRED)
+        self._set_battery_route('v3' if covered else 'both')
 
     def set_energy_unit_cost(self, cost):
         resp = self._post(
@@ -738,6 +2204,21 @@ class Vehicle:
             raise ValueError(body['errors'])
 
     def fetch_trip_histories(self, period: Period=None, start: datetime.date=None, end: datetime.date=None):
+        resp = self._get(
+            '{}v1/cars/{}/trip-history'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            params=self._trip_history_params(period, start, end)
+        )
+        return self._parse_trip_histories(resp.json())
+
+    async def async_fetch_trip_histories(self, period: Period=None, start: datetime.date=None, end: datetime.date=None):
+        resp = await self._async_get(
+            '{}v1/cars/{}/trip-history'.format(self.session.settings['car_adapter_base_url'], self.vin),
+            params=self._trip_history_params(period, start, end),
+            priority=Priority.STATISTICS
+        )
+        return self._parse_trip_histories(resp.json())
+
+    def _trip_history_params(self, period, start, end):
         if period is None:
             period = Period.DAILY
         if start is None and end is None and period == Period.MONTHLY:
@@ -747,15 +2228,13 @@ class Vehicle:
             start = datetime.datetime.utcnow().date()
         if end is None:
             end = start
-        resp = self._get(
-            '{}v1/cars/{}/trip-history'.format(self.session.settings['car_adapter_base_url'], self.vin),
-            params={
-                'type': period.value,
-                'start': start.isoformat(),
-                'end': end.isoformat()
-            }
-        )
-        body = resp.json()
+        return {
+            'type': period.value,
+            'start': start.isoformat(),
+            'end': end.isoformat()
+        }
+
+    def _parse_trip_histories(self, body):
         if 'errors' in body:
             raise ValueError(body['errors'])
         return [TripSummary(s, self.vin) for s in body['data']['attributes']['summaries']]
@@ -842,24 +2321,37 @@ class Vehicle:
         pass
 
     def fetch_cockpit(self):
-        resp = self._get(
-            "{}v1/cars/{}/cockpit".format(self.session.settings['car_adapter_base_url'], self.vin)
-        )
-        body = resp.json()
+        self._fetch('cockpit')
+
+    async def async_fetch_cockpit(self):
+        await self._async_fetch('cockpit')
+
+    def _update_cockpit(self, body):
+        changes = {}
         if 'errors' in body:
             raise ValueError(body['errors'])
 
         cockpit_data = body['data']['attributes']
-        self.eco_score = cockpit_data.get('ecoScore')
-        self.fuel_autonomy = cockpit_data.get('fuelAutonomy')
-        self.fuel_consumption = cockpit_data.get('fuelConsumption')
-        self.fuel_economy = cockpit_data.get('fuelEconomy')
-        self.fuel_level = cockpit_data.get('fuelLevel')
+        changes['eco_score'] = cockpit_data.get('ecoScore')
+        changes['fuel_autonomy'] = cockpit_data.get('fuelAutonomy')
+        changes['fuel_consumption'] = cockpit_data.get('fuelConsumption')
+        changes['fuel_economy'] = cockpit_data.get('fuelEconomy')
+        changes['fuel_level'] = cockpit_data.get('fuelLevel')
         if 'fuelLowWarning' in cockpit_data:
-            self.fuel_low_warning = bool(cockpit_data.get('fuelLowWarning', False))
-        self.fuel_quantity = cockpit_data.get('fuelQuantity')  # litres
-        self.mileage = cockpit_data.get('mileage')
-        self.total_mileage = cockpit_data.get('totalMileage')
+            changes['fuel_low_warning'] = bool(cockpit_data.get('fuelLowWarning', False))
+        changes['fuel_quantity'] = cockpit_data.get('fuelQuantity')  # litres
+        changes['mileage'] = cockpit_data.get('mileage')
+        changes['total_mileage'] = cockpit_data.get('totalMileage')
+        self._swap('cockpit', **changes)
+
+
+def _snapshot_property(group, name):
+    return property(lambda vehicle: getattr(vehicle._snapshots[group], name))
+
+
+for _group, _snapshot_type in Vehicle._SNAPSHOT_TYPES.items():
+    for _name in _snapshot_type.__slots__:
+        setattr(Vehicle, _name, _snapshot_property(_group, _name))
 
 
 class TripSummary:
@@ -1,6 +1,46 @@
 import enum
 
 API_VERSION = 'protocol=1.0,resource=2.1'
+
+# Connection pool shared by the auth flow and API calls
+HTTP_POOL_SIZE = 10
+HTTP_KEEPALIVE_TIMEOUT = 60
+# Seconds to wait for a connection, and then for each read from it
+HTTP_CONNECT_TIMEOUT = 10
+HTTP_READ_TIMEOUT = 30
+
+# Retries back off with decorrelated jitter between these bounds, in seconds.
+# A Retry-After longer than the maximum gives up instead of waiting.
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+# Responses worth retrying; throttling and temporary server failures
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Consecutive failures after which calls to a host are stopped, and seconds
+# to wait before letting a probe request through to see if it has recovered
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 60
+
+# Requests per second allowed per account, and how many may be sent in a burst
+RATE_LIMIT = 2
+RATE_LIMIT_BURST = 10
+
+# Seconds a GET response is served from cache, by the last part of its path.
+# Once expired it is served stale for as long again while it is refetched in
+# the background. Endpoints not listed here are not cached.
+CACHE_TTLS = {
+    # Mileage and eco scores barely change while the car is parked
+    'cockpit': 3600,
+}
+CACHE_MAX_ENTRIES = 128
+
+# An endpoint that errors or returns nothing this many times in a row is no
+# longer called for that vehicle, other than a re-probe every interval (seconds)
+CAPABILITY_FAILURE_LIMIT = 3
+CAPABILITY_REPROBE_INTERVAL = 24 * 3600
+
+# Seconds before expiry at which the access token is renewed
+TOKEN_REFRESH_MARGIN = 60
 SRP_KEY = 'D5AF0E14718E662D12DBB4FE42304DF5A8E48359E22261138B40AA16CC85C76A11B43200A1EECB3C9546A262D1FBD51ACE6FCDE558C00665BBF93FF86B9F8F76AA7A53CA74F5B4DFF9A4B847295E7D82450A2078B5A28814A7A07F8BBDD34F8EEB42B0E70499087A242AA2C5BA9513C8F9D35A81B33A121EEF0A71F3F9071CCD'
 
 SETTINGS_MAP = {
@@ -85,6 +125,16 @@ class Period(enum.Enum):
     YEARLY = 2
 
 
+class Priority(enum.IntEnum):
+    """Order in which requests waiting on the rate limiter are sent."""
+    # Started by the user, e.g. a button press
+    COMMAND = 0
+    # Regular state updates
+    FETCH = 1
+    # Trip history, which nobody is waiting on
+    STATISTICS = 2
+
+
 class Feature(enum.Enum):
     BREAKDOWN_ASSISTANCE_CALL = '1'
     SVT_WITH_VEHICLE_BLOCKAGE = '10'
@@ -499,3 +549,10 @@ class NotificationRuleStatus(enum.Enum):
     ACTIVATED = 'ACTIVATED'
     ACTIVATION_IN_PROGRESS = 'STATUS_ACTIVATION_IN_PROGRESS'
     DELETION_IN_PROGRESS = 'STATUS_DELETION_IN_PROGRESS'
+
+
+# Endpoints that can be read from the server, and those the car can be asked
+# to report in on, by the name used in Vehicle.async_fetch_<name> and
+# Vehicle.async_refresh_<name>
+FETCH_ENDPOINTS = ('cockpit', 'location', 'battery_status', 'hvac_status', 'lock_status')
+WAKE_ENDPOINTS = ('location', 'battery_status', 'hvac_status', 'lock_status')
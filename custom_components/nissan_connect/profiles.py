@@ -0,0 +1,68 @@
+"""Time-of-day polling profiles, as defined in PROFILES."""
+from datetime import datetime, time, timedelta
+from homeassistant.util import dt as dt_util
+from .const import PROFILES, PROFILE_TIMES
+
+
+def _time(value):
+    # Times from the options flow carry seconds too
+    hours, minutes = value.split(":")[:2]
+    return time(int(hours), int(minutes))
+
+
+def profile_windows(profile, config):
+    """A profile's windows, with the times set in config filled in."""
+    times = {key: config.get(key) or default for key, default in PROFILE_TIMES.items()}
+    return [{**window, "start": times[window["start"]], "end": times[window["end"]]} for window in PROFILES[profile]]
+
+
+def _windows(windows, since, until):
+    """(start, end, window) timestamps of each window that overlaps the
+    period from since to until."""
+    first = dt_util.as_local(dt_util.utc_from_timestamp(since)).date() - timedelta(days=1)
+    last = dt_util.as_local(dt_util.utc_from_timestamp(until)).date()
+    occurrences = []
+    for window in windows:
+        start_time, end_time = _time(window["start"]), _time(window["end"])
+        day = first
+        while day <= last:
+            if day.weekday() in window.get("days", range(7)):
+                start = datetime.combine(day, start_time, tzinfo=dt_util.DEFAULT_TIME_ZONE)
+                end = datetime.combine(day, end_time, tzinfo=dt_util.DEFAULT_TIME_ZONE)
+                if end <= start:
+                    end += timedelta(days=1)
+                if start.timestamp() <= until and end.timestamp() > since:
+                    occurrences.append((start.timestamp(), end.timestamp(), window))
+            day += timedelta(days=1)
+    return sorted(occurrences, key=lambda occurrence: occurrence[0])
+
+
+def window_at(windows, at):
+    """The window in force at a timestamp, or None."""
+    for start, end, window in _windows(windows, at, at):
+        if start <= at < end:
+            return window
+    return None
+
+
+def quiet_until(windows, at, charging):
+    """When the car may next be woken, from a timestamp: either that time, or
+    the end of the quiet window it falls in."""
+    # Back to back windows are followed through, within reason
+    for _ in range(len(windows) + 1):
+        for start, end, window in _windows(windows, at, at):
+            if start <= at < end and window["interval"] == 0 and not (charging and window.get("unless_charging")):
+                at = end
+                break
+        else:
+            break
+    return at
+
+
+def busy_from(windows, since, until, interval):
+    """Start of the first window between two timestamps that polls more
+    often than the given interval, or None."""
+    for start, end, window in _windows(windows, since, until):
+        if since < start <= until and 0 < window["interval"] < interval:
+            return start
+    return None
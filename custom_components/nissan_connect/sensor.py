@@ -7,11 +7,11 @@ from homeassistant.components.sensor import (
     UnitOfTemperature
 )
 from homeassistant.core import callback
-from homeassistant.const import PERCENTAGE, UnitOfLength, UnitOfTime
+from homeassistant.const import PERCENTAGE, EntityCategory, UnitOfLength, UnitOfTime
 from homeassistant.components.sensor import SensorStateClass
 from .base import KamereonEntity
 from .kamereon import ChargingSpeed, Feature
-from .const import DOMAIN, DATA_VEHICLES, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_STATISTICS
+from .const import DOMAIN, DATA_SESSION, DATA_VEHICLES, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_STATISTICS
 _LOGGER = logging.getLogger(__name__)
 
 
@@ -59,7 +59,14 @@ async def async_setup_entry(hass, config, async_add_entities):
 
         entities.append(OdometerSensor(coordinator, data[vehicle], imperial_distance))
 
-    async_add_entities(entities, update_before_add=True)
+        entities.append(ApiCallsSensor(coordinator, data[vehicle]))
+
+    # The budget is for the whole account. The entry is reloaded when it is
+    # set or cleared, see async_update_listener.
+    if config.data.get("daily_budget"):
+        entities.append(ApiBudgetSensor(config, hass.data[DOMAIN][account_id][DATA_SESSION]))
+
+    async_add_entities(entities)
 
 
 class BatteryLevelSensor(KamereonEntity, SensorEntity):
@@ -188,13 +195,25 @@ class OdometerSensor(KamereonEntity, SensorEntity):
 
         KamereonEntity.__init__(self, coordinator, vehicle)
 
-    @callback
-    def _handle_coordinator_update(self) -> None:
+    def _update_state(self):
+        """Take the vehicle's mileage, returning whether it moved on."""
         new_state = getattr(self.vehicle, "total_mileage")
 
         # This sometimes goes backwards? So only accept a positive odometer delta
-        if new_state is not None and new_state > (self._state or 0):           
+        if new_state is not None and new_state > (self._state or 0):
             self._state = new_state
+            return True
+        return False
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # The vehicle was fetched before the entity was added, so don't wait
+        # for the next update that changes anything
+        self._update_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        if self._update_state():
             self.async_write_ha_state()
 
     @property
@@ -310,3 +329,67 @@ class TimestampSensor(KamereonEntity, SensorEntity):
         if val is None:
             return None
         return val.isoformat()
+
+
+class ApiCallsSensor(KamereonEntity, SensorEntity):
+    _attr_translation_key = "api_calls"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    # Only falls at midnight, when the count starts again
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    # Counted locally, so reading it costs nothing
+    _attr_should_poll = True
+
+    def __init__(self, coordinator, vehicle):
+        KamereonEntity.__init__(self, coordinator, vehicle)
+
+    @property
+    def native_value(self):
+        """Calls made today for this vehicle."""
+        return sum(self.vehicle.session.calls.vehicle(self.vehicle.vin).values())
+
+    @property
+    def extra_state_attributes(self):
+        calls = self.vehicle.session.calls
+        return {
+            'account_total': calls.total,
+            'endpoints': calls.vehicle(self.vehicle.vin),
+        }
+
+    @property
+    def icon(self):
+        """Icon of the sensor."""
+        return "mdi:api"
+
+
+class ApiBudgetSensor(SensorEntity):
+    """Calls left today within the account's daily budget."""
+    _attr_translation_key = "api_budget_remaining"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_has_entity_name = True
+    _attr_should_poll = True
+
+    def __init__(self, entry, session):
+        self._entry = entry
+        self._session = session
+        self._attr_unique_id = f"{session.unique_id}_{self._attr_translation_key}"
+
+    @property
+    def _budget(self):
+        # Read each time, as the options flow changes it without a reload
+        return self._entry.data.get("daily_budget")
+
+    @property
+    def native_value(self):
+        """Calls the account has left today."""
+        if not self._budget:
+            return None
+        return max(0, self._budget - self._session.calls.total)
+
+    @property
+    def extra_state_attributes(self):
+        return {'budget': self._budget}
+
+    @property
+    def icon(self):
+        """Icon of the sensor."""
+        return "mdi:gauge"
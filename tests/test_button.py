@@ -2,7 +2,7 @@ import pytest
 from unittest.mock import AsyncMock, MagicMock
 from homeassistant.helpers import entity_registry as er
 from custom_components.nissan_connect.const import DOMAIN, DATA_VEHICLES, DATA_COORDINATOR_POLL, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_STATISTICS
-from custom_components.nissan_connect.kamereon.kamereon_const import Feature
+from custom_components.nissan_connect.kamereon.kamereon_const import Feature, Priority
 
 from custom_components.nissan_connect.button import (
     async_setup_entry,
@@ -55,32 +55,34 @@ async def test_async_setup_entry(mock_hass, mock_config, mock_async_add_entities
 @pytest.mark.asyncio
 async def test_force_update_button():
     coordinator = AsyncMock()
-    vehicle = MagicMock()
+    vehicle = AsyncMock()
     hass = AsyncMock()
     stats_coordinator = MagicMock()
 
     button = ForceUpdateButton(coordinator, vehicle, hass, stats_coordinator)
 
     await button.async_press()
-    vehicle.refresh.assert_called_once()
-    coordinator.async_refresh.assert_called_once()
+    vehicle.async_refresh.assert_awaited_once_with(priority=Priority.COMMAND)
+    coordinator.async_fetch_vehicles.assert_awaited_once_with([vehicle.vin])
 
 
-def test_horn_lights_buttons():
+@pytest.mark.asyncio
+async def test_horn_lights_buttons():
     coordinator = MagicMock()
-    vehicle = MagicMock()
+    vehicle = AsyncMock()
     button = HornLightsButtons(
         coordinator, vehicle, "flash_lights", "mdi:car-light-high", "lights")
 
-    button.press()
-    vehicle.control_horn_lights.assert_called_once_with('start', "lights")
+    await button.async_press()
+    vehicle.async_control_horn_lights.assert_awaited_once_with('start', "lights")
 
 
-def test_charge_control_buttons():
+@pytest.mark.asyncio
+async def test_charge_control_buttons():
     coordinator = MagicMock()
-    vehicle = MagicMock()
+    vehicle = AsyncMock()
     button = ChargeControlButtons(
         coordinator, vehicle, "charge_start", "mdi:play", "start")
 
-    button.press()
-    vehicle.control_charging.assert_called_once_with("start")
+    await button.async_press()
+    vehicle.async_control_charging.assert_awaited_once_with("start")
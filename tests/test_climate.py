@@ -8,6 +8,7 @@ from custom_components.nissan_connect.kamereon.kamereon_const import Feature, HV
 @pytest.fixture
 def mock_vehicle():
     vehicle = MagicMock()
+    vehicle.async_set_hvac_status = AsyncMock()
     vehicle.features = [Feature.CLIMATE_ON_OFF, Feature.TEMPERATURE]
     vehicle.hvac_status = False
     vehicle.internal_temperature = 22
@@ -40,9 +41,10 @@ def test_current_temperature(climate_entity, mock_vehicle):
     mock_vehicle.internal_temperature = None
     assert climate_entity.current_temperature is None
 
-def test_target_temperature(climate_entity):
+@pytest.mark.asyncio
+async def test_target_temperature(climate_entity):
     assert climate_entity.target_temperature == 20
-    climate_entity.set_temperature(**{ATTR_TEMPERATURE: 25})
+    await climate_entity.async_set_temperature(**{ATTR_TEMPERATURE: 25})
     assert climate_entity.target_temperature == 25
 
 def test_hvac_action(climate_entity, mock_vehicle):
@@ -58,14 +60,26 @@ def test_hvac_action(climate_entity, mock_vehicle):
 @pytest.mark.asyncio
 async def test_async_set_hvac_mode(climate_entity, mock_hass, mock_vehicle):
     await climate_entity.async_set_hvac_mode(HVACMode.OFF)
-    mock_hass.async_add_executor_job.assert_called_with(mock_vehicle.set_hvac_status, HVACAction.STOP)
+    mock_vehicle.async_set_hvac_status.assert_awaited_with(HVACAction.STOP)
     mock_hass.async_create_task.assert_called_once()
 
     await climate_entity.async_set_hvac_mode(HVACMode.HEAT_COOL)
-    mock_hass.async_add_executor_job.assert_called_with(mock_vehicle.set_hvac_status, HVACAction.START, 20)
+    mock_vehicle.async_set_hvac_status.assert_awaited_with(HVACAction.START, 20)
     assert mock_hass.async_create_task.call_count == 2
 
 @pytest.mark.asyncio
 async def test_async_turn_off(climate_entity):
     await climate_entity.async_turn_off()
     assert climate_entity.hvac_mode == HVACMode.OFF
+
+@pytest.mark.asyncio
+async def test_fetch_loop_reads_hvac_status(climate_entity, mock_coordinator, mock_vehicle):
+    mock_vehicle.async_refresh = AsyncMock()
+    mock_coordinator.async_fetch_vehicles = AsyncMock()
+    mock_vehicle.hvac_status = True
+
+    await climate_entity._async_fetch_loop(True)
+
+    mock_vehicle.async_refresh.assert_awaited_once()
+    mock_coordinator.async_fetch_vehicles.assert_awaited_once_with([mock_vehicle.vin], ['hvac_status'])
+    assert not climate_entity._loop_mutex
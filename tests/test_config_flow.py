@@ -5,6 +5,7 @@ import pytest
 from custom_components.nissan_connect import config_flow
 from custom_components.nissan_connect.const import DOMAIN
 from homeassistant import data_entry_flow
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 from custom_components.nissan_connect.const import DOMAIN, DEFAULT_REGION
 
 @pytest.fixture
@@ -72,6 +73,7 @@ async def test_step_user_submit(hass, mock_kamereon_session):
 
     assert result["type"] == data_entry_flow.RESULT_TYPE_CREATE_ENTRY
     assert result["title"] == "test@example.com"
+    mock_kamereon_session.return_value.close.assert_called_once()
     assert result["data"] == {
         "email": "test@example.com",
         "password": "password123",
@@ -99,3 +101,82 @@ async def test_step_user_invalid_auth(hass, mock_kamereon_session):
 
     assert result["type"] == data_entry_flow.RESULT_TYPE_FORM
     assert result["errors"] == {"base": "auth_error"}
+    mock_kamereon_session.return_value.close.assert_called_once()
+
+async def test_options_flow_sets_endpoint_intervals(hass):
+    """Test the options flow through to the per-endpoint intervals."""
+    entry = MockConfigEntry(domain=DOMAIN, data={
+        "email": "test@example.com",
+        "password": "password123",
+        "region": DEFAULT_REGION,
+        "interval_wake_lock_status": 0,
+    })
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {"interval": 60, "interval_charging": 15, "interval_min": 5, "interval_max": 480, "interval_fetch": 10, "read_timeout": 60}
+    )
+    assert result["type"] == data_entry_flow.RESULT_TYPE_FORM
+    assert result["step_id"] == "endpoints"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {"interval_fetch_cockpit": 360, "interval_statistics": 60, "interval_wake_battery_status": 5}
+    )
+    assert result["type"] == data_entry_flow.RESULT_TYPE_FORM
+    assert result["step_id"] == "profiles"
+
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {"quiet_start": "22:30:00", "quiet_end": "06:00:00", "commute_morning_start": "07:00:00",
+         "commute_morning_end": "09:30:00", "commute_evening_start": "16:30:00", "commute_evening_end": "19:00:00"}
+    )
+
+    assert result["type"] == data_entry_flow.RESULT_TYPE_CREATE_ENTRY
+    assert entry.data["quiet_start"] == "22:30:00"
+    assert entry.data["read_timeout"] == 60
+    assert entry.data["connect_timeout"] == 10
+    assert entry.data["endpoint_concurrency"] == 5
+    assert entry.data["vehicle_concurrency"] == 3
+    assert entry.data["interval_fetch_cockpit"] == 360
+    assert entry.data["interval_fetch_location"] is None
+    assert entry.data["interval_wake_battery_status"] == 5
+    # Cleared, so back to the default
+    assert entry.data["interval_wake_lock_status"] is None
+
+async def test_options_flow_rejects_min_interval_above_max(hass):
+    entry = MockConfigEntry(domain=DOMAIN, data={
+        "email": "test@example.com",
+        "password": "password123",
+        "region": DEFAULT_REGION,
+    })
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    result = await hass.config_entries.options.async_configure(
+        result["flow_id"],
+        {"interval": 60, "interval_charging": 15, "interval_min": 120, "interval_max": 60, "interval_fetch": 10}
+    )
+
+    assert result["type"] == data_entry_flow.RESULT_TYPE_FORM
+    assert result["step_id"] == "init"
+    assert result["errors"] == {"interval_max": "interval_range"}
+
+
+async def test_options_flow_bounds_endpoint_concurrency(hass):
+    entry = MockConfigEntry(domain=DOMAIN, data={
+        "email": "test@example.com",
+        "password": "password123",
+        "region": DEFAULT_REGION,
+    })
+    entry.add_to_hass(hass)
+
+    result = await hass.config_entries.options.async_init(entry.entry_id)
+    with pytest.raises(data_entry_flow.InvalidData):
+        await hass.config_entries.options.async_configure(
+            result["flow_id"],
+            {"interval": 60, "interval_charging": 15, "interval_min": 5, "interval_max": 480, "interval_fetch": 10,
+             "endpoint_concurrency": 6}
+        )
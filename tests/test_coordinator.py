@@ -0,0 +1,388 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from custom_components.nissan_connect.const import DOMAIN, DEFAULT_INTERVAL_CHARGING, DEFAULT_INTERVAL_POLL, DATA_VEHICLES, DATA_VEHICLE_SEMAPHORE, DATA_STATE_STORE, DATA_PROFILE_STORE, DATA_COORDINATOR_FETCH, DATA_COORDINATOR_POLL, DATA_SESSION, SERVICE_SET_PROFILE
+from homeassistant.util import dt as dt_util
+from custom_components.nissan_connect import async_setup
+from custom_components.nissan_connect.coordinator import KamereonFetchCoordinator, KamereonPollCoordinator, StatisticsCoordinator, cache_ttls
+from custom_components.nissan_connect.kamereon.kamereon_const import ChargingSpeed, ChargingStatus, Feature, Period
+
+
+def mock_vehicle(**kwargs):
+    vehicle = MagicMock(features=[Feature.DRIVING_JOURNEY_HISTORY], version=0, **kwargs)
+    vehicle.async_fetch_all = AsyncMock()
+    vehicle.async_fetch_trip_histories = AsyncMock(return_value=[])
+    return vehicle
+
+
+@pytest.fixture
+def config():
+    return {'email': 'test_account'}
+
+
+@pytest.fixture
+def vehicles(hass):
+    vehicles = {
+        'vin_1': mock_vehicle(vin='vin_1'),
+        'vin_2': mock_vehicle(vin='vin_2'),
+    }
+    hass.data[DOMAIN] = {
+        'test_account': {
+            DATA_VEHICLES: vehicles,
+            DATA_VEHICLE_SEMAPHORE: asyncio.Semaphore(2),
+            DATA_STATE_STORE: MagicMock(),
+            DATA_PROFILE_STORE: MagicMock(),
+            DATA_COORDINATOR_POLL: MagicMock(),
+            DATA_SESSION: MagicMock(),
+        }
+    }
+    return vehicles
+
+
+async def test_fetch_coordinator_updates_vehicles_in_parallel(hass, config, vehicles):
+    running = 0
+    peak = 0
+
+    async def fetch_all(endpoints=None):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    for vehicle in vehicles.values():
+        vehicle.async_fetch_all.side_effect = fetch_all
+
+    coordinator = KamereonFetchCoordinator(hass, config)
+
+    assert await coordinator._async_update_data() == {'vin_1': 0, 'vin_2': 0}
+    assert peak == 2
+
+
+async def test_fetch_coordinator_reports_failure(hass, config, vehicles):
+    vehicles['vin_2'].async_fetch_all.side_effect = RuntimeError()
+
+    coordinator = KamereonFetchCoordinator(hass, config)
+
+    assert await coordinator._async_update_data() is False
+    vehicles['vin_1'].async_fetch_all.assert_awaited_once()
+
+
+async def test_statistics_coordinator_skips_failed_vehicle(hass, config, vehicles):
+    vehicles['vin_2'].async_fetch_trip_histories.side_effect = RuntimeError()
+
+    coordinator = StatisticsCoordinator(hass, config)
+    output = await coordinator._async_update_data()
+
+    assert output == {'vin_1': {'daily': [], 'monthly': []}}
+    vehicles['vin_1'].async_fetch_trip_histories.assert_any_await(Period.DAILY)
+    vehicles['vin_1'].async_fetch_trip_histories.assert_any_await(Period.MONTHLY)
+
+
+async def test_seeded_poll_coordinator_does_not_poll_straight_away(hass, config, vehicles):
+    for vehicle in vehicles.values():
+        vehicle.async_refresh = AsyncMock()
+
+    coordinator = KamereonPollCoordinator(hass, config)
+    coordinator.set_next_interval()
+    coordinator.async_seed()
+
+    assert coordinator.data is True
+    assert await coordinator._async_update_data() is True
+    for vehicle in vehicles.values():
+        vehicle.async_refresh.assert_not_awaited()
+
+
+async def test_cycle_deadline_cancels_slow_vehicles(hass, vehicles):
+    async def hang(endpoints=None):
+        await asyncio.sleep(10)
+
+    vehicles['vin_2'].async_fetch_all.side_effect = hang
+
+    coordinator = KamereonFetchCoordinator(hass, {'email': 'test_account', 'cycle_deadline': 0.05})
+
+    assert await coordinator._async_update_data() is False
+    assert coordinator.overruns == 1
+    vehicles['vin_1'].async_fetch_all.assert_awaited_once()
+
+
+async def test_statistics_coordinator_keeps_last_data_for_failed_vehicle(hass, config, vehicles):
+    coordinator = StatisticsCoordinator(hass, config)
+    coordinator.data = {'vin_2': {'daily': ['old'], 'monthly': []}}
+    vehicles['vin_2'].async_fetch_trip_histories.side_effect = RuntimeError()
+
+    output = await coordinator._async_update_data()
+
+    assert output['vin_2'] == {'daily': ['old'], 'monthly': []}
+
+
+async def test_fetch_coordinator_only_saves_state_when_it_changed(hass, config, vehicles):
+    store = hass.data[DOMAIN]['test_account'][DATA_STATE_STORE]
+    coordinator = KamereonFetchCoordinator(hass, config)
+
+    await coordinator.async_refresh()
+    coordinator._last_fetched.clear()
+    await coordinator.async_refresh()
+    assert store.async_delay_save.call_count == 1
+
+    vehicles['vin_1'].version = 1
+    coordinator._last_fetched.clear()
+    await coordinator.async_refresh()
+    assert store.async_delay_save.call_count == 2
+
+
+async def test_poll_coordinator_only_polls_and_fetches_due_vehicles(hass, config, vehicles):
+    fetch_coordinator = hass.data[DOMAIN]['test_account'][DATA_COORDINATOR_FETCH] = MagicMock()
+    fetch_coordinator.async_fetch_vehicles = AsyncMock()
+    for vehicle in vehicles.values():
+        vehicle.async_refresh = AsyncMock()
+        vehicle.hvac_status = False
+
+    coordinator = KamereonPollCoordinator(hass, config)
+    coordinator.async_seed()
+    coordinator._schedule_regular('vin_2', time.time())
+
+    assert await coordinator._async_update_data() is True
+    await hass.async_block_till_done()
+
+    vehicles['vin_1'].async_refresh.assert_not_awaited()
+    vehicles['vin_2'].async_refresh.assert_awaited_once()
+    vehicles['vin_2'].async_refresh.assert_awaited_once_with(endpoints=['location', 'battery_status'])
+    fetch_coordinator.async_fetch_vehicles.assert_awaited_once_with(['vin_2'], ['battery_status', 'location'])
+
+
+async def test_poll_coordinator_sleeps_until_next_vehicle_is_due(hass, config, vehicles):
+    vehicles['vin_1'].hvac_status = True
+    vehicles['vin_2'].hvac_status = False
+
+    coordinator = KamereonPollCoordinator(hass, config)
+    coordinator.async_seed()
+
+    # vin_1 has HVAC on so is polled every minute, plus up to 10% jitter
+    assert 60 <= coordinator.update_interval.total_seconds() <= 66
+    assert coordinator._deadlines['vin_2'] - time.time() > 3600 - 5
+
+
+async def test_poll_interval_backs_off_while_static_and_tightens_on_change(hass, vehicles):
+    vehicle = vehicles['vin_1']
+    vehicle.hvac_status = False
+    vehicle.battery_level = 80
+    coordinator = KamereonPollCoordinator(hass, {'email': 'test_account', 'interval': 60, 'interval_min': 10, 'interval_max': 240})
+
+    coordinator.set_next_interval()
+    assert coordinator._intervals['vin_1'] == 60
+
+    # Polled, nothing changed
+    for expected in (120, 240, 240):
+        coordinator._polled.add('vin_1')
+        coordinator.set_next_interval()
+        assert coordinator._intervals['vin_1'] == expected
+
+    # Not polled since, so no evidence either way
+    coordinator.set_next_interval()
+    assert coordinator._intervals['vin_1'] == 240
+
+    # The fetch straight after a poll may be too soon to show anything, so
+    # it's the next scheduled fetch that counts
+    coordinator._intervals['vin_1'] = coordinator._adaptive['vin_1'] = 60
+    coordinator._polled.add('vin_1')
+    coordinator.set_next_interval(settled=False)
+    assert coordinator._intervals['vin_1'] == 60
+    coordinator.set_next_interval()
+    assert coordinator._intervals['vin_1'] == 120
+
+    for expected in (60, 30, 15, 10):
+        vehicle.battery_level -= 1
+        coordinator.set_next_interval()
+        assert coordinator._intervals['vin_1'] == expected
+
+
+async def test_charging_vehicle_is_polled_at_charging_interval(hass, config, vehicles):
+    vehicle = vehicles['vin_1']
+    vehicle.hvac_status = False
+    vehicle.features = [Feature.BATTERY_STATUS]
+    vehicle.charging = ChargingStatus.CHARGING
+    # Car isn't saying how long it will take
+    vehicle.charge_time_required_to_full = {ChargingSpeed.NORMAL: None}
+    coordinator = KamereonPollCoordinator(hass, config)
+
+    for _ in range(3):
+        coordinator._polled.add('vin_1')
+        coordinator.set_next_interval()
+
+    assert coordinator._intervals['vin_1'] == DEFAULT_INTERVAL_CHARGING
+    assert coordinator._adaptive['vin_1'] > DEFAULT_INTERVAL_CHARGING
+
+
+async def test_charging_vehicle_is_polled_when_charge_should_complete(hass, config, vehicles, monkeypatch):
+    fetch_coordinator = hass.data[DOMAIN]['test_account'][DATA_COORDINATOR_FETCH] = MagicMock()
+    fetch_coordinator.async_fetch_vehicles = AsyncMock()
+    for vehicle in vehicles.values():
+        vehicle.hvac_status = False
+        vehicle.next_hvac_start_date = None
+        vehicle.async_refresh = AsyncMock()
+    vehicle = vehicles['vin_1']
+    vehicle.features = [Feature.BATTERY_STATUS]
+    vehicle.charging = ChargingStatus.CHARGING
+    vehicle.charging_speed = ChargingSpeed.NORMAL
+    vehicle.charge_time_required_to_full = {ChargingSpeed.NORMAL: 30}
+    vehicle.battery_status_last_updated = datetime.now(timezone.utc) - timedelta(minutes=20)
+
+    coordinator = KamereonPollCoordinator(hass, config)
+    coordinator.async_seed()
+
+    # Charging should be done before the next poll at the charging interval
+    assert coordinator._intervals['vin_1'] == DEFAULT_INTERVAL_CHARGING
+    at, kind = coordinator._events['vin_1']
+    assert kind == 'charge_complete'
+
+    # With that poll lined up, the charging interval no longer applies
+    coordinator.set_next_interval()
+    assert coordinator._intervals['vin_1'] == DEFAULT_INTERVAL_POLL
+    assert coordinator._events['vin_1'] == (at, kind)
+    assert 10 * 60 <= coordinator.update_interval.total_seconds() <= 11 * 60 + 5
+    monkeypatch.setattr('custom_components.nissan_connect.coordinator.time', lambda: at)
+    await coordinator._async_update_data()
+
+    vehicle.async_refresh.assert_awaited_once_with(endpoints=['battery_status'])
+
+
+async def test_vehicle_is_polled_after_scheduled_hvac_start(hass, config, vehicles):
+    start = datetime.now(timezone.utc) + timedelta(minutes=5)
+    for vehicle in vehicles.values():
+        vehicle.hvac_status = False
+    vehicles['vin_2'].next_hvac_start_date = start
+
+    coordinator = KamereonPollCoordinator(hass, config)
+    coordinator.async_seed()
+
+    assert coordinator._events['vin_2'] == (start.timestamp() + 120, 'hvac_start')
+    assert coordinator._deadlines['vin_2'] == start.timestamp() + 120
+
+
+async def test_fetch_coordinator_only_fetches_due_endpoints(hass, vehicles):
+    coordinator = KamereonFetchCoordinator(hass, {'email': 'test_account', 'interval_fetch': 10, 'interval_fetch_cockpit': 360})
+    assert coordinator.update_interval == timedelta(minutes=10)
+
+    await coordinator._async_update_data()
+    vehicles['vin_1'].async_fetch_all.assert_awaited_with(endpoints=['cockpit', 'location', 'battery_status', 'hvac_status', 'lock_status'])
+
+    for endpoint in ('location', 'battery_status', 'hvac_status', 'lock_status'):
+        coordinator._last_fetched[endpoint] -= 600
+    await coordinator._async_update_data()
+    vehicles['vin_1'].async_fetch_all.assert_awaited_with(endpoints=['location', 'battery_status', 'hvac_status', 'lock_status'])
+
+
+def test_endpoint_with_own_fetch_interval_is_not_cached():
+    assert cache_ttls({'interval_fetch': 10}) == {'cockpit': 3600}
+    assert cache_ttls({'interval_fetch_cockpit': 30}) == {}
+
+
+async def test_endpoint_with_own_wake_interval_is_polled_on_its_own(hass, vehicles, monkeypatch):
+    for vehicle in vehicles.values():
+        vehicle.hvac_status = False
+        vehicle.next_hvac_start_date = None
+        vehicle.async_refresh = AsyncMock()
+    fetch_coordinator = hass.data[DOMAIN]['test_account'][DATA_COORDINATOR_FETCH] = MagicMock()
+    fetch_coordinator.async_fetch_vehicles = AsyncMock()
+
+    coordinator = KamereonPollCoordinator(hass, {'email': 'test_account', 'interval_wake_battery_status': 5})
+    coordinator.async_seed()
+    assert 5 * 60 - 1 <= coordinator.update_interval.total_seconds() <= 5 * 60 + 1
+
+    now = time.time() + 5 * 60
+    monkeypatch.setattr('custom_components.nissan_connect.coordinator.time', lambda: now)
+    await coordinator._async_update_data()
+
+    vehicles['vin_1'].async_refresh.assert_awaited_once_with(endpoints=['battery_status'])
+    # Location follows the vehicle's polling interval, which isn't due yet
+    assert coordinator._regular['vin_1'] > now
+
+
+async def test_profile_puts_polls_off_until_quiet_hours_end(hass, config, vehicles, monkeypatch):
+    for vehicle in vehicles.values():
+        vehicle.hvac_status = False
+        vehicle.next_hvac_start_date = None
+    # 22:30 local, so the hourly poll would fall in quiet hours
+    now = datetime(2024, 1, 1, 22, 30, tzinfo=dt_util.DEFAULT_TIME_ZONE).timestamp()
+    monkeypatch.setattr('custom_components.nissan_connect.coordinator.time', lambda: now)
+    coordinator = KamereonPollCoordinator(hass, config)
+    coordinator.async_seed()
+    assert coordinator._deadlines['vin_1'] < now + 2 * 3600
+
+    coordinator.set_profile('quiet_nights', 'vin_1')
+
+    morning = datetime(2024, 1, 2, 7, 0, tzinfo=dt_util.DEFAULT_TIME_ZONE).timestamp()
+    assert morning <= coordinator._deadlines['vin_1'] <= morning + 6 * 60
+    assert coordinator._deadlines['vin_2'] < now + 2 * 3600
+    assert coordinator.profile('vin_1') == 'quiet_nights'
+    assert coordinator.profile('vin_2') == 'default'
+
+    # Saved, and picked up again after a restart
+    store = hass.data[DOMAIN]['test_account'][DATA_PROFILE_STORE]
+    saved = store.async_delay_save.call_args.args[0]()
+    restarted = KamereonPollCoordinator(hass, config)
+    restarted.load_profiles(saved)
+    assert restarted.profile('vin_1') == 'quiet_nights'
+    assert restarted.profile('vin_2') == 'default'
+
+
+async def test_set_profile_service_switches_account_without_reload(hass, config, vehicles):
+    coordinator = hass.data[DOMAIN]['test_account'][DATA_COORDINATOR_POLL] = MagicMock()
+    await async_setup(hass, {})
+
+    await hass.services.async_call(DOMAIN, SERVICE_SET_PROFILE, {'profile': 'commute'}, blocking=True)
+    coordinator.set_profile.assert_called_once_with('commute', None)
+
+    vehicles['SJN123'] = mock_vehicle(vin='SJN123')
+    await hass.services.async_call(DOMAIN, SERVICE_SET_PROFILE, {'profile': 'default', 'vin': 'sjn123'}, blocking=True)
+    coordinator.set_profile.assert_called_with('default', 'SJN123')
+
+
+
+async def test_polling_slows_to_stay_within_daily_budget(hass, vehicles):
+    for vehicle in vehicles.values():
+        vehicle.hvac_status = False
+    session = hass.data[DOMAIN]['test_account'][DATA_SESSION] = MagicMock()
+    # On course for twice the budget
+    now = time.time()
+    midnight = dt_util.start_of_local_day().timestamp()
+    elapsed = max(now - midnight, 3600)
+    session.calls = MagicMock(total=100, started=midnight)
+    session.calls.source.return_value = 100
+    budget = 100 + round(100 / elapsed * (midnight + 86400 - now) / 2)
+
+    coordinator = KamereonPollCoordinator(hass, {'email': 'test_account', 'daily_budget': budget})
+    coordinator.async_seed()
+    assert 119 <= coordinator._intervals['vin_1'] <= 121
+
+    session.calls.total = budget
+    coordinator.set_next_interval()
+    assert coordinator._deadlines['vin_1'] >= midnight + 86400
+
+
+async def test_budget_left_after_other_traffic_goes_to_polls(hass, vehicles):
+    for vehicle in vehicles.values():
+        vehicle.hvac_status = False
+    session = hass.data[DOMAIN]['test_account'][DATA_SESSION]
+    now = time.time()
+    midnight = dt_util.start_of_local_day().timestamp()
+    elapsed = max(now - midnight, 3600)
+    remaining = midnight + 86400 - now
+    # Polls and fetches on course for 100 more each, of which only fetches
+    # would fit in the budget if polls carried on at their rate
+    session.calls = MagicMock(total=100, started=midnight)
+    session.calls.source.return_value = 50
+    per_source = round(50 / elapsed * remaining)
+    budget = 100 + per_source + per_source // 2
+
+    coordinator = KamereonPollCoordinator(hass, {'email': 'test_account', 'daily_budget': budget})
+    coordinator.async_seed()
+    assert 118 <= coordinator._intervals['vin_1'] <= 122
+
+    # Fetches alone will use the rest of the budget, so polling stops
+    coordinator.update_config({'email': 'test_account', 'daily_budget': 100 + per_source})
+    coordinator.set_next_interval()
+    assert coordinator._deadlines['vin_1'] >= midnight + 86400
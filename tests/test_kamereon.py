@@ -0,0 +1,864 @@
+import asyncio
+import aiohttp
+import json
+import time
+from datetime import date
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from custom_components.nissan_connect.kamereon.kamereon import (
+    _registry,
+    CallCounter,
+    CircuitBreaker,
+    CircuitOpenError,
+    KamereonResponse,
+    NCISession,
+    RateLimiter,
+    ResponseCache,
+    RetryPolicy,
+    Vehicle,
+)
+from custom_components.nissan_connect.kamereon.kamereon_const import USERS, ChargingSpeed, ChargingStatus, Feature, LockStatus, Priority
+
+
+def response(body, status=200, headers=None):
+    return KamereonResponse(status, headers or {}, json.dumps(body))
+
+
+@pytest.fixture
+def session():
+    session = NCISession(region='EU', websession=MagicMock())
+    session._oauth = MagicMock(token={'access_token': 'abc', 'expires_at': time.time() + 3600})
+    session._user_id = 'user'
+    _registry[USERS]['user'] = session
+    return session
+
+
+@pytest.fixture
+def vehicle(session):
+    return Vehicle({
+        'vin': 'vin123',
+        'modelName': 'Leaf',
+        'services': [
+            {'id': Feature.MY_CAR_FINDER.value, 'activationState': 'ACTIVATED'},
+            {'id': Feature.LOCK_STATUS_CHECK.value, 'activationState': 'ACTIVATED'},
+        ]
+    }, 'user')
+
+
+@pytest.mark.asyncio
+async def test_async_request_sends_bearer_token(session):
+    session._async_send = AsyncMock(return_value=response({}))
+
+    await session.async_request('GET', 'https://example.com/')
+
+    assert session._async_send.call_args.kwargs['headers']['Authorization'] == 'Bearer abc'
+
+
+@pytest.mark.asyncio
+async def test_async_request_logs_in_again_on_401(session):
+    session._async_send = AsyncMock(side_effect=[response({}, 401), response({'ok': True})])
+    session.async_login = AsyncMock()
+
+    resp = await session.async_request('GET', 'https://example.com/')
+
+    session.async_login.assert_awaited_once()
+    assert resp.json() == {'ok': True}
+
+
+@pytest.mark.asyncio
+async def test_async_fetch_location(session, vehicle):
+    session._async_send = AsyncMock(return_value=response({'data': {'attributes': {
+        'gpsLatitude': 51.5,
+        'gpsLongitude': -0.1,
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+    }}}))
+
+    await vehicle.async_fetch_location()
+
+    assert vehicle.location == (51.5, -0.1)
+    assert vehicle.location_last_updated.year == 2024
+
+
+@pytest.mark.asyncio
+async def test_async_fetch_lock_status(session, vehicle):
+    session._async_send = AsyncMock(return_value=response({'data': {'attributes': {
+        'lockStatus': 'unlocked',
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+    }}}))
+
+    await vehicle.async_fetch_lock_status()
+
+    assert vehicle.lock_status == LockStatus.UNLOCKED
+
+
+@pytest.mark.asyncio
+async def test_gather_runs_concurrently_within_cap(vehicle):
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await vehicle._async_gather([call] * 5, concurrency=2)
+
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_gather_applies_all_results_before_raising(vehicle):
+    finished = []
+
+    async def failing():
+        raise ValueError('boom')
+
+    async def succeeding():
+        await asyncio.sleep(0)
+        finished.append(True)
+
+    with pytest.raises(ValueError):
+        await vehicle._async_gather([failing, succeeding], concurrency=None)
+
+    assert finished == [True]
+
+
+@pytest.mark.asyncio
+async def test_connection_stats(session):
+    await session._on_connection_create(None, None, None)
+    await session._on_connection_reuse(None, None, None)
+    await session._on_connection_reuse(None, None, None)
+
+    assert session.connection_stats == {
+        'sync': {'created': 0, 'reused': 0},
+        'async': {'created': 1, 'reused': 2},
+    }
+
+
+@pytest.mark.asyncio
+async def test_async_login_shares_token_with_sync_session(session):
+    redirect = 'org.kamereon.service.nci:/oauth2redirect?code=xyz'
+    session._async_send = AsyncMock(side_effect=[
+        response({'callbacks': []}),
+        response({'realm': '/a-ncb-prod'}),
+        response({}, 302, {'location': redirect}),
+        response({'access_token': 'new', 'token_type': 'Bearer', 'expires_in': 3600}),
+    ])
+    pooled = session.session
+
+    await session.async_login('user@example.com', 'password')
+
+    assert session.session is pooled
+    assert session.oauth is pooled
+    assert session.oauth.token['access_token'] == 'new'
+
+
+@pytest.mark.asyncio
+async def test_expiring_token_is_refreshed_before_request(session):
+    session._oauth = session.session
+    session.session.token = {'access_token': 'old', 'refresh_token': 'refresh', 'expires_at': time.time() + 10}
+    session._token_url = 'https://example.com/access_token'
+    session._async_send = AsyncMock(side_effect=[
+        response({'access_token': 'new', 'token_type': 'Bearer', 'expires_in': 3600}),
+        response({}),
+    ])
+    session.async_login = AsyncMock()
+
+    await session.async_request('GET', 'https://example.com/')
+
+    session.async_login.assert_not_awaited()
+    assert session._async_send.call_args_list[0].args[1] == 'https://example.com/access_token'
+    assert session._async_send.call_args.kwargs['headers']['Authorization'] == 'Bearer new'
+    assert session.oauth.token['refresh_token'] == 'refresh'
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_falls_back_to_login(session):
+    session._oauth = session.session
+    session.session.token = {'access_token': 'old', 'refresh_token': 'refresh', 'expires_at': time.time() + 3600}
+    session._token_url = 'https://example.com/access_token'
+    session._async_send = AsyncMock(return_value=response({'error': 'invalid_grant'}, 400))
+    session.async_login = AsyncMock()
+
+    await session.async_refresh_access_token()
+
+    session.async_login.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_401s_share_one_login(session):
+    session._oauth = session.session
+    session.session.token = {'access_token': 'old', 'expires_at': time.time() + 3600}
+
+    async def send(method, url, headers=None, **kwargs):
+        await asyncio.sleep(0)
+        if headers['Authorization'] == 'Bearer old':
+            return response({}, 401)
+        return response({})
+
+    async def login():
+        await asyncio.sleep(0.01)
+        session.session.token = {'access_token': 'new', 'expires_at': time.time() + 3600}
+
+    session._async_send = send
+    session.async_login = AsyncMock(side_effect=login)
+
+    await asyncio.gather(*[session.async_request('GET', f'https://example.com/{i}') for i in range(4)])
+
+    session.async_login.assert_awaited_once()
+    assert session.auth_stats['coalesced'] == 3
+
+
+@pytest.mark.asyncio
+async def test_restored_auth_is_used_and_updates_are_reported(session):
+    restored = NCISession(region='EU', websession=MagicMock())
+    state = {
+        'token': {'access_token': 'saved', 'refresh_token': 'refresh', 'expires_at': time.time() + 3600},
+        'token_url': 'https://example.com/access_token',
+        'user_id': 'saved_user',
+    }
+    restored.on_auth_update = MagicMock()
+    restored._async_send = AsyncMock(return_value=response({}))
+
+    assert restored.restore_auth(state)
+    assert await restored.async_get_user_id() == 'saved_user'
+    await restored.async_request('GET', 'https://example.com/')
+
+    assert restored._async_send.call_count == 1
+    assert restored._async_send.call_args.kwargs['headers']['Authorization'] == 'Bearer saved'
+    assert restored.auth_state == state
+    restored.on_auth_update.assert_not_called()
+
+    restored._async_send = AsyncMock(return_value=response({'access_token': 'new', 'token_type': 'Bearer', 'expires_in': 3600}))
+    await restored.async_refresh_access_token()
+    restored.on_auth_update.assert_called_once()
+
+
+def test_restore_auth_without_token():
+    assert not NCISession(region='EU').restore_auth(None)
+    assert not NCISession(region='EU').restore_auth({'token': None})
+
+
+@pytest.mark.asyncio
+async def test_vehicle_state_round_trips_through_snapshot(session, vehicle):
+    session._async_send = AsyncMock(return_value=response({'data': {'attributes': {
+        'gpsLatitude': 51.5,
+        'gpsLongitude': -0.1,
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+        'lockStatus': 'locked',
+    }}}))
+    await vehicle.async_fetch_location()
+    await vehicle.async_fetch_lock_status()
+
+    snapshot = json.loads(json.dumps([vehicle.dump_state()]))
+    session._async_send.reset_mock()
+    [restored] = session.restore_vehicles(snapshot, 'user')
+
+    session._async_send.assert_not_called()
+    assert restored.restored is True
+    assert restored.vin == vehicle.vin
+    assert restored.location == (51.5, -0.1)
+    assert restored.location_last_updated == vehicle.location_last_updated
+    assert restored.lock_status == LockStatus.LOCKED
+
+
+@pytest.mark.asyncio
+async def test_async_requests_use_configured_timeout():
+    websession = MagicMock()
+    session = NCISession(region='EU', websession=websession, connect_timeout=5, read_timeout=20)
+
+    resp = websession.request.return_value.__aenter__.return_value
+    resp.status = 200
+    resp.text = AsyncMock(return_value='{}')
+
+    assert (await session._async_send('GET', 'https://example.com/')).status_code == 200
+
+    timeout = websession.request.call_args.kwargs['timeout']
+    assert (timeout.sock_connect, timeout.sock_read) == (5, 20)
+    assert session.timeout == (5, 20)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleep = AsyncMock()
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    return sleep
+
+
+@pytest.mark.asyncio
+async def test_get_retries_server_errors_and_counts_them(session, no_sleep):
+    session._async_send = AsyncMock(side_effect=[response({}, 503), response({'ok': True})])
+
+    resp = await session.async_request('GET', 'https://example.com/v1/cars/vin123/location')
+
+    assert resp.json() == {'ok': True}
+    no_sleep.assert_awaited_once()
+    assert session.retry_stats == {'GET v1/cars/location': 1}
+
+
+def test_blocking_requests_share_the_retry_policy(session, vehicle, monkeypatch):
+    sleep = MagicMock()
+    monkeypatch.setattr(time, 'sleep', sleep)
+    session._oauth.get.side_effect = [response({}, 503), response(location(51.5))]
+
+    vehicle.fetch_location()
+
+    assert vehicle.location == (51.5, -0.1)
+    sleep.assert_called_once()
+    assert sum(session.retry_stats.values()) == 1
+    assert session.calls.total == 2
+
+
+def test_blocking_refresh_is_gated_on_features_like_async(session, vehicle):
+    vehicle.refresh_hvac_status()
+    session._oauth.post.assert_not_called()
+
+    session._oauth.post.return_value = response({'data': {}})
+    vehicle.refresh_lock_status()
+    assert session._oauth.post.call_args.args[0].endswith('/v1/cars/VIN123/actions/refresh-lock-status')
+
+
+@pytest.mark.asyncio
+async def test_retry_after_header_sets_the_delay(session, no_sleep):
+    session._async_send = AsyncMock(side_effect=[response({}, 429, {'Retry-After': '7'}), response({})])
+
+    await session.async_request('POST', 'https://example.com/v1/cars/vin123/actions/horn-lights')
+
+    no_sleep.assert_awaited_once_with(7.0)
+
+
+@pytest.mark.asyncio
+async def test_long_retry_after_gives_up(session, no_sleep):
+    session._async_send = AsyncMock(return_value=response({}, 429, {'Retry-After': '3600'}))
+
+    resp = await session.async_request('GET', 'https://example.com/')
+
+    assert resp.status_code == 429
+    session._async_send.assert_awaited_once()
+    no_sleep.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_post_is_not_retried_after_it_may_have_run(session, no_sleep):
+    session._async_send = AsyncMock(side_effect=[response({}, 500), response({})])
+
+    resp = await session.async_request('POST', 'https://example.com/')
+    assert resp.status_code == 500
+
+    session._async_send = AsyncMock(side_effect=asyncio.TimeoutError())
+    with pytest.raises(asyncio.TimeoutError):
+        await session.async_request('POST', 'https://example.com/')
+
+    session._async_send.assert_awaited_once()
+    no_sleep.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_post_is_retried_when_the_connection_timed_out(session, no_sleep):
+    session._async_send = AsyncMock(side_effect=[
+        aiohttp.ServerTimeoutError("Connection timeout to host https://example.com/"),
+        response({}),
+    ])
+
+    resp = await session.async_request('POST', 'https://example.com/')
+
+    assert resp.status_code == 200
+    no_sleep.assert_awaited_once()
+
+    # A read timeout may come after the action has run
+    session._async_send = AsyncMock(side_effect=aiohttp.ServerTimeoutError("Timeout on reading data from socket"))
+    with pytest.raises(aiohttp.ServerTimeoutError):
+        await session.async_request('POST', 'https://example.com/')
+    session._async_send.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failed_login_is_not_retried(session, no_sleep):
+    session._oauth.token['expires_at'] = time.time()
+    session.async_reauthenticate = AsyncMock(side_effect=RuntimeError("Login failed"))
+    session._async_send = AsyncMock()
+
+    with pytest.raises(RuntimeError):
+        await session.async_request('GET', 'https://example.com/')
+
+    session.async_reauthenticate.assert_awaited_once()
+    session._async_send.assert_not_awaited()
+    no_sleep.assert_not_awaited()
+
+
+def test_jittered_delay_stays_within_bounds():
+    policy = RetryPolicy(base_delay=1, max_delay=10)
+    delay = 0
+    for _ in range(20):
+        previous = delay
+        delay = policy.delay(delay)
+        assert 1 <= delay <= min(10, max(previous, 1) * 3)
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_failures_and_probes_to_recover(session, no_sleep, monkeypatch):
+    url = session.settings['car_adapter_base_url'] + 'v1/cars/vin123/location'
+    session._async_http = AsyncMock(return_value=response({}, 503))
+    session.circuit(url).failure_threshold = 2
+
+    await session.async_request('GET', url, max_retries=2)
+    assert session.circuit(url).state == CircuitBreaker.OPEN
+
+    # Short-circuited without calling the API or retrying
+    session._async_http.reset_mock()
+    with pytest.raises(CircuitOpenError):
+        await session.async_request('GET', url)
+    session._async_http.assert_not_awaited()
+
+    # Other hosts are unaffected
+    other = session.settings['user_adapter_base_url'] + 'v1/users/current'
+    session._async_http.return_value = response({'userId': 'user'})
+    await session.async_request('GET', other)
+
+    # After the reset timeout a probe is let through, and success closes the circuit
+    monkeypatch.setattr(time, 'monotonic', lambda: session.circuit(url)._opened_at + 3600)
+    await session.async_request('GET', url)
+    assert session.circuit(url).state == CircuitBreaker.CLOSED
+    assert session.circuit_stats[session.settings['car_adapter_base_url']]['opened'] == 1
+
+
+def test_failed_probe_opens_circuit_again():
+    circuit = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+    circuit.record_failure()
+    circuit.before_call()
+    assert circuit.state == CircuitBreaker.HALF_OPEN
+
+    circuit.record_failure()
+    assert circuit.state == CircuitBreaker.OPEN
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_lets_the_next_call_probe(session, monkeypatch):
+    url = session.settings['car_adapter_base_url'] + 'v1/cars/vin123/location'
+    circuit = session.circuit(url)
+    circuit.failure_threshold = 1
+    circuit.record_failure()
+    monkeypatch.setattr(time, 'monotonic', lambda: circuit._opened_at + 3600)
+
+    session._async_http = AsyncMock(side_effect=asyncio.CancelledError())
+    with pytest.raises(asyncio.CancelledError):
+        await session._async_send('GET', url)
+    assert circuit.state == CircuitBreaker.OPEN
+
+    session._async_http = AsyncMock(return_value=response({}))
+    await session._async_send('GET', url)
+    assert circuit.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_releases_waiters_by_priority():
+    limiter = RateLimiter(rate=100, burst=1)
+    order = []
+
+    async def request(priority, name):
+        await limiter.acquire(priority)
+        order.append(name)
+
+    await limiter.acquire(Priority.FETCH)
+    await asyncio.gather(
+        request(Priority.STATISTICS, 'statistics'),
+        request(Priority.FETCH, 'fetch'),
+        request(Priority.COMMAND, 'command'),
+    )
+
+    assert order == ['command', 'fetch', 'statistics']
+    assert limiter.stats['waits'] == {'COMMAND': 1, 'FETCH': 1, 'STATISTICS': 1}
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_use_a_token():
+    limiter = RateLimiter(rate=100, burst=1)
+    await limiter.acquire()
+
+    waiting = asyncio.ensure_future(limiter.acquire(Priority.STATISTICS))
+    await asyncio.sleep(0)
+    waiting.cancel()
+
+    await asyncio.wait_for(limiter.acquire(Priority.FETCH), 1)
+    assert limiter.stats['queued'] == 0
+
+
+@pytest.mark.asyncio
+async def test_identical_gets_in_flight_share_one_request(session):
+    async def send(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return response({'ok': True})
+
+    session._async_send = AsyncMock(side_effect=send)
+    url = 'https://example.com/v1/cars/vin123/battery-status'
+
+    responses = await asyncio.gather(
+        session.async_request('GET', url),
+        session.async_request('GET', url),
+        session.async_request('GET', url, params={'from': 1}),
+    )
+
+    assert session._async_send.await_count == 2
+    assert responses[0] is responses[1]
+    assert session.coalesce_stats == {'hits': 1, 'misses': 2}
+
+    # Once the first request has finished, the next one is sent again
+    await session.async_request('GET', url)
+    assert session._async_send.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_posts_are_never_coalesced(session):
+    session._async_send = AsyncMock(return_value=response({}))
+
+    await asyncio.gather(*[session.async_request('POST', 'https://example.com/') for _ in range(2)])
+
+    assert session._async_send.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_response_is_served_then_revalidated_when_stale(session, monkeypatch):
+    now = 1000
+    monkeypatch.setattr(time, 'monotonic', lambda: now)
+    session.cache.ttls = {'cockpit': 60}
+    session.rate_limiter = None
+    session._async_send = AsyncMock(return_value=response({'mileage': 1}))
+    url = 'https://example.com/v1/cars/vin123/cockpit'
+
+    await session.async_request('GET', url)
+    assert (await session.async_request('GET', url)).json() == {'mileage': 1}
+    assert session._async_send.await_count == 1
+
+    # Stale: the old response comes back straight away and a refetch runs in the background
+    now += 90
+    session._async_send.return_value = response({'mileage': 2})
+    assert (await session.async_request('GET', url)).json() == {'mileage': 1}
+    await asyncio.gather(*session._revalidations)
+    assert (await session.async_request('GET', url)).json() == {'mileage': 2}
+    assert session._async_send.await_count == 2
+
+    # Too old to serve at all
+    now += 1000
+    await session.async_request('GET', url)
+    assert session._async_send.await_count == 3
+    assert session.cache.stats == {'entries': 1, 'hits': 2, 'stale': 1, 'misses': 2, 'evictions': 0}
+
+
+@pytest.mark.asyncio
+async def test_command_invalidates_cache_for_that_vehicle(session):
+    session.cache.ttls = {'cockpit': 60}
+    session._async_send = AsyncMock(return_value=response({}))
+    url = 'https://example.com/v1/cars/{}/cockpit'
+
+    await session.async_request('GET', url.format('vin1'))
+    await session.async_request('GET', url.format('vin2'))
+    await session.async_request('POST', 'https://example.com/v1/cars/vin1/actions/horn-lights')
+    await session.async_request('GET', url.format('vin1'))
+    await session.async_request('GET', url.format('vin2'))
+
+    assert session._async_send.await_count == 4
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ResponseCache({'cockpit': 60}, max_entries=2)
+    urls = [f'https://example.com/v1/cars/vin{i}/cockpit' for i in range(3)]
+    for url in urls:
+        cache.put((url,), response({}))
+
+    assert cache.get((urls[0],), urls[0]) == (None, None)
+    assert cache.get((urls[2],), urls[2])[0] == ResponseCache.FRESH
+    assert cache.stats['evictions'] == 1
+
+
+@pytest.mark.asyncio
+async def test_endpoints_without_ttl_are_not_cached(session):
+    session._async_send = AsyncMock(return_value=response({}))
+
+    await session.async_request('GET', 'https://example.com/v1/cars/vin123/location')
+    await session.async_request('GET', 'https://example.com/v1/cars/vin123/location')
+
+    assert session._async_send.await_count == 2
+
+
+def location(latitude, last_update_time='2024-01-01T12:00:00Z'):
+    return {'data': {'attributes': {
+        'gpsLatitude': latitude,
+        'gpsLongitude': -0.1,
+        'lastUpdateTime': last_update_time,
+    }}}
+
+
+@pytest.mark.asyncio
+async def test_unchanged_last_update_time_is_not_applied(session, vehicle):
+    session._async_send = AsyncMock(return_value=response(location(51.5)))
+    await vehicle.async_fetch_location()
+    assert vehicle.version == 1
+
+    session._async_send.return_value = response(location(52.0))
+    await vehicle.async_fetch_location()
+    assert vehicle.location == (51.5, -0.1)
+    assert vehicle.version == 1
+
+    session._async_send.return_value = response(location(52.0, '2024-01-01T13:00:00Z'))
+    await vehicle.async_fetch_location()
+    assert vehicle.location == (52.0, -0.1)
+    assert vehicle.version == 2
+
+
+@pytest.mark.asyncio
+async def test_etag_is_sent_and_304_is_skipped(session, vehicle):
+    session._async_send = AsyncMock(return_value=response(location(51.5), headers={'ETag': '"v1"'}))
+    await vehicle.async_fetch_location()
+
+    session._async_send.return_value = KamereonResponse(304, {}, '')
+    await vehicle.async_fetch_location()
+
+    assert session._async_send.call_args.kwargs['headers']['If-None-Match'] == '"v1"'
+    assert vehicle.location == (51.5, -0.1)
+    assert vehicle.version == 1
+
+
+@pytest.mark.asyncio
+async def test_endpoint_that_keeps_failing_is_skipped_until_reprobe(session, vehicle, monkeypatch):
+    now = 1000
+    monkeypatch.setattr(time, 'time', lambda: now)
+    session._async_send = AsyncMock(return_value=response({'errors': [{'status': 404}]}, 404))
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await vehicle.async_fetch_lock_status()
+    assert vehicle.capabilities['lock_status'] == {'status': 'error', 'failures': 3, 'checked': 1000}
+
+    await vehicle.async_fetch_lock_status()
+    assert session._async_send.await_count == 3
+
+    # Re-probed after a day, and a good answer makes it a normal endpoint again
+    now += 24 * 3600
+    session._async_send.return_value = response({'data': {'attributes': {
+        'lockStatus': 'locked',
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+    }}})
+    await vehicle.async_fetch_lock_status()
+    assert vehicle.lock_status == LockStatus.LOCKED
+    assert vehicle.capabilities['lock_status']['failures'] == 0
+
+
+def test_capabilities_survive_a_restart(session, vehicle):
+    vehicle._record_capability('cockpit', 'empty')
+
+    [restored] = session.restore_vehicles(json.loads(json.dumps([vehicle.dump_state()])), 'user')
+
+    assert restored.capabilities == vehicle.capabilities
+
+
+@pytest.mark.asyncio
+async def test_ariya_battery_status_uses_v3_alone_once_it_covers_v1(session):
+    ariya = Vehicle({'vin': 'vin456', 'modelName': 'Ariya', 'canGeneration': 'GDC', 'services': []}, 'user')
+    v1 = {'data': {'attributes': {
+        'batteryLevel': 50, 'chargeStatus': 0, 'plugStatus': 0, 'rangeHvacOn': 200, 'timeRequiredToFullNormal': 300,
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+    }}}
+    v3 = {'data': {'attributes': {
+        'batteryLevel': 60, 'chargeStatus': 1, 'plugStatus': 1, 'batteryAutonomy': 210,
+        'lastUpdateTime': '2024-01-01T13:00:00Z',
+    }}}
+
+    async def send(method, url, **kwargs):
+        return response(v3 if '/v3/' in url else v1)
+
+    session._async_send = AsyncMock(side_effect=send)
+
+    await ariya.async_fetch_battery_status()
+    assert session._async_send.await_count == 2
+    # Merged as before, with the v1 values as fallbacks
+    assert ariya.charge_time_required_to_full[ChargingSpeed.ADAPTIVE] == 300
+
+    v3['data']['attributes']['lastUpdateTime'] = '2024-01-01T14:00:00Z'
+    await ariya.async_fetch_battery_status()
+    assert session._async_send.await_count == 3
+    assert '/v3/' in session._async_send.call_args.args[1]
+
+    # v1 values are no longer fresh, so they aren't used
+    assert ariya.battery_level == 60
+    assert ariya.charging == ChargingStatus.CHARGING
+    assert ariya.range_hvac_on == 210
+    assert ariya.charge_time_required_to_full[ChargingSpeed.ADAPTIVE] is None
+
+
+@pytest.mark.asyncio
+async def test_ariya_battery_status_applies_v3_again_after_a_new_v1(session):
+    ariya = Vehicle({'vin': 'vin456', 'modelName': 'Ariya', 'canGeneration': 'GDC', 'services': []}, 'user')
+    v1 = {'data': {'attributes': {
+        'batteryLevel': 50, 'chargeStatus': 0, 'rangeHvacOff': 220, 'rangeHvacOn': 200,
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+    }}}
+    # Without batteryAutonomy v3 doesn't cover v1, so both stay in use
+    v3 = {'data': {'attributes': {'batteryLevel': 60, 'chargeStatus': 1, 'lastUpdateTime': '2024-01-01T13:00:00Z'}}}
+
+    async def send(method, url, **kwargs):
+        return response(v3 if '/v3/' in url else v1)
+
+    session._async_send = AsyncMock(side_effect=send)
+
+    await ariya.async_fetch_battery_status()
+    assert ariya.battery_level == 60
+    assert ariya.range_hvac_off is None
+
+    v1['data']['attributes'].update(batteryLevel=51, lastUpdateTime='2024-01-01T14:00:00Z')
+    await ariya.async_fetch_battery_status()
+
+    assert ariya._battery_route == 'both'
+    assert ariya.battery_level == 60
+    assert ariya.range_hvac_off is None
+    assert ariya.range_hvac_on == 200
+
+
+@pytest.mark.asyncio
+async def test_ariya_battery_status_falls_back_to_v1_when_v3_fails(session, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1000)
+    ariya = Vehicle({'vin': 'vin456', 'modelName': 'Ariya', 'canGeneration': 'GDC', 'services': []}, 'user')
+    ariya._battery_route = 'v3'
+    v1 = {'data': {'attributes': {'batteryLevel': 50, 'chargeStatus': 0, 'rangeHvacOn': 200}}}
+    v3 = {'errors': [{'status': 404}]}
+
+    async def send(method, url, **kwargs):
+        return response(v3, 404) if '/v3/' in url else response(v1)
+
+    session._async_send = AsyncMock(side_effect=send)
+
+    with pytest.raises(ValueError):
+        await ariya.async_fetch_battery_status()
+    assert ariya._battery_route == 'both'
+    assert ariya.capabilities['battery_status_ariya']['status'] == 'error'
+
+    # The next cycle reads v1 again, so the battery is still reported
+    with pytest.raises(ValueError):
+        await ariya.async_fetch_battery_status()
+    assert ariya.battery_level == 50
+
+    # Once v3 is skipped for failing, v1 alone still reports the battery
+    ariya._battery_route = 'v3'
+    for _ in range(3):
+        ariya._record_capability('battery_status_ariya', 'error')
+    session._async_send.reset_mock()
+    await ariya.async_fetch_battery_status()
+    assert ariya.battery_level == 50
+    assert all('/v1/' in call.args[1] for call in session._async_send.call_args_list)
+
+
+def test_ariya_without_can_generation_only_calls_v1():
+    ariya = Vehicle({'vin': 'vin456', 'modelName': 'Ariya', 'services': []}, 'user')
+
+    assert ariya._battery_route == 'v1'
+
+
+@pytest.mark.asyncio
+async def test_leaf_battery_status_only_calls_v1(session, vehicle):
+    session._async_send = AsyncMock(return_value=response({'data': {'attributes': {'batteryLevel': 50, 'rangeHvacOn': 100}}}))
+
+    await vehicle.async_fetch_battery_status()
+
+    session._async_send.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_fetch_swaps_in_a_new_snapshot_only_when_values_change(session, vehicle):
+    session._async_send = AsyncMock(return_value=response(location(51.5)))
+    await vehicle.async_fetch_location()
+    before = vehicle.snapshots
+
+    vehicle._update_location(location(51.5))
+    assert vehicle.snapshots['location'] is before['location']
+
+    session._async_send.return_value = response(location(52.0, '2024-01-01T13:00:00Z'))
+    await vehicle.async_fetch_location()
+
+    assert vehicle.snapshots['location'] is not before['location']
+    assert vehicle.snapshots['lock_status'] is before['lock_status']
+    assert vehicle.location == (52.0, -0.1)
+    assert vehicle.version == 2
+
+
+def test_snapshots_are_immutable(vehicle):
+    snapshot = vehicle.snapshots['lock_status']
+
+    with pytest.raises(AttributeError):
+        snapshot.lock_status = LockStatus.LOCKED
+    with pytest.raises(TypeError):
+        snapshot.door_status['FRONT_LEFT'] = LockStatus.OPEN
+    with pytest.raises(AttributeError):
+        vehicle.lock_status = LockStatus.LOCKED
+    assert snapshot.replace(lock_status=None) is snapshot
+
+
+def test_restored_state_matches_dumped_state(session, vehicle):
+    vehicle._update_lock_status({'data': {'attributes': {
+        'lockStatus': 'unlocked',
+        'doorStatusFrontLeft': 'open',
+        'lastUpdateTime': '2024-01-01T12:00:00Z',
+    }}})
+
+    [restored] = session.restore_vehicles(json.loads(json.dumps([vehicle.dump_state()])), 'user')
+
+    assert restored.snapshots['lock_status'] == vehicle.snapshots['lock_status']
+    assert restored.features == vehicle.features
+
+
+@pytest.mark.asyncio
+async def test_calls_are_counted_per_endpoint_and_vehicle(session, vehicle):
+    session._async_http = AsyncMock(return_value=response(location(51.5)))
+
+    await vehicle.async_fetch_location()
+    await session.async_request('POST', 'https://example.com/v1/cars/VIN123/actions/refresh-location')
+
+    assert session.calls.total == 2
+    assert sum(session.calls.vehicle('VIN123').values()) == 2
+    assert session.calls.stats['endpoints']['POST v1/cars/actions/refresh-location'] == 1
+
+
+def test_call_counts_from_another_day_are_not_restored():
+    counter = CallCounter()
+    counter.record('GET', 'https://example.com/v1/cars/VIN123/cockpit')
+    state = counter.dump()
+
+    restored = CallCounter()
+    restored.load(state)
+    assert restored.total == 1
+
+    stale = CallCounter()
+    stale.load({**state, 'day': '2000-01-01'})
+    assert stale.total == 0
+
+
+def test_call_counts_start_again_at_midnight_of_the_given_day():
+    day = date(2024, 1, 1)
+    counter = CallCounter(today=lambda: day)
+    counter.record('GET', 'https://example.com/v1/cars/VIN123/cockpit')
+    assert counter.stats['day'] == '2024-01-01'
+
+    day = date(2024, 1, 2)
+    assert counter.total == 0
+    assert counter.stats['day'] == '2024-01-02'
+
+
+@pytest.mark.asyncio
+async def test_calls_are_counted_under_the_source_that_made_them():
+    counter = CallCounter()
+
+    async def call():
+        counter.record('GET', 'https://example.com/v1/cars/VIN123/cockpit')
+
+    with counter.counting('poll'):
+        await call()
+        task = asyncio.ensure_future(call())
+    await task
+    await call()
+
+    assert counter.total == 3
+    assert counter.source('poll') == 2
+
+    restored = CallCounter()
+    restored.load(counter.dump())
+    assert restored.source('poll') == 2
@@ -0,0 +1,40 @@
+from datetime import datetime
+from homeassistant.util import dt as dt_util
+from custom_components.nissan_connect.profiles import busy_from, profile_windows, quiet_until, window_at
+
+
+def local(*args):
+    return datetime(*args, tzinfo=dt_util.DEFAULT_TIME_ZONE).timestamp()
+
+
+async def test_quiet_window_runs_past_midnight(hass):
+    # Monday night
+    assert quiet_until(profile_windows('quiet_nights', {}), local(2024, 1, 1, 22, 0), False) == local(2024, 1, 1, 22, 0)
+    assert quiet_until(profile_windows('quiet_nights', {}), local(2024, 1, 1, 23, 30), False) == local(2024, 1, 2, 7, 0)
+    assert quiet_until(profile_windows('quiet_nights', {}), local(2024, 1, 2, 3, 0), False) == local(2024, 1, 2, 7, 0)
+
+
+async def test_charging_overnight_allows_polls_while_charging(hass):
+    assert quiet_until(profile_windows('charging_overnight', {}), local(2024, 1, 1, 23, 0), False) == local(2024, 1, 2, 7, 0)
+    assert quiet_until(profile_windows('charging_overnight', {}), local(2024, 1, 1, 23, 0), True) == local(2024, 1, 1, 23, 0)
+
+
+async def test_commute_windows_are_weekdays_only(hass):
+    assert window_at(profile_windows('commute', {}), local(2024, 1, 1, 8, 0))['interval'] == 15
+    # Saturday
+    assert window_at(profile_windows('commute', {}), local(2024, 1, 6, 8, 0)) is None
+    assert window_at(profile_windows('default', {}), local(2024, 1, 1, 8, 0)) is None
+
+
+async def test_busy_window_brings_poll_forward(hass):
+    assert busy_from(profile_windows('commute', {}), local(2024, 1, 1, 6, 0), local(2024, 1, 1, 10, 0), 60) == local(2024, 1, 1, 7, 0)
+    # Already polling often enough
+    assert busy_from(profile_windows('commute', {}), local(2024, 1, 1, 6, 0), local(2024, 1, 1, 10, 0), 10) is None
+    assert busy_from(profile_windows('commute', {}), local(2024, 1, 6, 6, 0), local(2024, 1, 6, 10, 0), 60) is None
+
+
+async def test_profile_times_come_from_config(hass):
+    windows = profile_windows('quiet_nights', {'quiet_start': '21:00:00', 'quiet_end': '06:30:00'})
+
+    assert quiet_until(windows, local(2024, 1, 1, 21, 30), False) == local(2024, 1, 2, 6, 30)
+    assert quiet_until(windows, local(2024, 1, 2, 6, 45), False) == local(2024, 1, 2, 6, 45)
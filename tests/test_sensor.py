@@ -13,8 +13,11 @@ from custom_components.nissan_connect.sensor import (
     StatisticSensor,
     ChargeTimeRequiredSensor,
     TimestampSensor,
+    ApiCallsSensor,
+    ApiBudgetSensor,
     async_setup_entry
 )
+from custom_components.nissan_connect.kamereon.kamereon import CallCounter
 
 @pytest.fixture
 def mock_hass():
@@ -88,6 +91,14 @@ def test_odometer_sensor(mock_hass):
     sensor._handle_coordinator_update()
     assert sensor.native_value == 5000
 
+@pytest.mark.asyncio
+async def test_odometer_sensor_has_state_once_added(mock_hass):
+    vehicle = mock_hass.data['nissan_connect']['test_account']['vehicles']['test_vehicle']
+    coordinator = mock_hass.data['nissan_connect']['test_account']['coordinator_fetch']
+    sensor = OdometerSensor(coordinator, vehicle, False)
+    await sensor.async_added_to_hass()
+    assert sensor.native_value == 5000
+
 def test_charge_time_required_sensor(mock_hass):
     vehicle = mock_hass.data['nissan_connect']['test_account']['vehicles']['test_vehicle']
     coordinator = mock_hass.data['nissan_connect']['test_account']['coordinator_fetch']
@@ -98,3 +109,35 @@ def test_timestamp_sensor(mock_hass):
     vehicle = mock_hass.data['nissan_connect']['test_account']['vehicles']['test_vehicle']
     coordinator = mock_hass.data['nissan_connect']['test_account']['coordinator_fetch']
     sensor = TimestampSensor(coordinator, vehicle, 'battery_status_last_updated', 'last_updated', 'mdi:clock-time-eleven-outline')
+
+def test_api_call_sensors(mock_hass):
+    vehicle = mock_hass.data['nissan_connect']['test_account']['vehicles']['test_vehicle']
+    vehicle.vin = 'VIN123'
+    vehicle.session.calls = CallCounter()
+    vehicle.session.calls.record('GET', 'https://example.com/v1/cars/VIN123/battery-status')
+    vehicle.session.calls.record('GET', 'https://example.com/v1/cars/VIN123/battery-status')
+    vehicle.session.calls.record('GET', 'https://example.com/v1/users/user/cars')
+    coordinator = mock_hass.data['nissan_connect']['test_account']['coordinator_fetch']
+
+    sensor = ApiCallsSensor(coordinator, vehicle)
+    assert sensor.native_value == 2
+    assert sensor.extra_state_attributes == {'account_total': 3, 'endpoints': {'GET v1/cars/battery-status': 2}}
+
+    entry = MagicMock(data={'email': 'test_account', 'daily_budget': 100})
+    budget = ApiBudgetSensor(entry, vehicle.session)
+    assert budget.native_value == 97
+    # Changed in the options flow without a reload
+    entry.data['daily_budget'] = 50
+    assert budget.native_value == 47
+
+
+@pytest.mark.asyncio
+async def test_budget_sensor_is_created_once_per_account(mock_hass, mock_async_add_entities):
+    mock_hass.data['nissan_connect']['test_account']['vehicles']['other_vehicle'] = MagicMock(features=[])
+    mock_hass.data['nissan_connect']['test_account']['session'] = MagicMock()
+    config = MagicMock(data={'email': 'test_account', 'daily_budget': 100})
+
+    await async_setup_entry(mock_hass, config, mock_async_add_entities)
+
+    entities = mock_async_add_entities.call_args[0][0]
+    assert len([entity for entity in entities if isinstance(entity, ApiBudgetSensor)]) == 1